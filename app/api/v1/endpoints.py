@@ -1,18 +1,142 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Body, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, func, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
+from sqlalchemy.orm import aliased, joinedload
+from typing import AsyncIterator, Dict, List, Literal, Optional
+import asyncio
+import json
+import logging
+import time
 
-from app.core.database import get_session
-from app.core.auth import get_user
-from app.models.models import Book as BookModel, Review as ReviewModel
-from app.schemas.schemas import BookCreate, BookUpdate, ReviewCreate, Book, SummaryRequest
-from app.services.ai import generate_summary
+from app.core.database import get_read_session, get_session
+from app.core.auth import create_access_token, get_basic_user, get_user
+from app.core.config import AUTH_TOKEN_TTL_SECONDS
+from app.core.config import BOOKS_PAGE_MAX, BOOKS_PAGE_SIZE, BOOKS_STREAM_BATCH, SEARCH_PAGE_SIZE
+from app.core.config import BOOKS_BATCH_MAX_IDS, BOOKS_BATCH_REVIEWS, BOOKS_BATCH_REVIEWS_MAX, REVIEWS_PAGE_MAX, REVIEWS_PAGE_SIZE
+from app.core.config import REVIEW_GROUP_COMMIT, REVIEWS_BATCH_MAX
+from app.models.models import Book as BookModel, Review as ReviewModel, Job as JobModel
+from app.schemas.schemas import BookCreate, BookUpdate, ReviewCreate, Review, ReviewBatchResult, Book, BookListItem, BookBatch, BookWithReviews
+from app.schemas.schemas import SummaryRequest, SummaryJobCreate, JobStatus
+from app.services.admission import Overloaded, model_admission
+from app.services.ai import generate_summary, stream_summary
+from app.services.importer import import_books, parse_csv, parse_ndjson
+from app.services.jobs import BOOK_SUMMARY, CONTENT_SUMMARY, job_queue, new_job
+from app.services.ratings import add_reviews, apply_rating_change
+from app.services.recommendations import normalize_genre, recommend, top_genre_cache
+from app.services.response_cache import book_key, genre_key, response_cache, reviews_key
+from app.services.review_writer import BookNotFound, review_writer
+from app.services.search import search, search_index
+from app.services.similarity import book_vector, index_books_after, max_book_id, refresh_books, similarity_index
+from app.services.summarizer import book_summary_prompt, build_review_prompt, summarize_reviews
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     dependencies=[Depends(get_user)]
 )
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+BOOK_FIELDS = ("id", "title", "author", "genre", "year_published", "summary", "rating_count", "average_rating")
+
+def parse_book_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(BOOK_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in BOOK_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # The id is always returned because it is the pagination cursor
+    return ["id"] + [f for f in BOOK_FIELDS if f in requested and f != "id"]
+
+def parse_book_ids(ids: str) -> List[int]:
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    # Repeated IDs are answered once, in the position of their first occurrence
+    parsed = list(dict.fromkeys(parsed))
+    if not parsed:
+        raise HTTPException(status_code=400, detail="No book IDs given")
+    if len(parsed) > BOOKS_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BOOKS_BATCH_MAX_IDS} book IDs per request")
+    return parsed
+
+def next_page_headers(request: Request, items: list, limit: int) -> Dict[str, str]:
+    if len(items) < limit:
+        return {}
+    next_cursor = items[-1]["id"]
+    return {
+        "X-Next-Cursor": str(next_cursor),
+        "Link": f'<{request.url.include_query_params(after_id=next_cursor)}>; rel="next"',
+    }
+
+def review_texts(reviews) -> List[str]:
+    return [r.review_text for r in sorted(reviews, key=lambda r: r.id) if r.review_text]
+
+async def load_book_with_reviews(session: AsyncSession, id: int) -> Optional[BookModel]:
+    # One round trip: the reviews come back in the same LEFT JOIN as the book
+    result = await session.execute(select(BookModel).options(joinedload(BookModel.reviews)).where(BookModel.id == id))
+    return result.unique().scalar_one_or_none()
+
+async def load_latest_reviews(session: AsyncSession, book_ids: List[int], per_book: int) -> Dict[int, List[ReviewModel]]:
+    if not book_ids or per_book <= 0:
+        return {}
+    # One query for every book: number each book's reviews newest first and keep the first `per_book`
+    position = func.row_number().over(partition_by=ReviewModel.book_id, order_by=ReviewModel.id.desc())
+    ranked = select(ReviewModel, position.label("position")).where(ReviewModel.book_id.in_(book_ids)).subquery()
+    latest = aliased(ReviewModel, ranked)
+    result = await session.execute(
+        select(latest).where(ranked.c.position <= per_book).order_by(ranked.c.book_id, ranked.c.id.desc())
+    )
+    reviews: Dict[int, List[ReviewModel]] = {}
+    for review in result.scalars():
+        reviews.setdefault(review.book_id, []).append(review)
+    return reviews
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_tokens(prompt: str, field: str, clock: dict) -> AsyncIterator[str]:
+    # When the client disconnects Starlette cancels this generator, which closes the upstream model stream
+    try:
+        async for token in stream_summary(prompt):
+            if clock.get("ttft") is None:
+                clock["ttft"] = time.perf_counter() - clock["start"]
+            yield sse_event("token", {"field": field, "text": token})
+    except Overloaded as e:
+        # Headers are already sent, so a queue deadline is reported in the stream
+        yield sse_event("error", {"field": field, "message": str(e), "retry_after": e.retry_after})
+    except Exception as e:
+        logger.warning("AI summary stream error: %s", e)
+        yield sse_event("error", {"field": field, "message": "Failed to generate summary"})
+
+def sse_done(clock: dict) -> str:
+    ttft = clock.get("ttft")
+    return sse_event("done", {
+        "ttft_ms": round(ttft * 1000, 2) if ttft is not None else None,
+        "total_ms": round((time.perf_counter() - clock["start"]) * 1000, 2)
+    })
+
+@router.post(
+    "/auth/token",
+    status_code=status.HTTP_200_OK,
+    summary="Issue an access token",
+    description=(
+        "Exchange Basic credentials for a signed bearer token. Requests with `Authorization: Bearer <token>` "
+        "are verified without a password check or database lookup until the token expires. "
+        "A bearer token cannot be exchanged for a new one."
+    )
+)
+async def issue_token(username: str = Depends(get_basic_user)):
+    return {
+        "access_token": create_access_token(username),
+        "token_type": "bearer",
+        "expires_in": AUTH_TOKEN_TTL_SECONDS
+    }
+
 @router.post(
     "/books",
     response_model=Book,
@@ -20,23 +144,146 @@ router = APIRouter(
     summary="Create a new book",
     description="Add a new book with title, author, genre, year, and optional summary."
 )
-async def create_book(book: BookCreate, session: AsyncSession = Depends(get_session)):
-    new_book = BookModel(**book.dict())
+async def create_book(book: BookCreate, response: Response, session: AsyncSession = Depends(get_session)):
+    data = book.model_dump()
+    new_book = BookModel(**data)
     session.add(new_book)
+    job = None
+    if not new_book.summary:
+        # Generate the missing summary in the background and write it back to the book
+        await session.flush()
+        job = new_job(BOOK_SUMMARY, book_id=new_book.id)
+        session.add(job)
     await session.commit()
+    top_genre_cache.invalidate(new_book.genre)
+    await response_cache.invalidate(genre_key(new_book.genre))
+    similarity_index.upsert(new_book.id, book_vector(data))
+    search_index.mark_dirty(new_book.id)
     await session.refresh(new_book)
+    if job is not None:
+        job_queue.notify(job.id)
+        response.headers["X-Summary-Job-Id"] = str(job.id)
     return new_book
 
+@router.post(
+    "/books/import",
+    status_code=status.HTTP_200_OK,
+    summary="Bulk import books",
+    description=(
+        "Stream books as NDJSON (one JSON object per line) or CSV with a header row. Rows are validated "
+        "individually and inserted in batches; invalid rows are reported by line number without aborting the import."
+    )
+)
+async def bulk_import_books(
+    request: Request,
+    format: Optional[Literal["ndjson", "csv"]] = Query(None, description="Defaults to csv for text/csv bodies, ndjson otherwise"),
+    batch_size: Optional[int] = Query(None, ge=1, le=100000, description="Rows per insert batch"),
+    session: AsyncSession = Depends(get_session)
+):
+    if format is None:
+        format = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+    parse = parse_csv if format == "csv" else parse_ndjson
+    # Imported rows get IDs above the current maximum; index them once they are committed
+    last_id = await max_book_id(session)
+    report = await import_books(session, parse(request.stream()), batch_size)
+    await index_books_after(session, last_id)
+    top_genre_cache.clear()
+    search_index.clear()
+    await response_cache.clear()
+    return report
+
 @router.get(
     "/books",
-    response_model=List[Book],
+    response_model=List[BookListItem],
+    response_model_exclude_unset=True,
     status_code=status.HTTP_200_OK,
-    summary="Retrieve all books",
-    description="Fetch all books stored in the database."
+    summary="Retrieve books",
+    description=(
+        "Fetch books ordered by ID, one page at a time. Pass the `X-Next-Cursor` response header back as "
+        "`after_id` to get the next page. Use `fields` to return only some columns, and `format=ndjson` "
+        "to stream every matching book as newline-delimited JSON."
+    )
 )
-async def get_books(session: AsyncSession = Depends(get_session)):
-    result = await session.execute(select(BookModel))
-    return result.scalars().all()
+async def get_books(
+    request: Request,
+    response: Response,
+    after_id: Optional[int] = Query(None, description="Return books with an ID greater than this cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=BOOKS_PAGE_MAX, description="Page size; unlimited when streaming"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to return, e.g. id,title,author"),
+    author: Optional[str] = Query(None, description="Only books by this author"),
+    genre: Optional[str] = Query(None, description="Only books in this genre"),
+    year: Optional[int] = Query(None, description="Only books published in this year"),
+    format: Literal["json", "ndjson"] = Query("json", description="`ndjson` streams the full result"),
+    session: AsyncSession = Depends(get_read_session)
+):
+    columns = parse_book_fields(fields)
+    query = select(*(getattr(BookModel, c).label(c) for c in columns)).order_by(BookModel.id)
+    if after_id is not None:
+        query = query.where(BookModel.id > after_id)
+    if author is not None:
+        query = query.where(BookModel.author == author)
+    if genre is not None:
+        query = query.where(BookModel.genre_key == normalize_genre(genre))
+    if year is not None:
+        query = query.where(BookModel.year_published == year)
+
+    if format == "ndjson":
+        if limit is not None:
+            query = query.limit(limit)
+        # Rows come from a server-side cursor in batches, so memory stays flat for any result size
+        result = await session.stream(query.execution_options(yield_per=BOOKS_STREAM_BATCH))
+
+        async def rows():
+            try:
+                async for row in result.mappings():
+                    yield json.dumps(dict(row)) + "\n"
+            finally:
+                await result.close()
+
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    limit = limit or BOOKS_PAGE_SIZE
+    result = await session.execute(query.limit(limit))
+    books = result.mappings().all()
+    response.headers.update(next_page_headers(request, books, limit))
+    return books
+
+@router.get(
+    "/books:batch",
+    response_model=BookBatch,
+    status_code=status.HTTP_200_OK,
+    summary="Retrieve several books with their latest reviews",
+    description=(
+        "Fetch up to `BOOKS_BATCH_MAX_IDS` books in one request, each with its rating aggregates and its latest "
+        "`reviews` reviews. Books come back in the order of `ids`; IDs that do not exist are listed in `missing`."
+    )
+)
+async def get_books_batch(
+    request: Request,
+    ids: str = Query(..., description="Comma-separated book IDs, e.g. 1,2,3"),
+    reviews: int = Query(BOOKS_BATCH_REVIEWS, ge=0, le=BOOKS_BATCH_REVIEWS_MAX, description="Latest reviews to include per book"),
+    session: AsyncSession = Depends(get_read_session)
+):
+    book_ids = parse_book_ids(ids)
+
+    async def load():
+        result = await session.execute(select(BookModel).where(BookModel.id.in_(book_ids)))
+        books = {book.id: book for book in result.scalars()}
+        latest = await load_latest_reviews(session, list(books), reviews)
+        return BookBatch(
+            books=[
+                BookWithReviews(
+                    **Book.model_validate(books[book_id]).model_dump(),
+                    reviews=[Review.model_validate(r) for r in latest.get(book_id, [])]
+                )
+                for book_id in book_ids if book_id in books
+            ],
+            missing=[book_id for book_id in book_ids if book_id not in books]
+        )
+
+    keys = [key for book_id in book_ids for key in (book_key(book_id), reviews_key(book_id))]
+    # Creating a book bumps no per-book key, so a batch with missing IDs could go stale and is not cached
+    return await response_cache.respond(request, keys, load, cacheable=lambda batch: not batch.missing, session=session)
 
 @router.get(
     "/books/{id}",
@@ -45,12 +292,15 @@ async def get_books(session: AsyncSession = Depends(get_session)):
     summary="Retrieve a book by ID",
     description="Fetch a specific book by its ID."
 )
-async def get_book(id: int, session: AsyncSession = Depends(get_session)):
-    result = await session.execute(select(BookModel).where(BookModel.id == id))
-    book = result.scalar_one_or_none()
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    return book
+async def get_book(id: int, request: Request, session: AsyncSession = Depends(get_read_session)):
+    async def load():
+        result = await session.execute(select(BookModel).where(BookModel.id == id))
+        book = result.scalar_one_or_none()
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        return Book.model_validate(book)
+
+    return await response_cache.respond(request, [book_key(id)], load, session=session)
 
 @router.put(
     "/books/{id}",
@@ -60,14 +310,29 @@ async def get_book(id: int, session: AsyncSession = Depends(get_session)):
     description="Update the information of a specific book by its ID."
 )
 async def update_book(id: int, book: BookUpdate, session: AsyncSession = Depends(get_session)):
-    result = await session.execute(select(BookModel).where(BookModel.id == id))
+    changes = book.dict(exclude_unset=True)
+    if not changes:
+        existing_book = await session.get(BookModel, id)
+        if not existing_book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        return existing_book
+    previous_genre = None
+    if "genre" in changes:
+        # Only a genre change needs the old value, to invalidate the genre it leaves
+        result = await session.execute(select(BookModel.genre).where(BookModel.id == id).with_for_update())
+        previous_genre = result.scalar_one_or_none()
+    result = await session.execute(
+        update(BookModel).where(BookModel.id == id).values(**changes).returning(BookModel)
+    )
     existing_book = result.scalar_one_or_none()
     if not existing_book:
         raise HTTPException(status_code=404, detail="Book not found")
-    for key, value in book.dict(exclude_unset=True).items():
-        setattr(existing_book, key, value)
     await session.commit()
-    await session.refresh(existing_book)
+    genres = {existing_book.genre, previous_genre or existing_book.genre}
+    top_genre_cache.invalidate(*genres)
+    await response_cache.invalidate(book_key(id), *(genre_key(genre) for genre in genres))
+    similarity_index.mark_dirty(id)
+    search_index.mark_dirty(id)
     return existing_book
 
 @router.delete(
@@ -77,12 +342,18 @@ async def update_book(id: int, book: BookUpdate, session: AsyncSession = Depends
     description="Delete a book from the database by its ID."
 )
 async def delete_book(id: int, session: AsyncSession = Depends(get_session)):
-    result = await session.execute(select(BookModel).where(BookModel.id == id))
-    book = result.scalar_one_or_none()
-    if not book:
+    # Reviews go with their book; the book's own DELETE reports whether it existed
+    await session.execute(delete(ReviewModel).where(ReviewModel.book_id == id))
+    result = await session.execute(delete(BookModel).where(BookModel.id == id).returning(BookModel.genre))
+    genre = result.scalar_one_or_none()
+    if genre is None:
+        await session.rollback()
         raise HTTPException(status_code=404, detail="Book not found")
-    await session.delete(book)
     await session.commit()
+    top_genre_cache.invalidate(genre)
+    await response_cache.invalidate(book_key(id), reviews_key(id), genre_key(genre))
+    similarity_index.remove(id)
+    search_index.mark_dirty(id)
     return {"message": "Book deleted successfully"}
 
 @router.post(
@@ -93,26 +364,89 @@ async def delete_book(id: int, session: AsyncSession = Depends(get_session)):
     description="Add a review for a specific book using book ID."
 )
 async def add_review(id: int, review: ReviewCreate, session: AsyncSession = Depends(get_session)):
-    result = await session.execute(select(BookModel).where(BookModel.id == id))
-    book = result.scalar_one_or_none()
-    if not book:
+    if REVIEW_GROUP_COMMIT and review_writer.running:
+        # Committed together with other queued reviews; the writer also invalidates the caches
+        try:
+            await review_writer.submit({"book_id": id, **review.model_dump()})
+        except BookNotFound:
+            raise HTTPException(status_code=404, detail="Book not found")
+        return review
+
+    # The aggregate UPDATE doubles as the existence check and locks the book row until commit
+    genre = await apply_rating_change(session, id, 1, review.rating)
+    if genre is None:
+        await session.rollback()
         raise HTTPException(status_code=404, detail="Book not found")
-    new_review = ReviewModel(book_id=id, **review.dict())
-    session.add(new_review)
+    session.add(ReviewModel(book_id=id, **review.model_dump()))
     await session.commit()
-    await session.refresh(new_review)
-    return new_review
+    top_genre_cache.invalidate(genre)
+    # The book's rating aggregates changed along with its reviews
+    await response_cache.invalidate(book_key(id), reviews_key(id), genre_key(genre))
+    similarity_index.mark_dirty(id)
+    search_index.mark_dirty(id)
+    return review
+
+@router.post(
+    "/books/{id}/reviews:batch",
+    response_model=ReviewBatchResult,
+    status_code=status.HTTP_201_CREATED,
+    summary="Add many reviews",
+    description=(
+        "Add up to `REVIEWS_BATCH_MAX` reviews for a book in one transaction: one multi-row insert, one update of "
+        "the book's rating aggregates and one commit. Either every review is stored or none is."
+    )
+)
+async def add_reviews_batch(id: int, reviews: List[ReviewCreate] = Body(...), session: AsyncSession = Depends(get_session)):
+    if not reviews:
+        raise HTTPException(status_code=400, detail="No reviews given")
+    if len(reviews) > REVIEWS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {REVIEWS_BATCH_MAX} reviews per request")
+    genres = await add_reviews(session, [{"book_id": id, **review.model_dump()} for review in reviews])
+    if id not in genres:
+        await session.rollback()
+        raise HTTPException(status_code=404, detail="Book not found")
+    await session.commit()
+    top_genre_cache.invalidate(genres[id])
+    await response_cache.invalidate(book_key(id), reviews_key(id), genre_key(genres[id]))
+    similarity_index.mark_dirty(id)
+    search_index.mark_dirty(id)
+    return ReviewBatchResult(book_id=id, inserted=len(reviews))
 
 @router.get(
     "/books/{id}/reviews",
-    response_model=List[ReviewCreate],
+    response_model=List[Review],
     status_code=status.HTTP_200_OK,
     summary="Get book reviews",
-    description="Retrieve all reviews for a specific book."
+    description=(
+        "Retrieve one page of reviews for a specific book, oldest or newest first. When more reviews may follow, "
+        "pass the `X-Next-Cursor` response header back as `after_id` to get the next page."
+    )
 )
-async def get_reviews(id: int, session: AsyncSession = Depends(get_session)):
-    result = await session.execute(select(ReviewModel).where(ReviewModel.book_id == id))
-    return result.scalars().all()
+async def get_reviews(
+    id: int,
+    request: Request,
+    after_id: Optional[int] = Query(None, description="Return reviews that come after this review ID in the chosen order"),
+    limit: int = Query(REVIEWS_PAGE_SIZE, ge=1, le=REVIEWS_PAGE_MAX, description="Page size"),
+    order: Literal["oldest", "newest"] = Query("oldest", description="Review ID order"),
+    session: AsyncSession = Depends(get_read_session)
+):
+    async def load():
+        query = select(ReviewModel).where(ReviewModel.book_id == id)
+        if order == "newest":
+            query = query.order_by(ReviewModel.id.desc())
+            if after_id is not None:
+                query = query.where(ReviewModel.id < after_id)
+        else:
+            query = query.order_by(ReviewModel.id)
+            if after_id is not None:
+                query = query.where(ReviewModel.id > after_id)
+        result = await session.execute(query.limit(limit))
+        return [Review.model_validate(r) for r in result.scalars()]
+
+    return await response_cache.respond(
+        request, [reviews_key(id)], load, page_headers=lambda reviews: next_page_headers(request, reviews, limit),
+        session=session
+    )
 
 @router.get(
     "/books/{id}/summary",
@@ -120,63 +454,141 @@ async def get_reviews(id: int, session: AsyncSession = Depends(get_session)):
     summary="Get book summary and average rating",
     description="Fetch the book summary and a concise review summary with average rating using LLaMA3."
 )
-async def get_book_summary(id: int, session: AsyncSession = Depends(get_session)):
-    result = await session.execute(select(BookModel).where(BookModel.id == id))
-    book = result.scalar_one_or_none()
+async def get_book_summary(id: int, session: AsyncSession = Depends(get_read_session)):
+    book = await load_book_with_reviews(session, id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    review_result = await session.execute(select(ReviewModel).where(ReviewModel.book_id == id))
-    reviews = review_result.scalars().all()
+    async def review_summary() -> str:
+        if not book.reviews:
+            return "No reviews available."
+        return await summarize_reviews(review_texts(book.reviews))
 
-    if reviews:
-        avg_rating = round(sum(r.rating for r in reviews) / len(reviews), 2)
-        review_text = "\n".join(r.review_text for r in reviews if r.review_text)
-        review_summary_prompt = f"Summarize the following reviews in a single sentence. Do not add any introduction or explanation. Only return the core content:\n{review_text}"
-        review_summary = await generate_summary(review_summary_prompt)
-    else:
-        avg_rating = None
-        review_summary = "No reviews available."
+    async def book_summary() -> str:
+        return book.summary or await generate_summary(book_summary_prompt(book.title, book.author))
 
-    book_summary = book.summary
-    if not book_summary:
-        summary_prompt = f"Summarize this book:\n{book.title} by {book.author}"
-        book_summary = await generate_summary(summary_prompt)
+    # The two generations are independent, so the response waits for the slower one rather than both
+    review_summary, book_summary = await asyncio.gather(review_summary(), book_summary())
 
     return {
         "book_id": id,
         "title": book.title,
         "author": book.author,
-        "average_rating": avg_rating,
+        "average_rating": book.average_rating,
         "book_summary": book_summary,
         "review_summary": review_summary
     }
 
+@router.get(
+    "/books/{id}/summary/stream",
+    status_code=status.HTTP_200_OK,
+    summary="Stream book summary and average rating",
+    description="Stream the review summary and book summary token by token as Server-Sent Events."
+)
+async def stream_book_summary(id: int, session: AsyncSession = Depends(get_read_session)):
+    book = await load_book_with_reviews(session, id)
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    reviews = book.reviews
+    # Turn a full queue into 429 while a status code can still be sent
+    model_admission.check()
+
+    async def events():
+        clock = {"start": time.perf_counter()}
+        yield sse_event("meta", {"book_id": id, "title": book.title, "author": book.author, "average_rating": book.average_rating})
+        if reviews:
+            # Large review sets are reduced to partial summaries first; only the final pass is streamed
+            try:
+                prompt = await build_review_prompt(review_texts(reviews))
+            except Overloaded as e:
+                yield sse_event("error", {"field": "review_summary", "message": str(e), "retry_after": e.retry_after})
+            else:
+                if prompt is None:
+                    yield sse_event("error", {"field": "review_summary", "message": "Failed to generate summary"})
+                else:
+                    async for event in stream_tokens(prompt, "review_summary", clock):
+                        yield event
+        else:
+            yield sse_event("token", {"field": "review_summary", "text": "No reviews available."})
+        if book.summary:
+            yield sse_event("token", {"field": "book_summary", "text": book.summary})
+        else:
+            async for event in stream_tokens(book_summary_prompt(book.title, book.author), "book_summary", clock):
+                yield event
+        yield sse_done(clock)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get(
+    "/books/{id}/similar",
+    status_code=status.HTTP_200_OK,
+    summary="Get similar books",
+    description="Retrieve the books most similar to this one by title, author, genre, summary and review text."
+)
+async def get_similar_books(
+    id: int,
+    k: int = Query(10, ge=1, le=100, description="Number of similar books to return"),
+    session: AsyncSession = Depends(get_read_session)
+):
+    if await session.get(BookModel, id) is None:
+        raise HTTPException(status_code=404, detail="Book not found")
+    if id in similarity_index.dirty or not similarity_index.has(id):
+        await refresh_books(session, [id])
+
+    neighbours = similarity_index.query(id, k)
+    result = await session.execute(
+        select(BookModel.id, BookModel.title, BookModel.author, BookModel.genre, BookModel.year_published)
+        .where(BookModel.id.in_([book_id for book_id, _ in neighbours]))
+    )
+    books = {row.id: dict(row) for row in result.mappings()}
+    # Rows of books deleted by another process may linger in the index until they are cleared
+    return [{**books[book_id], "score": round(score, 4)} for book_id, score in neighbours if book_id in books]
+
+@router.get(
+    "/search",
+    status_code=status.HTTP_200_OK,
+    summary="Search books",
+    description=(
+        "Full-text search over titles, authors, summaries and reviews. Results are ranked by relevance and "
+        "include a snippet with matching terms wrapped in `<mark>` tags."
+    )
+)
+async def search_books(
+    q: str = Query(..., min_length=1, description="Search terms; every term must match"),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=100, description="Number of results to return"),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+    session: AsyncSession = Depends(get_read_session)
+):
+    return await search(session, q, limit, offset)
+
 @router.get(
     "/recommendations",
     status_code=status.HTTP_200_OK,
     summary="Get book recommendations",
-    description="Retrieve book recommendations based on a provided genre."
+    description=(
+        "Retrieve book recommendations for a genre, ranked by rating (weighted by number of ratings) and then "
+        "by recency. Genres are matched case-insensitively, with a fuzzy match when no genre matches exactly."
+    )
 )
-async def get_recommendations(genre: str = Query(..., description="Genre to filter recommendations by"), session: AsyncSession = Depends(get_session)):
-    result = await session.execute(
-        select(BookModel).where(BookModel.genre.ilike(f"%{genre}%"))
+async def get_recommendations(
+    request: Request,
+    genre: str = Query(..., description="Genre to filter recommendations by"),
+    limit: int = Query(20, ge=1, le=100, description="Number of recommendations to return"),
+    offset: int = Query(0, ge=0, description="Number of recommendations to skip"),
+    session: AsyncSession = Depends(get_read_session)
+):
+    async def load():
+        books = await recommend(session, genre, limit, offset)
+        if not books and not offset:
+            raise HTTPException(status_code=404, detail="No books found for this genre")
+        return books
+
+    # Fuzzy fallbacks can come from any genre, so only exact genre matches are cached
+    return await response_cache.respond(
+        request, [genre_key(genre)], load,
+        cacheable=lambda books: all(normalize_genre(b["genre"]) == normalize_genre(genre) for b in books),
+        session=session
     )
-    books = result.scalars().all()
-
-    if not books:
-        raise HTTPException(status_code=404, detail="No books found for this genre")
-
-    recommendations = [
-        {
-            "id": book.id,
-            "title": book.title,
-            "author": book.author,
-            "genre": book.genre,
-            "year_published": book.year_published
-        } for book in books
-    ]
-    return recommendations
 
 @router.post(
     "/books/generate-summary",
@@ -185,6 +597,55 @@ async def get_recommendations(genre: str = Query(..., description="Genre to filt
     description="Generate a book summary using the LLaMA3 model from raw content."
 )
 async def generate_summary_endpoint(payload: SummaryRequest):
-    prompt = f"Summarize this book:\n{payload.content}"
-    summary = await generate_summary(prompt)
+    summary = await generate_summary(book_summary_prompt(payload.content))
     return {"summary": summary}
+
+@router.post(
+    "/books/generate-summary/stream",
+    status_code=status.HTTP_200_OK,
+    summary="Stream AI summary",
+    description="Stream a book summary generated from raw content token by token as Server-Sent Events."
+)
+async def stream_summary_endpoint(payload: SummaryRequest):
+    model_admission.check()
+
+    async def events():
+        clock = {"start": time.perf_counter()}
+        async for event in stream_tokens(book_summary_prompt(payload.content), "summary", clock):
+            yield event
+        yield sse_done(clock)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post(
+    "/jobs/summaries",
+    response_model=JobStatus,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Queue a summary job",
+    description="Queue summary generation for an existing book (`book_id`) or for raw content (`content`) and return the job immediately."
+)
+async def create_summary_job(payload: SummaryJobCreate, session: AsyncSession = Depends(get_session)):
+    if payload.book_id is not None:
+        if await session.get(BookModel, payload.book_id) is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        job = new_job(BOOK_SUMMARY, book_id=payload.book_id)
+    else:
+        job = new_job(CONTENT_SUMMARY, payload={"content": payload.content})
+    session.add(job)
+    await session.commit()
+    job_queue.notify(job.id)
+    return job
+
+@router.get(
+    "/jobs/{id}",
+    response_model=JobStatus,
+    status_code=status.HTTP_200_OK,
+    summary="Get job status",
+    description="Fetch the status of a summary job, with its result once done."
+)
+async def get_job(id: int, session: AsyncSession = Depends(get_session)):
+    job = await session.get(JobModel, id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
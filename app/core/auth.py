@@ -1,22 +1,185 @@
 from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBasic, HTTPBasicCredentials, HTTPBearer
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+from jose import JWTError, jwt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import bcrypt
+import hashlib
+import hmac
 import secrets
-from dotenv import load_dotenv
+import time
 import os
 
-security = HTTPBasic()
+from app.core.config import (
+    AUTH_BCRYPT_ROUNDS,
+    AUTH_CACHE_MAX_ENTRIES,
+    AUTH_CACHE_TTL_SECONDS,
+    AUTH_JWT_ALGORITHM,
+    AUTH_JWT_SECRET,
+    AUTH_TOKEN_TTL_SECONDS,
+)
+from app.core.database import get_session
+from app.models.models import User as UserModel
 
+basic_security = HTTPBasic(auto_error=False)
+bearer_security = HTTPBearer(auto_error=False)
+
+# Bootstrap account, created in the users table on startup if it does not exist yet
 USERNAME = os.getenv("USERNAME")
 PASSWORD = os.getenv("PASSWORD")
 
-def get_user(credentials: HTTPBasicCredentials = Depends(security)):
-    correct_username = secrets.compare_digest(credentials.username, USERNAME)
-    correct_password = secrets.compare_digest(credentials.password, PASSWORD)
-
-    if not (correct_username and correct_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid credentials",
-            headers={"WWW-Authenticate": "Basic"},
-        )
-    return credentials.username
+# Without a configured secret tokens are signed with a per-process key and stop working on restart
+JWT_SECRET = AUTH_JWT_SECRET or secrets.token_urlsafe(32)
+
+
+class CredentialCache:
+    """Recently verified Basic credentials, so bcrypt runs once per TTL instead of on every request.
+
+    Entries are keyed by an HMAC of username and password under a per-process key; no password is kept.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._key = secrets.token_bytes(32)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, username: str, password: str) -> str:
+        return hmac.new(self._key, f"{username}\0{password}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def get(self, digest: str) -> Optional[str]:
+        entry = self._entries.get(digest)
+        if entry is not None:
+            expires_at, username = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return username
+            del self._entries[digest]
+        self.misses += 1
+        return None
+
+    def set(self, digest: str, username: str):
+        self._entries[digest] = (time.monotonic() + self.ttl_seconds, username)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        for digest in [d for d, (_, u) in self._entries.items() if u == username]:
+            del self._entries[digest]
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+
+credential_cache = CredentialCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+
+
+def _secret(password: str) -> bytes:
+    # bcrypt only uses the first 72 bytes; newer releases raise instead of truncating
+    return password.encode("utf-8")[:72]
+
+
+def hash_password(password: str, rounds: int = AUTH_BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(rounds)).decode("ascii")
+
+
+def check_password(password: str, password_hash: str) -> bool:
+    return bcrypt.checkpw(_secret(password), password_hash.encode("ascii"))
+
+
+@lru_cache(maxsize=1)
+def _dummy_hash() -> str:
+    return hash_password(secrets.token_urlsafe(16))
+
+
+def _verify(password: str, password_hash: Optional[str]) -> bool:
+    # Unknown users are checked against a dummy hash; creating it is a full bcrypt hash, so it happens here too
+    return check_password(password, password_hash or _dummy_hash())
+
+
+async def authenticate(session: AsyncSession, username: str, password: str) -> bool:
+    digest = credential_cache.digest(username, password)
+    if credential_cache.get(digest) is not None:
+        return True
+    result = await session.execute(select(UserModel.password_hash).where(UserModel.username == username))
+    password_hash = result.scalar_one_or_none()
+    # Unknown users still pay for a bcrypt check, so response times do not reveal which usernames exist.
+    # bcrypt holds the CPU for ~100 ms, so it runs in the threadpool instead of on the event loop.
+    valid = await run_in_threadpool(_verify, password, password_hash)
+    if not valid or password_hash is None:
+        return False
+    credential_cache.set(digest, username)
+    return True
+
+
+async def set_password(session: AsyncSession, username: str, password: str) -> UserModel:
+    password_hash = await run_in_threadpool(hash_password, password)
+    user = (await session.execute(select(UserModel).where(UserModel.username == username))).scalar_one_or_none()
+    if user is None:
+        user = UserModel(username=username, password_hash=password_hash)
+        session.add(user)
+    else:
+        user.password_hash = password_hash
+    await session.commit()
+    credential_cache.invalidate(username)
+    return user
+
+
+async def ensure_user(session: AsyncSession, username: str, password: str):
+    result = await session.execute(select(UserModel.id).where(UserModel.username == username))
+    if result.scalar_one_or_none() is None:
+        await set_password(session, username, password)
+
+
+def create_access_token(username: str, ttl_seconds: int = AUTH_TOKEN_TTL_SECONDS) -> str:
+    now = int(time.time())
+    return jwt.encode({"sub": username, "iat": now, "exp": now + ttl_seconds}, JWT_SECRET, algorithm=AUTH_JWT_ALGORITHM)
+
+
+def verify_access_token(token: str) -> Optional[str]:
+    # Signature and expiry are checked locally; tokens need no database lookup
+    try:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[AUTH_JWT_ALGORITHM])
+    except JWTError:
+        return None
+    return claims.get("sub")
+
+
+def unauthorized(scheme: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid credentials",
+        headers={"WWW-Authenticate": scheme},
+    )
+
+
+async def get_user(
+    basic: Optional[HTTPBasicCredentials] = Depends(basic_security),
+    bearer: Optional[HTTPAuthorizationCredentials] = Depends(bearer_security),
+    session: AsyncSession = Depends(get_session)
+) -> str:
+    if bearer is not None:
+        username = verify_access_token(bearer.credentials)
+        if username is None:
+            raise unauthorized("Bearer")
+        return username
+    return await get_basic_user(basic, session)
+
+
+async def get_basic_user(
+    basic: Optional[HTTPBasicCredentials] = Depends(basic_security),
+    session: AsyncSession = Depends(get_session)
+) -> str:
+    # Password only: used where a token must not be enough, such as issuing a new token
+    if basic is None or not await authenticate(session, basic.username, basic.password):
+        raise unauthorized("Basic")
+    return basic.username
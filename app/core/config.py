@@ -0,0 +1,138 @@
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+# Logging and profiling; the profiler samples requests that send PROFILER_HEADER when enabled
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+PROFILER_HEADER = os.getenv("PROFILER_HEADER", "X-Profile")
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.005"))
+PROFILER_DIR = os.getenv("PROFILER_DIR", "data/profiles")
+
+# Database connections
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+# Comma-separated read replica URLs; GET endpoints fall back to the primary when none are reachable
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DB_REPLICA_STRATEGY = os.getenv("DB_REPLICA_STRATEGY", "round_robin")
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+# Replica reads this soon after a write to the entities they cover are served but not cached
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+
+# Model backend; MODEL_BASE_URLS lists several servers to balance across, separated by commas
+MODEL_BASE_URL = os.getenv("MODEL_BASE_URL")
+MODEL_BASE_URLS = [url.strip() for url in os.getenv("MODEL_BASE_URLS", MODEL_BASE_URL or "").split(",") if url.strip()]
+MODEL_NAME = os.getenv("MODEL_NAME", "llama3")
+
+# LLM output cache
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_DB_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DB_MAX_ENTRIES", "100000"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "604800"))
+
+# Shared HTTP client for the model backend
+MODEL_MAX_CONNECTIONS = int(os.getenv("MODEL_MAX_CONNECTIONS", "32"))
+MODEL_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("MODEL_MAX_KEEPALIVE_CONNECTIONS", "16"))
+MODEL_KEEPALIVE_EXPIRY = float(os.getenv("MODEL_KEEPALIVE_EXPIRY", "30"))
+MODEL_CONNECT_TIMEOUT = float(os.getenv("MODEL_CONNECT_TIMEOUT", "5"))
+MODEL_READ_TIMEOUT = float(os.getenv("MODEL_READ_TIMEOUT", "300"))
+MODEL_WRITE_TIMEOUT = float(os.getenv("MODEL_WRITE_TIMEOUT", "10"))
+MODEL_POOL_TIMEOUT = float(os.getenv("MODEL_POOL_TIMEOUT", "30"))
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", "2"))
+MODEL_RETRY_BACKOFF = float(os.getenv("MODEL_RETRY_BACKOFF", "0.25"))
+
+# Model backend health, circuit breaking and hedging; MODEL_HEDGE_PERCENTILE=0 disables hedging
+MODEL_HEALTH_PATH = os.getenv("MODEL_HEALTH_PATH", "/api/tags")
+MODEL_HEALTH_INTERVAL = float(os.getenv("MODEL_HEALTH_INTERVAL", "10"))
+MODEL_HEALTH_TIMEOUT = float(os.getenv("MODEL_HEALTH_TIMEOUT", "2"))
+MODEL_BREAKER_FAILURES = int(os.getenv("MODEL_BREAKER_FAILURES", "5"))
+MODEL_BREAKER_RESET = float(os.getenv("MODEL_BREAKER_RESET", "30"))
+MODEL_HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", "0"))
+MODEL_HEDGE_MIN_SAMPLES = int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", "20"))
+
+# Admission control for model calls; requests beyond the limit queue, interactive ones first
+MODEL_CONCURRENCY_LIMIT = int(os.getenv("MODEL_CONCURRENCY_LIMIT", "4"))
+MODEL_QUEUE_MAX = int(os.getenv("MODEL_QUEUE_MAX", "32"))
+MODEL_QUEUE_TIMEOUT = float(os.getenv("MODEL_QUEUE_TIMEOUT", "15"))
+MODEL_BACKGROUND_QUEUE_TIMEOUT = float(os.getenv("MODEL_BACKGROUND_QUEUE_TIMEOUT", "300"))
+
+# Book listing
+BOOKS_PAGE_SIZE = int(os.getenv("BOOKS_PAGE_SIZE", "100"))
+BOOKS_PAGE_MAX = int(os.getenv("BOOKS_PAGE_MAX", "1000"))
+BOOKS_STREAM_BATCH = int(os.getenv("BOOKS_STREAM_BATCH", "500"))
+
+# Batch reads and review pages
+BOOKS_BATCH_MAX_IDS = int(os.getenv("BOOKS_BATCH_MAX_IDS", "100"))
+BOOKS_BATCH_REVIEWS = int(os.getenv("BOOKS_BATCH_REVIEWS", "3"))
+BOOKS_BATCH_REVIEWS_MAX = int(os.getenv("BOOKS_BATCH_REVIEWS_MAX", "20"))
+REVIEWS_PAGE_SIZE = int(os.getenv("REVIEWS_PAGE_SIZE", "50"))
+REVIEWS_PAGE_MAX = int(os.getenv("REVIEWS_PAGE_MAX", "500"))
+
+# Review writes; with group commit, single reviews are queued and committed together in micro-batches
+REVIEW_GROUP_COMMIT = os.getenv("REVIEW_GROUP_COMMIT", "false").lower() == "true"
+REVIEW_GROUP_MAX_BATCH = int(os.getenv("REVIEW_GROUP_MAX_BATCH", "500"))
+REVIEW_GROUP_MAX_DELAY_MS = float(os.getenv("REVIEW_GROUP_MAX_DELAY_MS", "2"))
+REVIEW_GROUP_QUEUE_MAX = int(os.getenv("REVIEW_GROUP_QUEUE_MAX", "10000"))
+REVIEWS_BATCH_MAX = int(os.getenv("REVIEWS_BATCH_MAX", "1000"))
+
+# Bulk import
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "1000"))
+# PostgreSQL only: GIN pending-list size for import transactions, so the search and trigram indexes are merged in bulk
+IMPORT_GIN_PENDING_LIST_LIMIT = os.getenv("IMPORT_GIN_PENDING_LIST_LIMIT", "64MB")
+
+# Map-reduce review summarisation
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "2000"))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+
+# Background summarisation jobs
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))
+# A running job's updated_at is refreshed every third of this; jobs not refreshed for this long are retried
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+# Offline backfill of missing book summaries (backfill_summaries.py)
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "100"))
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "4"))
+BACKFILL_CHECKPOINT = os.getenv("BACKFILL_CHECKPOINT", "data/summary_backfill.json")
+
+# Recommendations
+RECOMMENDATIONS_TOP_N = int(os.getenv("RECOMMENDATIONS_TOP_N", "50"))
+RECOMMENDATIONS_CACHE_TTL = float(os.getenv("RECOMMENDATIONS_CACHE_TTL", "60"))
+RECOMMENDATIONS_CACHE_MAX_GENRES = int(os.getenv("RECOMMENDATIONS_CACHE_MAX_GENRES", "1000"))
+RECOMMENDATIONS_PRIOR_WEIGHT = int(os.getenv("RECOMMENDATIONS_PRIOR_WEIGHT", "5"))
+RECOMMENDATIONS_PRIOR_RATING = float(os.getenv("RECOMMENDATIONS_PRIOR_RATING", "3.0"))
+
+# "More like this" vector index
+SIMILARITY_INDEX_DIR = os.getenv("SIMILARITY_INDEX_DIR", "data/similarity")
+SIMILARITY_DIM = int(os.getenv("SIMILARITY_DIM", "256"))
+SIMILARITY_MAX_REVIEWS = int(os.getenv("SIMILARITY_MAX_REVIEWS", "50"))
+SIMILARITY_REFRESH_INTERVAL = float(os.getenv("SIMILARITY_REFRESH_INTERVAL", "5"))
+SIMILARITY_NLIST = int(os.getenv("SIMILARITY_NLIST", "1024"))
+SIMILARITY_NPROBE = int(os.getenv("SIMILARITY_NPROBE", "16"))
+
+# Full-text search
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+SEARCH_SNIPPET_WORDS = int(os.getenv("SEARCH_SNIPPET_WORDS", "30"))
+SEARCH_REVIEW_WEIGHT = float(os.getenv("SEARCH_REVIEW_WEIGHT", "0.5"))
+
+# Authentication
+AUTH_BCRYPT_ROUNDS = int(os.getenv("AUTH_BCRYPT_ROUNDS", "12"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+AUTH_JWT_SECRET = os.getenv("AUTH_JWT_SECRET")
+AUTH_JWT_ALGORITHM = os.getenv("AUTH_JWT_ALGORITHM", "HS256")
+AUTH_TOKEN_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_TTL_SECONDS", "3600"))
+
+# HTTP response cache; "sqlite" shares it between worker processes on one host
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "data/response_cache.db")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_MAX_VERSIONS = int(os.getenv("RESPONSE_CACHE_MAX_VERSIONS", "100000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
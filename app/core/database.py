@@ -1,15 +1,115 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
 from dotenv import load_dotenv
+import itertools
+import logging
+import time
 import os
 
+from app.core.config import (
+    DATABASE_REPLICA_URLS,
+    DB_ECHO,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_REPLICA_RETRY_SECONDS,
+    DB_REPLICA_STRATEGY,
+    DB_STATEMENT_TIMEOUT_MS,
+)
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+logger = logging.getLogger(__name__)
+
+def create_engine(url: str, **options) -> AsyncEngine:
+    backend = make_url(url).get_backend_name()
+    kwargs = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if backend == "postgresql":
+        # Runaway queries are cancelled by the server instead of holding a pooled connection forever
+        kwargs["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    if not (backend == "sqlite" and make_url(url).database in (None, "", ":memory:")):
+        kwargs.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    kwargs.update(options)
+    return create_async_engine(url, **kwargs)
+
+class ReadRouter:
+    """Hands out read-only sessions on replicas, picked round-robin or by fewest open sessions.
+
+    A replica that fails to connect is skipped for `retry_after` seconds; with no usable replica the
+    session comes from the primary.
+    """
+
+    def __init__(self, primary: sessionmaker, replicas: List[sessionmaker], strategy: str = "round_robin",
+                 retry_after: float = DB_REPLICA_RETRY_SECONDS):
+        if strategy not in ("round_robin", "least_loaded"):
+            raise ValueError(f"Unknown replica strategy: {strategy}")
+        self.primary = primary
+        self.replicas = replicas
+        self.strategy = strategy
+        self.retry_after = retry_after
+        self.in_flight = [0] * len(replicas)
+        self.served = [0] * len(replicas)
+        self._down_until = [0.0] * len(replicas)
+        self._turn = itertools.count()
+
+    def choose(self) -> Optional[int]:
+        now = time.monotonic()
+        up = [i for i in range(len(self.replicas)) if self._down_until[i] <= now]
+        if not up:
+            return None
+        start = next(self._turn)
+        # Rotating the candidate order also spreads ties in the least-loaded strategy
+        rotated = [up[(start + i) % len(up)] for i in range(len(up))]
+        if self.strategy == "least_loaded":
+            return min(rotated, key=lambda i: self.in_flight[i])
+        return rotated[0]
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        index = self.choose()
+        if index is not None:
+            self.in_flight[index] += 1
+            try:
+                async with self.replicas[index]() as session:
+                    try:
+                        await session.connection()
+                    except (OSError, DBAPIError) as e:
+                        logger.warning("Read replica unavailable, using the primary: %s", e)
+                        self._down_until[index] = time.monotonic() + self.retry_after
+                    else:
+                        self.served[index] += 1
+                        # Lets the response cache tell reads that may miss a recent write
+                        session.info["replica"] = True
+                        yield session
+                        return
+            finally:
+                self.in_flight[index] -= 1
+        async with self.primary() as session:
+            yield session
+
+engine = create_engine(DATABASE_URL)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+replica_engines = [create_engine(url) for url in DATABASE_REPLICA_URLS]
+read_router = ReadRouter(
+    AsyncSessionLocal,
+    [sessionmaker(e, class_=AsyncSession, expire_on_commit=False) for e in replica_engines],
+    DB_REPLICA_STRATEGY
+)
+
 async def get_session():
     async with AsyncSessionLocal() as session:
         yield session
+
+async def get_read_session():
+    # For endpoints that only read; replicas may lag the primary slightly
+    async with read_router.session() as session:
+        yield session
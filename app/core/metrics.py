@@ -0,0 +1,210 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import PROFILER_DIR, PROFILER_ENABLED, PROFILER_HEADER, PROFILER_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Requests and SQL are mostly sub-second; model calls run from about a second to several minutes
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte",
+    ["method", "route", "status"], buckets=FAST_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests currently being served", ["method"])
+
+DB_STATEMENT_DURATION = Histogram(
+    "db_statement_duration_seconds", "SQL statement execution time", ["operation"], buckets=FAST_BUCKETS
+)
+DB_STATEMENT_ERRORS = Counter("db_statement_errors_total", "SQL statements that raised", ["operation"])
+
+LLM_REQUEST_DURATION = Histogram(
+    "llm_request_duration_seconds", "Model request time until the full response", ["mode"], buckets=LLM_BUCKETS
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds", "Time until a streamed model response yields its first token", buckets=LLM_BUCKETS
+)
+LLM_PROMPT_TOKENS = Counter("llm_prompt_tokens_total", "Prompt tokens sent to the model", ["mode"])
+LLM_RESPONSE_TOKENS = Counter("llm_response_tokens_total", "Tokens generated by the model", ["mode"])
+LLM_FAILURES = Counter("llm_failures_total", "Model requests that failed", ["mode"])
+LLM_CACHE_LOOKUPS = Counter("llm_cache_lookups_total", "Summary cache lookups by outcome", ["result"])
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total", "Calls that ran the shared work or joined one already in flight", ["namespace", "result"]
+)
+LLM_BACKEND_REQUESTS = Counter("llm_backend_requests_total", "Model requests per backend by outcome", ["backend", "outcome"])
+LLM_BACKEND_OUTSTANDING = Gauge("llm_backend_outstanding", "Requests in flight per model backend", ["backend"])
+LLM_BACKEND_CIRCUIT = Gauge("llm_backend_circuit_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open", ["backend"])
+LLM_HEDGES = Counter("llm_hedged_requests_total", "Hedged model requests sent, and those the hedge won", ["result"])
+LLM_ADMISSION_IN_FLIGHT = Gauge("llm_admission_in_flight", "Model calls holding an admission slot")
+LLM_ADMISSION_QUEUE_DEPTH = Gauge("llm_admission_queue_depth", "Model calls waiting for a slot", ["priority"])
+LLM_ADMISSION_WAIT = Histogram(
+    "llm_admission_wait_seconds", "Time model calls waited for a slot", ["priority"], buckets=(0.005, 0.025) + LLM_BUCKETS
+)
+LLM_ADMISSION_REJECTED = Counter("llm_admission_rejected_total", "Model calls turned away", ["priority", "reason"])
+
+REVIEW_GROUP_BATCH_SIZE = Histogram(
+    "review_group_commit_batch_size", "Reviews written per group commit", buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+REVIEW_GROUP_COMMIT_DURATION = Histogram(
+    "review_group_commit_seconds", "Time to write and commit one group of reviews", buckets=FAST_BUCKETS
+)
+
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE"}
+
+
+def sql_operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    # Keep label values to a small fixed set
+    return word if word in SQL_OPERATIONS else "OTHER"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    DB_STATEMENT_DURATION.labels(sql_operation(statement)).observe(time.perf_counter() - started)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+    DB_STATEMENT_ERRORS.labels(sql_operation(context.statement or "")).inc()
+
+
+def route_template(scope) -> str:
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        # Unmatched paths share one label so scanners cannot blow up the series count
+        return "unmatched"
+    path = scope.get("path", "")
+    regex = getattr(route, "path_regex", None)
+    if regex is not None and not regex.match(path):
+        # Routes of an included router report their path without the router's prefix
+        for i, char in enumerate(path):
+            if char == "/" and regex.match(path[i:]):
+                return path[:i] + template
+    return template
+
+
+def record_llm_call(mode: str, duration: float, prompt: str, response: str, counts: Optional[dict] = None):
+    counts = counts or {}
+    LLM_REQUEST_DURATION.labels(mode).observe(duration)
+    # Ollama reports exact token counts; fall back to the same estimate the summariser uses
+    LLM_PROMPT_TOKENS.labels(mode).inc(counts.get("prompt_eval_count") or len(prompt) // 4)
+    LLM_RESPONSE_TOKENS.labels(mode).inc(counts.get("eval_count") or len(response) // 4)
+
+
+def render_metrics():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Several worker processes: aggregate the per-process files prometheus_client writes there
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class SamplingProfiler:
+    """Samples the event loop thread's stack from a background thread and counts collapsed stacks.
+
+    The output is one `frame;frame;frame count` line per stack, the input format of flamegraph tools.
+    All tasks on the loop are sampled, so concurrent requests show up in each other's profiles.
+    """
+
+    def __init__(self, interval: float = PROFILER_INTERVAL):
+        self.interval = interval
+        self.samples: StackCounter = StackCounter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class MetricsMiddleware:
+    """Times every request per route template until its last body chunk, so streamed responses count in full."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status: Dict[str, int] = {"code": 500}
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        profiler = SamplingProfiler() if PROFILER_ENABLED and headers.get(PROFILER_HEADER.lower()) else None
+        profile_id = f"{int(time.time() * 1000)}-{id(scope):x}" if profiler else None
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if profile_id is not None:
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.labels(method).inc()
+        if profiler:
+            profiler.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            HTTP_REQUESTS_IN_PROGRESS.labels(method).dec()
+            path = route_template(scope)
+            HTTP_REQUEST_DURATION.labels(method, path, str(status["code"])).observe(duration)
+            if profiler:
+                profiler.stop()
+                self._save_profile(profile_id, method, path, duration, profiler)
+
+    @staticmethod
+    def _save_profile(profile_id: str, method: str, path: str, duration: float, profiler: SamplingProfiler):
+        os.makedirs(PROFILER_DIR, exist_ok=True)
+        filename = os.path.join(PROFILER_DIR, f"{profile_id}.txt")
+        with open(filename, "w") as f:
+            f.write(profiler.collapsed())
+        logger.info("Profiled %s %s in %.1f ms (%d samples): %s",
+                    method, path, duration * 1000, sum(profiler.samples.values()), filename)
@@ -1,9 +1,46 @@
-from fastapi import FastAPI, Request, status
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, Response, status
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import HTTPException as FastAPIHTTPException
 from pydantic import ValidationError
 
 from app.api.v1.endpoints import router as v1_router
+from app.core.auth import PASSWORD, USERNAME, ensure_user
+from app.core.config import LOG_LEVEL, REVIEW_GROUP_COMMIT, SIMILARITY_REFRESH_INTERVAL
+from app.core.database import AsyncSessionLocal, engine, replica_engines
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.services.admission import Overloaded
+from app.services.jobs import job_queue
+from app.services.model_client import close_client, start_client
+from app.services.review_writer import review_writer
+from app.services.similarity import run_refresher, similarity_index
+
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled HTTP client to the model backend for the whole process
+    await start_client()
+    if USERNAME and PASSWORD:
+        async with AsyncSessionLocal() as session:
+            await ensure_user(session, USERNAME, PASSWORD)
+    await job_queue.start()
+    if REVIEW_GROUP_COMMIT:
+        await review_writer.start()
+    similarity_index.open()
+    refresher = asyncio.create_task(run_refresher(AsyncSessionLocal, SIMILARITY_REFRESH_INTERVAL))
+    yield
+    refresher.cancel()
+    # Before the similarity index closes, since the last group commit marks books dirty
+    await review_writer.stop()
+    similarity_index.close()
+    await job_queue.stop()
+    await close_client()
+    for e in [engine, *replica_engines]:
+        await e.dispose()
 
 app = FastAPI(
     title="Gen AI Book Management API",
@@ -15,14 +52,23 @@ app = FastAPI(
     contact={
         "name": "Ashutosh Renu",
         "email": "ashutoshrenu15@gmail.com",
-    }
+    },
+    lifespan=lifespan
 )
 
+app.add_middleware(MetricsMiddleware)
+
 # Mount health check here, globally public
 @app.get("/health", include_in_schema=False)
 async def health_check():
     return {"status": "ok"}
 
+# Prometheus scrape endpoint, public like the health check
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 
 # Mount versioned API
 app.include_router(v1_router, prefix="/v1/api", tags=["Books & Reviews"])
@@ -38,6 +84,15 @@ async def validation_exception_handler(request: Request, exc: ValidationError):
         }
     )
 
+# Model server saturated: tell clients when to come back instead of letting them time out
+@app.exception_handler(Overloaded)
+async def overloaded_exception_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"message": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Custom HTTP Exception Handler
 @app.exception_handler(FastAPIHTTPException)
 async def custom_http_exception_handler(request: Request, exc: FastAPIHTTPException):
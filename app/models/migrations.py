@@ -0,0 +1,244 @@
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Optional, Sequence
+
+from sqlalchemy import (
+    JSON, Column, Float, ForeignKey, Integer, MetaData, String, Table, Text, inspect, insert, select, text
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_lock, so two deploys starting at once do not migrate concurrently
+LOCK_KEY = 7283046151
+
+VERSIONS = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String, nullable=False),
+    Column("applied_at", Float, nullable=False),
+)
+
+
+class Migration:
+    """One schema change. `upgrade` runs on a sync connection and must be safe to run again.
+
+    Steps are idempotent because databases created with `Base.metadata.create_all`, before versions were
+    tracked, already have some of the schema; running every migration brings them to the same state.
+    A non-transactional migration runs in autocommit mode on PostgreSQL, which CREATE INDEX CONCURRENTLY needs.
+    """
+
+    def __init__(self, version: int, name: str, upgrade: Callable[[Connection], None], transactional: bool = True):
+        self.version = version
+        self.name = name
+        self.upgrade = upgrade
+        self.transactional = transactional
+
+
+def _postgres(conn: Connection) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+def _add_column(conn: Connection, table: str, name: str, ddl: str) -> bool:
+    if name in {column["name"] for column in inspect(conn).get_columns(table)}:
+        return False
+    conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+    return True
+
+
+def _create_index(conn: Connection, name: str, table: str, columns: str,
+                  using: Optional[str] = None, concurrently: bool = False):
+    if not _postgres(conn):
+        conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        return
+    if concurrently:
+        # An interrupted CREATE INDEX CONCURRENTLY leaves an invalid index behind that IF NOT EXISTS would keep
+        valid = conn.execute(text(
+            "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+        ), {"name": name}).scalar_one_or_none()
+        if valid is False:
+            conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    using_sql = f" USING {using}" if using else ""
+    concurrently_sql = "CONCURRENTLY " if concurrently else ""
+    conn.exec_driver_sql(
+        f"CREATE INDEX {concurrently_sql}IF NOT EXISTS {name} ON {table}{using_sql} ({columns})"
+    )
+
+
+def _create_tables(conn: Connection, *tables: Table):
+    # Each migration declares the tables as they were at that version, not as app/models/models.py has them now
+    for table in tables:
+        table.create(conn, checkfirst=True)
+
+
+def _baseline(conn: Connection):
+    metadata = MetaData()
+    books = Table(
+        "books", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("title", String, nullable=False),
+        Column("author", String, nullable=False),
+        Column("genre", String, nullable=False),
+        Column("year_published", Integer, nullable=False),
+        Column("summary", Text, nullable=True),
+    )
+    reviews = Table(
+        "reviews", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("book_id", Integer, ForeignKey("books.id"), nullable=False),
+        Column("user_id", Integer, nullable=False),
+        Column("review_text", Text, nullable=True),
+        Column("rating", Integer, nullable=False),
+    )
+    _create_tables(conn, books, reviews)
+
+
+def _summary_cache(conn: Connection):
+    _create_tables(conn, Table(
+        "summary_cache", MetaData(),
+        Column("key", String(64), primary_key=True),
+        Column("model", String, nullable=False),
+        Column("response", Text, nullable=False),
+        Column("created_at", Float, nullable=False, index=True),
+    ))
+
+
+def _rating_aggregates(conn: Connection):
+    added = _add_column(conn, "books", "rating_count", "INTEGER NOT NULL DEFAULT 0")
+    added = _add_column(conn, "books", "rating_sum", "INTEGER NOT NULL DEFAULT 0") or added
+    if added:
+        # One pass over reviews; reviews.book_id is not indexed yet at this version, so no per-book subqueries
+        conn.exec_driver_sql(
+            "UPDATE books SET rating_count = totals.count, rating_sum = totals.sum "
+            "FROM (SELECT book_id, count(*) AS count, sum(rating) AS sum FROM reviews GROUP BY book_id) AS totals "
+            "WHERE totals.book_id = books.id"
+        )
+
+
+def _jobs(conn: Connection):
+    _create_tables(conn, Table(
+        "jobs", MetaData(),
+        Column("id", Integer, primary_key=True, index=True),
+        Column("kind", String, nullable=False),
+        Column("status", String, nullable=False, index=True),
+        Column("book_id", Integer, nullable=True),
+        Column("payload", JSON, nullable=True),
+        Column("result", Text, nullable=True),
+        Column("error", Text, nullable=True),
+        Column("attempts", Integer, nullable=False),
+        Column("created_at", Float, nullable=False),
+        Column("updated_at", Float, nullable=False),
+    ))
+
+
+def _genre_key(conn: Connection):
+    # SQLite can only add generated columns as VIRTUAL; the index stores the values either way
+    storage = "STORED" if _postgres(conn) else "VIRTUAL"
+    _add_column(conn, "books", "genre_key", f"VARCHAR GENERATED ALWAYS AS (lower(trim(genre))) {storage}")
+    _create_index(conn, "ix_books_genre_key", "books", "genre_key")
+    if _postgres(conn):
+        conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        _create_index(conn, "ix_books_genre_key_trgm", "books", "genre_key gin_trgm_ops", using="gin")
+
+
+def _search_vectors(conn: Connection):
+    # SQLite searches with the in-process index in app/services/search.py
+    if not _postgres(conn):
+        return
+    _add_column(conn, "books", "search_vector", (
+        "tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(author, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(summary, '')), 'C')) STORED"
+    ))
+    _create_index(conn, "ix_books_search_vector", "books", "search_vector", using="gin")
+    _add_column(conn, "reviews", "search_vector",
+                "tsvector GENERATED ALWAYS AS (to_tsvector('english', coalesce(review_text, ''))) STORED")
+    _create_index(conn, "ix_reviews_search_vector", "reviews", "search_vector", using="gin")
+
+
+def _users(conn: Connection):
+    _create_tables(conn, Table(
+        "users", MetaData(),
+        Column("id", Integer, primary_key=True, index=True),
+        Column("username", String, nullable=False, unique=True, index=True),
+        Column("password_hash", String(60), nullable=False),
+    ))
+
+
+def _lookup_indexes(conn: Connection):
+    # Built without blocking writes on PostgreSQL. The trailing id lets the keyset-paginated listing
+    # seek straight to `id > after_id` within one author or year instead of sorting the matches
+    _create_index(conn, "ix_reviews_book_id", "reviews", "book_id, id", concurrently=True)
+    _create_index(conn, "ix_books_author", "books", "author, id", concurrently=True)
+    _create_index(conn, "ix_books_year_published", "books", "year_published, id", concurrently=True)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline books and reviews", _baseline),
+    Migration(2, "summary cache", _summary_cache),
+    Migration(3, "book rating aggregates", _rating_aggregates),
+    Migration(4, "summary jobs", _jobs),
+    Migration(5, "normalised genre key", _genre_key),
+    Migration(6, "full-text search vectors", _search_vectors),
+    Migration(7, "users", _users),
+    Migration(8, "review and book lookup indexes", _lookup_indexes, transactional=False),
+]
+
+
+@asynccontextmanager
+async def _migration_lock(engine: AsyncEngine) -> AsyncIterator[None]:
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+        try:
+            yield
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+
+
+async def applied_versions(engine: AsyncEngine) -> List[int]:
+    async with engine.begin() as conn:
+        await conn.run_sync(VERSIONS.create, checkfirst=True)
+        result = await conn.execute(select(VERSIONS.c.version).order_by(VERSIONS.c.version))
+        return list(result.scalars())
+
+
+def _run(conn: Connection, migration: Migration):
+    if _postgres(conn):
+        # Index builds on a large table outlast the API's statement_timeout
+        conn.exec_driver_sql("SET statement_timeout = 0")
+    try:
+        migration.upgrade(conn)
+    finally:
+        if _postgres(conn):
+            conn.exec_driver_sql("RESET statement_timeout")
+    conn.execute(insert(VERSIONS).values(version=migration.version, name=migration.name, applied_at=time.time()))
+
+
+async def migrate(engine: AsyncEngine, target: Optional[int] = None,
+                  migrations: Sequence[Migration] = MIGRATIONS) -> List[Migration]:
+    """Apply pending migrations up to `target` (default: all) in version order; returns those applied."""
+    applied: List[Migration] = []
+    async with _migration_lock(engine):
+        done = set(await applied_versions(engine))
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if migration.version in done or (target is not None and migration.version > target):
+                continue
+            logger.info("Applying migration %d: %s", migration.version, migration.name)
+            start = time.perf_counter()
+            if migration.transactional or engine.dialect.name != "postgresql":
+                async with engine.begin() as conn:
+                    await conn.run_sync(_run, migration)
+            else:
+                async with engine.connect() as conn:
+                    conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                    await conn.run_sync(_run, migration)
+            logger.info("Migration %d applied in %.1fs", migration.version, time.perf_counter() - start)
+            applied.append(migration)
+    return applied
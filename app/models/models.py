@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text
+from sqlalchemy import Column, Computed, DDL, Index, Integer, String, ForeignKey, Text, Float, JSON, case, cast, event, func
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
@@ -9,11 +10,53 @@ class Book(Base):
     title = Column(String, nullable=False)
     author = Column(String, nullable=False)
     genre = Column(String, nullable=False)
+    # Normalised genre for indexed equality lookups; kept in sync by the database
+    genre_key = Column(String, Computed("lower(trim(genre))", persisted=True), index=True)
     year_published = Column(Integer, nullable=False)
     summary = Column(Text, nullable=True)
+    # Maintained in the same transaction as every review write; see app/services/ratings.py
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
 
     reviews = relationship("Review", back_populates="book")
 
+    @hybrid_property
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return round(self.rating_sum / self.rating_count, 2)
+
+    @average_rating.inplace.expression
+    @classmethod
+    def _average_rating_expression(cls):
+        return case(
+            (cls.rating_count > 0, cast(func.round(cls.rating_sum * 1.0 / cls.rating_count, 2), Float)),
+            else_=None
+        )
+
+    # Keyset-paginated listing filters; see migration 8 in app/models/migrations.py
+    __table_args__ = (
+        Index("ix_books_author", "author", "id"),
+        Index("ix_books_year_published", "year_published", "id"),
+    )
+
+# Trigram index for fuzzy genre matching; other databases fall back to a LIKE scan
+event.listen(Book.__table__, "after_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+event.listen(Book.__table__, "after_create", DDL(
+    "CREATE INDEX IF NOT EXISTS ix_books_genre_key_trgm ON books USING gin (genre_key gin_trgm_ops)"
+).execute_if(dialect="postgresql"))
+
+# Weighted full-text vectors kept in sync by the database; SQLite uses the in-process index in app/services/search.py
+event.listen(Book.__table__, "after_create", DDL(
+    "ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(summary, '')), 'C')) STORED"
+).execute_if(dialect="postgresql"))
+event.listen(Book.__table__, "after_create", DDL(
+    "CREATE INDEX IF NOT EXISTS ix_books_search_vector ON books USING gin (search_vector)"
+).execute_if(dialect="postgresql"))
+
 class Review(Base):
     __tablename__ = "reviews"
     id = Column(Integer, primary_key=True, index=True)
@@ -23,3 +66,39 @@ class Review(Base):
     rating = Column(Integer, nullable=False)
 
     book = relationship("Book", back_populates="reviews")
+
+    __table_args__ = (Index("ix_reviews_book_id", "book_id", "id"),)
+
+event.listen(Review.__table__, "after_create", DDL(
+    "ALTER TABLE reviews ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "to_tsvector('english', coalesce(review_text, ''))) STORED"
+).execute_if(dialect="postgresql"))
+event.listen(Review.__table__, "after_create", DDL(
+    "CREATE INDEX IF NOT EXISTS ix_reviews_search_vector ON reviews USING gin (search_vector)"
+).execute_if(dialect="postgresql"))
+
+class User(Base):
+    __tablename__ = "users"
+    id = Column(Integer, primary_key=True, index=True)
+    username = Column(String, nullable=False, unique=True, index=True)
+    password_hash = Column(String(60), nullable=False)
+
+class SummaryCacheEntry(Base):
+    __tablename__ = "summary_cache"
+    key = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(Float, nullable=False, index=True)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending", index=True)
+    book_id = Column(Integer, nullable=True)
+    payload = Column(JSON, nullable=True)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
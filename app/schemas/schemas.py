@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, List
 
 class BookBase(BaseModel):
@@ -13,10 +13,23 @@ class BookCreate(BookBase):
 
 class Book(BookBase):
     id: int = Field(..., example=1)
+    rating_count: int = Field(0, example=12)
+    average_rating: Optional[float] = Field(None, example=4.25)
 
     class Config:
         from_attributes = True
 
+# Item of GET /books; every field is optional so that `fields=` projections validate
+class BookListItem(BaseModel):
+    id: Optional[int] = Field(None, example=1)
+    title: Optional[str] = Field(None, example="The Lean Startup")
+    author: Optional[str] = Field(None, example="Eric Ries")
+    genre: Optional[str] = Field(None, example="Business")
+    year_published: Optional[int] = Field(None, example=2011)
+    summary: Optional[str] = Field(None, example="A book about building lean startups using scientific methodology.")
+    rating_count: Optional[int] = Field(None, example=12)
+    average_rating: Optional[float] = Field(None, example=4.25)
+
 class BookUpdate(BaseModel):
     title: Optional[str] = Field(None, example="Updated Book Title")
     author: Optional[str] = Field(None, example="Updated Author")
@@ -27,7 +40,47 @@ class BookUpdate(BaseModel):
 class ReviewCreate(BaseModel):
     user_id: int = Field(..., example=101)
     review_text: str = Field(..., example="A must-read for anyone building a startup!")
-    rating: float = Field(..., example=4.5)
+    rating: int = Field(..., example=5)
+
+class Review(ReviewCreate):
+    id: int = Field(..., example=7)
+
+    class Config:
+        from_attributes = True
+
+class ReviewBatchResult(BaseModel):
+    book_id: int = Field(..., example=1)
+    inserted: int = Field(..., example=250)
+
+class BookWithReviews(Book):
+    reviews: List[Review] = Field(default_factory=list, description="Latest reviews first")
+
+# Response of GET /books:batch; books keep the order of the requested IDs
+class BookBatch(BaseModel):
+    books: List[BookWithReviews]
+    missing: List[int] = Field(default_factory=list, example=[42])
 
 class SummaryRequest(BaseModel):
     content: str = Field(..., example="This is a detailed narrative about how startups can grow using customer feedback and iteration.")
+
+class SummaryJobCreate(BaseModel):
+    book_id: Optional[int] = Field(None, example=1)
+    content: Optional[str] = Field(None, example="This is a detailed narrative about how startups can grow using customer feedback and iteration.")
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if (self.book_id is None) == (self.content is None):
+            raise ValueError("Provide exactly one of book_id or content")
+        return self
+
+class JobStatus(BaseModel):
+    id: int = Field(..., example=1)
+    kind: str = Field(..., example="book_summary")
+    status: str = Field(..., example="done")
+    book_id: Optional[int] = Field(None, example=1)
+    attempts: int = Field(..., example=1)
+    result: Optional[str] = Field(None, example="A book about building lean startups using scientific methodology.")
+    error: Optional[str] = Field(None, example=None)
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,193 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from app.core.config import (
+    MODEL_BACKGROUND_QUEUE_TIMEOUT,
+    MODEL_CONCURRENCY_LIMIT,
+    MODEL_QUEUE_MAX,
+    MODEL_QUEUE_TIMEOUT,
+)
+from app.core.metrics import (
+    LLM_ADMISSION_IN_FLIGHT,
+    LLM_ADMISSION_QUEUE_DEPTH,
+    LLM_ADMISSION_REJECTED,
+    LLM_ADMISSION_WAIT,
+)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Lower rank is served first
+PRIORITIES = {INTERACTIVE: 0, BACKGROUND: 1}
+
+# Calls made while handling an API request are interactive; job workers switch to background
+_current_priority: ContextVar[str] = ContextVar("model_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(name: str):
+    """Run model calls made inside the block (including tasks it spawns) at this priority."""
+    token = _current_priority.set(name)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class Overloaded(Exception):
+    """The model server is saturated; the caller should retry after `retry_after` seconds."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(f"Model server is busy ({reason}), retry in {retry_after}s")
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Caps concurrent model calls; callers over the cap wait in a bounded queue, best priority first.
+
+    A freed slot is handed straight to the next waiter, so a burst cannot starve queued callers.
+    When the queue is full an interactive caller displaces the newest background waiter; otherwise
+    it is rejected with 429. Waiters still queued at their priority's deadline get 503.
+    """
+
+    def __init__(self, limit: int = MODEL_CONCURRENCY_LIMIT, max_queue: int = MODEL_QUEUE_MAX,
+                 timeouts: Optional[Dict[str, float]] = None):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeouts = timeouts or {INTERACTIVE: MODEL_QUEUE_TIMEOUT, BACKGROUND: MODEL_BACKGROUND_QUEUE_TIMEOUT}
+        self.in_flight = 0
+        self._queues: Dict[str, Deque[asyncio.Future]] = {name: deque() for name in PRIORITIES}
+        # Moving average of slot hold time, used to estimate Retry-After
+        self._service_time = 1.0
+        self.admitted = 0
+        self.rejected = 0
+
+    def depth(self, name: Optional[str] = None) -> int:
+        if name is not None:
+            return len(self._queues[name])
+        return sum(len(q) for q in self._queues.values())
+
+    def retry_after(self) -> int:
+        # Time for the current queue to drain through the available slots
+        rounds = self.depth() / max(1, self.limit) + 1
+        return max(1, math.ceil(self._service_time * rounds))
+
+    def _update_gauges(self):
+        LLM_ADMISSION_IN_FLIGHT.set(self.in_flight)
+        for name, queue in self._queues.items():
+            LLM_ADMISSION_QUEUE_DEPTH.labels(name).set(len(queue))
+
+    def _reject(self, name: str, status_code: int, reason: str) -> Overloaded:
+        self.rejected += 1
+        LLM_ADMISSION_REJECTED.labels(name, reason).inc()
+        return Overloaded(status_code, reason, self.retry_after())
+
+    def _victim(self, rank: int) -> Optional[str]:
+        # The worst-priority non-empty queue, if it ranks below the newcomer
+        for name in sorted(PRIORITIES, key=PRIORITIES.get, reverse=True):
+            if PRIORITIES[name] <= rank:
+                return None
+            if self._queues[name]:
+                return name
+        return None
+
+    def check(self, name: Optional[str] = None):
+        """Raise Overloaded if a call at this priority would be rejected right now, without queueing.
+
+        Streaming endpoints call this before sending headers, since a later rejection can no longer change the status.
+        """
+        name = name or _current_priority.get()
+        if self.in_flight < self.limit or self.depth() < self.max_queue or self._victim(PRIORITIES[name]):
+            return
+        raise self._reject(name, 429, "queue_full")
+
+    async def acquire(self, name: Optional[str] = None):
+        name = name or _current_priority.get()
+        if self.in_flight < self.limit and not self.depth():
+            self.in_flight += 1
+            self.admitted += 1
+            LLM_ADMISSION_WAIT.labels(name).observe(0)
+            self._update_gauges()
+            return
+
+        while self.depth() >= self.max_queue:
+            victim = self._victim(PRIORITIES[name])
+            if victim is None:
+                raise self._reject(name, 429, "queue_full")
+            # A waiter that timed out or was cancelled stays queued until its task resumes; drop it and look again
+            waiter = self._queues[victim].pop()
+            if not waiter.done():
+                # Newest background waiter has waited least; it is told to come back later
+                waiter.set_exception(self._reject(victim, 503, "shed"))
+                break
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues[name]
+        queue.append(future)
+        self._update_gauges()
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(future, self.timeouts[name])
+        except asyncio.TimeoutError:
+            self._discard(queue, future)
+            LLM_ADMISSION_WAIT.labels(name).observe(time.monotonic() - start)
+            raise self._reject(name, 503, "deadline") from None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # The slot was handed over just as the caller went away
+                self.release()
+            else:
+                self._discard(queue, future)
+            raise
+        self.admitted += 1
+        LLM_ADMISSION_WAIT.labels(name).observe(time.monotonic() - start)
+
+    def _discard(self, queue: Deque[asyncio.Future], future: asyncio.Future):
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        self._update_gauges()
+
+    def release(self, held: Optional[float] = None):
+        if held is not None:
+            self._service_time = 0.8 * self._service_time + 0.2 * held
+        for name in sorted(PRIORITIES, key=PRIORITIES.get):
+            queue = self._queues[name]
+            while queue:
+                future = queue.popleft()
+                if not future.done():
+                    # Hand the slot over; in_flight stays the same
+                    future.set_result(None)
+                    self._update_gauges()
+                    return
+        self.in_flight -= 1
+        self._update_gauges()
+
+    @asynccontextmanager
+    async def slot(self, name: Optional[str] = None) -> AsyncIterator[None]:
+        await self.acquire(name)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": {name: len(queue) for name, queue in self._queues.items()},
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+model_admission = AdmissionController()
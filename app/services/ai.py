@@ -1,25 +1,96 @@
-import httpx
-from dotenv import load_dotenv
-import os
+import json
+import logging
+import time
+from typing import AsyncIterator
 
-MODEL_BASE_URL = os.getenv("MODEL_BASE_URL")
+from app.core.config import MODEL_NAME
+from app.core.metrics import LLM_FAILURES, LLM_TIME_TO_FIRST_TOKEN, record_llm_call
+from app.services.admission import Overloaded, model_admission
+from app.services.cache import cache_key, summary_cache
+from app.services.model_client import post_with_retries, stream_with_retries
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+FAILED_SUMMARY = "Failed to generate summary"
+
+# Concurrent requests for the same prompt (e.g. many clients opening one book) share one generation
+summary_flight = SingleFlight("summary")
+
+async def request_summary(prompt: str) -> str:
+    async with model_admission.slot():
+        start = time.perf_counter()
+        response = await post_with_retries("/api/generate", {
+            "model": MODEL_NAME,
+            "prompt": prompt,
+            "stream": False
+        })
+    response.raise_for_status()
+    body = response.json()
+    record_llm_call("generate", time.perf_counter() - start, prompt, body["response"], body)
+    return body["response"]
 
 async def generate_summary(prompt: str) -> str:
-    print(MODEL_BASE_URL)
+    key = cache_key(prompt, MODEL_NAME)
+    cached = await summary_cache.get(key)
+    if cached is not None:
+        return cached
+    return await summary_flight.do(key, lambda: _generate_and_cache(prompt, key))
+
+async def _generate_and_cache(prompt: str, key: str) -> str:
     try:
-        timeout = httpx.Timeout(300)
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                f"{MODEL_BASE_URL}/api/generate",
-                headers={"Content-Type": "application/json"},
-                json={
-                    "model": "llama3",
-                    "prompt": prompt,
-                    "stream": False
-                }
-            )
-            response.raise_for_status()
-            return response.json()["response"]
+        summary = await request_summary(prompt)
+    except Overloaded:
+        # Not a model failure: the caller gets 429/503 with Retry-After instead of a placeholder summary
+        raise
     except Exception as e:
-        print("AI Summary Error:", e)
-        return "Failed to generate summary"
+        LLM_FAILURES.labels("generate").inc()
+        logger.warning("AI summary error: %s", e)
+        return FAILED_SUMMARY
+
+    # Failed generations return early above, so only real model output is cached
+    await summary_cache.set(key, MODEL_NAME, summary)
+    return summary
+
+async def stream_summary(prompt: str) -> AsyncIterator[str]:
+    key = cache_key(prompt, MODEL_NAME)
+    cached = await summary_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    # Ollama streams one JSON object per line; the last one carries "done": true and the token counts
+    parts = []
+    try:
+        async with model_admission.slot():
+            start = time.perf_counter()
+            async with stream_with_retries("/api/generate", {"model": MODEL_NAME, "prompt": prompt, "stream": True}) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise RuntimeError(chunk["error"])
+                    token = chunk.get("response", "")
+                    if token:
+                        if not parts:
+                            LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start)
+                        parts.append(token)
+                        yield token
+                    if chunk.get("done"):
+                        break
+                else:
+                    raise RuntimeError("Model stream ended before completion")
+    except Overloaded:
+        raise
+    except Exception:
+        LLM_FAILURES.labels("stream").inc()
+        raise
+
+    text = "".join(parts)
+    record_llm_call("stream", time.perf_counter() - start, prompt, text, chunk)
+    await summary_cache.set(key, MODEL_NAME, text)
+
+async def invalidate_summary(prompt: str):
+    await summary_cache.invalidate(cache_key(prompt, MODEL_NAME))
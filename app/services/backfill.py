@@ -0,0 +1,125 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy import bindparam, func, select, update
+
+from app.core.config import BACKFILL_BATCH_SIZE, BACKFILL_CHECKPOINT, BACKFILL_CONCURRENCY
+from app.core.database import AsyncSessionLocal
+from app.models.models import Book as BookModel
+from app.services.admission import BACKGROUND, Overloaded, priority
+from app.services.ai import FAILED_SUMMARY, generate_summary
+from app.services.response_cache import book_key, response_cache
+from app.services.summarizer import book_summary_prompt
+
+logger = logging.getLogger(__name__)
+
+# Core UPDATE run once per written book in a single executemany; never overwrites a summary written meanwhile
+WRITE_SUMMARY = (
+    update(BookModel.__table__)
+    .where(BookModel.__table__.c.id == bindparam("book_id"), BookModel.__table__.c.summary.is_(None))
+    .values(summary=bindparam("summary"))
+)
+
+
+def load_checkpoint(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"last_id": 0, "written": 0, "failed": []}
+
+
+def save_checkpoint(path: str, state: dict):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write then rename, so an interrupted run never leaves a half-written checkpoint
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+async def _generate(book: dict, semaphore: asyncio.Semaphore) -> Optional[str]:
+    async with semaphore:
+        try:
+            summary = await generate_summary(book_summary_prompt(book["title"], book["author"]))
+        except Overloaded as e:
+            logger.warning("Model busy, skipping book %d: %s", book["id"], e)
+            return None
+    return None if summary == FAILED_SUMMARY else summary
+
+
+async def backfill_summaries(session_factory=AsyncSessionLocal, checkpoint: str = BACKFILL_CHECKPOINT,
+                             batch_size: int = BACKFILL_BATCH_SIZE, concurrency: int = BACKFILL_CONCURRENCY,
+                             max_batches: Optional[int] = None,
+                             progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """Generate and store summaries for books that have none, `batch_size` books at a time in ID order.
+
+    Each batch is read with a keyset query, summarised with at most `concurrency` model calls in flight,
+    written back in one executemany UPDATE and then recorded in the checkpoint file, so a rerun continues
+    after the last written batch. No database connection is held while the model generates.
+    Books whose generation fails keep a NULL summary and are listed in the checkpoint's `failed`.
+    """
+    state = load_checkpoint(checkpoint)
+    async with session_factory() as session:
+        remaining = (await session.execute(
+            select(func.count()).select_from(BookModel)
+            .where(BookModel.summary.is_(None), BookModel.id > state["last_id"])
+        )).scalar_one()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    processed = written = batches = 0
+    failed: List[int] = []
+    while max_batches is None or batches < max_batches:
+        async with session_factory() as session:
+            result = await session.execute(
+                select(BookModel.id, BookModel.title, BookModel.author)
+                .where(BookModel.summary.is_(None), BookModel.id > state["last_id"])
+                .order_by(BookModel.id)
+                .limit(batch_size)
+            )
+            books = [dict(row) for row in result.mappings()]
+        if not books:
+            break
+
+        with priority(BACKGROUND):
+            summaries = await asyncio.gather(*(_generate(book, semaphore) for book in books))
+        rows = [{"book_id": book["id"], "summary": s} for book, s in zip(books, summaries) if s is not None]
+        batch_failed = [book["id"] for book, s in zip(books, summaries) if s is None]
+        if rows:
+            async with session_factory() as session:
+                await session.execute(WRITE_SUMMARY, rows)
+                await session.commit()
+            await response_cache.invalidate(*(book_key(row["book_id"]) for row in rows))
+
+        state["last_id"] = books[-1]["id"]
+        state["written"] += len(rows)
+        state["failed"] += batch_failed
+        save_checkpoint(checkpoint, state)
+
+        batches += 1
+        processed += len(books)
+        written += len(rows)
+        failed += batch_failed
+        if progress is not None:
+            elapsed = time.perf_counter() - start
+            rate = processed / elapsed if elapsed else 0.0
+            left = max(0, remaining - processed)
+            progress({
+                "processed": processed, "written": written, "failed": len(failed), "remaining": left,
+                "books_per_second": rate, "eta_seconds": left / rate if rate else None, "last_id": state["last_id"],
+            })
+
+    return {
+        "processed": processed,
+        "written": written,
+        "failed": failed,
+        "last_id": state["last_id"],
+        "seconds": time.perf_counter() - start,
+    }
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.config import LLM_CACHE_DB_MAX_ENTRIES, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import LLM_CACHE_LOOKUPS
+from app.models.models import SummaryCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Run the persistent tier's size eviction once every N writes instead of on every write
+EVICTION_INTERVAL = 100
+
+
+def cache_key(prompt: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def upsert_entry(dialect_name: str, values: dict):
+    # One statement, so concurrent writers of the same key (other requests or workers) cannot collide
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = insert(SummaryCacheEntry).values(**values)
+    return statement.on_conflict_do_update(
+        index_elements=[SummaryCacheEntry.key],
+        set_={name: statement.excluded[name] for name in values if name != "key"},
+    )
+
+
+class SummaryCache:
+    """Two-tier cache for LLM outputs: an in-process LRU in front of a database table."""
+
+    def __init__(self, max_entries: int, db_max_entries: int, ttl_seconds: int, session_factory=AsyncSessionLocal):
+        self.max_entries = max_entries
+        self.db_max_entries = db_max_entries
+        self.ttl_seconds = ttl_seconds
+        self.session_factory = session_factory
+        self._entries = OrderedDict()
+        self._writes = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.db_hits
+
+    def _expired(self, created_at: float) -> bool:
+        return time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, response: str, created_at: float):
+        self._entries[key] = (response, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            response, created_at = entry
+            if not self._expired(created_at):
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                LLM_CACHE_LOOKUPS.labels("memory_hit").inc()
+                return response
+            del self._entries[key]
+
+        try:
+            async with self.session_factory() as session:
+                row = await session.get(SummaryCacheEntry, key)
+                if row is not None and self._expired(row.created_at):
+                    await session.delete(row)
+                    await session.commit()
+                    row = None
+        except Exception as e:
+            logger.warning("Summary cache read error: %s", e)
+            row = None
+
+        if row is None:
+            self.misses += 1
+            LLM_CACHE_LOOKUPS.labels("miss").inc()
+            return None
+        self._remember(key, row.response, row.created_at)
+        self.db_hits += 1
+        LLM_CACHE_LOOKUPS.labels("db_hit").inc()
+        return row.response
+
+    async def set(self, key: str, model: str, response: str):
+        created_at = time.time()
+        self._remember(key, response, created_at)
+        try:
+            async with self.session_factory() as session:
+                dialect_name = (await session.connection()).dialect.name
+                await session.execute(upsert_entry(
+                    dialect_name, {"key": key, "model": model, "response": response, "created_at": created_at}
+                ))
+                await session.commit()
+                self._writes += 1
+                if self._writes % EVICTION_INTERVAL == 0:
+                    await self._evict(session)
+        except Exception as e:
+            logger.warning("Summary cache write error: %s", e)
+
+    async def _evict(self, session):
+        await session.execute(
+            delete(SummaryCacheEntry).where(SummaryCacheEntry.created_at < time.time() - self.ttl_seconds)
+        )
+        count = (await session.execute(select(func.count()).select_from(SummaryCacheEntry))).scalar_one()
+        overflow = count - self.db_max_entries
+        if overflow > 0:
+            oldest = select(SummaryCacheEntry.key).order_by(SummaryCacheEntry.created_at).limit(overflow)
+            await session.execute(delete(SummaryCacheEntry).where(SummaryCacheEntry.key.in_(oldest)))
+        await session.commit()
+
+    async def invalidate(self, key: str):
+        self._entries.pop(key, None)
+        async with self.session_factory() as session:
+            await session.execute(delete(SummaryCacheEntry).where(SummaryCacheEntry.key == key))
+            await session.commit()
+
+    async def clear(self, persistent: bool = True):
+        self._entries.clear()
+        if not persistent:
+            return
+        async with self.session_factory() as session:
+            await session.execute(delete(SummaryCacheEntry))
+            await session.commit()
+
+    def reset_stats(self):
+        self.memory_hits = self.db_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "memory_entries": len(self._entries),
+        }
+
+
+summary_cache = SummaryCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_DB_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS)
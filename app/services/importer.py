@@ -0,0 +1,157 @@
+import csv
+import json
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import IMPORT_BATCH_SIZE, IMPORT_GIN_PENDING_LIST_LIMIT, IMPORT_MAX_REPORTED_ERRORS
+from app.models.models import Book as BookModel
+from app.schemas.schemas import BookCreate
+
+BOOK_COLUMNS = list(BookCreate.model_fields)
+
+# (line number, parsed row or the error that made it unparseable)
+Record = Tuple[int, object]
+
+
+def decode_line(line: bytes):
+    try:
+        return line.decode("utf-8").rstrip("\r")
+    except UnicodeDecodeError as e:
+        # Reported against this line like any other bad row; the rest of the input is still imported
+        return ValueError(f"Invalid UTF-8 at byte {e.start}: {e.reason}")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (line number, decoded line or the ValueError for a line that is not valid UTF-8)."""
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            yield line_no, decode_line(line)
+    if buffer:
+        yield line_no + 1, decode_line(buffer)
+
+
+async def parse_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    async for line_no, line in iter_lines(chunks):
+        if isinstance(line, Exception):
+            yield line_no, line
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, e
+
+
+async def parse_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    header = None
+    pending: List[str] = []
+    start = 0
+    async for line_no, line in iter_lines(chunks):
+        if isinstance(line, Exception):
+            # Drops the record the line belongs to, including earlier lines of a multi-line quoted field
+            yield (start if pending else line_no), line
+            pending = []
+            continue
+        if not pending:
+            start = line_no
+        pending.append(line)
+        # A quoted field may span lines; the record is complete once its quotes balance
+        record = "\n".join(pending)
+        if record.count('"') % 2:
+            continue
+        pending = []
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        if len(values) != len(header):
+            yield start, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        yield start, {k: (v if v != "" else None) for k, v in zip(header, values)}
+    if pending:
+        yield start, ValueError("Unterminated quoted field")
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+
+    def error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self) -> dict:
+        return {"inserted": self.inserted, "failed": self.failed, "errors": self.errors}
+
+
+async def _insert_rows(session: AsyncSession, rows: List[dict]):
+    connection = await session.connection()
+    if connection.dialect.name == "postgresql":
+        # With the default 4MB pending list, the search and trigram GIN indexes are merged many times per import
+        await connection.exec_driver_sql(f"SET LOCAL gin_pending_list_limit = '{IMPORT_GIN_PENDING_LIST_LIMIT}'")
+    if connection.dialect.name == "postgresql" and connection.dialect.driver == "asyncpg":
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            BookModel.__tablename__,
+            records=[tuple(row[c] for c in BOOK_COLUMNS) for row in rows],
+            columns=BOOK_COLUMNS,
+        )
+    else:
+        # A Core executemany (not the ORM bulk path) is sent as multi-row INSERT ... VALUES statements
+        await connection.execute(insert(BookModel.__table__), rows)
+
+
+async def _flush(session: AsyncSession, batch: List[Tuple[int, dict]], report: ImportReport):
+    try:
+        async with session.begin_nested():
+            await _insert_rows(session, [row for _, row in batch])
+        report.inserted += len(batch)
+    except Exception:
+        # Retry row by row so one bad row does not sink the rest of the batch
+        for line_no, row in batch:
+            try:
+                async with session.begin_nested():
+                    await session.execute(insert(BookModel.__table__), [row])
+                report.inserted += 1
+            except Exception as e:
+                report.error(line_no, str(getattr(e, "orig", e)))
+    await session.commit()
+
+
+async def import_books(session: AsyncSession, records: AsyncIterator[Record], batch_size: Optional[int] = None) -> dict:
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    report = ImportReport()
+    batch: List[Tuple[int, dict]] = []
+    async for line_no, record in records:
+        if isinstance(record, Exception):
+            report.error(line_no, str(record))
+            continue
+        if not isinstance(record, dict):
+            report.error(line_no, "Expected a JSON object")
+            continue
+        try:
+            book = BookCreate.model_validate(record)
+        except ValidationError as e:
+            report.error(line_no, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            continue
+        batch.append((line_no, book.model_dump()))
+        if len(batch) >= batch_size:
+            await _flush(session, batch, report)
+            batch = []
+    if batch:
+        await _flush(session, batch, report)
+    return report.as_dict()
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional, Set
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF, JOB_WORKERS
+from app.core.database import AsyncSessionLocal
+from app.models.models import Book as BookModel, Job as JobModel
+from app.services.admission import BACKGROUND, Overloaded, priority
+from app.services.ai import FAILED_SUMMARY, generate_summary
+from app.services.response_cache import book_key, response_cache
+from app.services.search import search_index
+from app.services.similarity import similarity_index
+from app.services.summarizer import book_summary_prompt
+
+logger = logging.getLogger(__name__)
+
+BOOK_SUMMARY = "book_summary"
+CONTENT_SUMMARY = "content_summary"
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobError(Exception):
+    pass
+
+
+def new_job(kind: str, book_id: Optional[int] = None, payload: Optional[dict] = None) -> JobModel:
+    now = time.time()
+    return JobModel(kind=kind, status=PENDING, book_id=book_id, payload=payload, attempts=0, created_at=now, updated_at=now)
+
+
+async def _summarize(prompt: str) -> str:
+    summary = await generate_summary(prompt)
+    if summary == FAILED_SUMMARY:
+        raise JobError(FAILED_SUMMARY)
+    return summary
+
+
+async def run_book_summary(session: AsyncSession, job: JobModel) -> str:
+    book = await session.get(BookModel, job.book_id)
+    if book is None:
+        raise JobError("Book not found")
+    prompt = book_summary_prompt(book.title, book.author)
+    await session.commit()
+    summary = await _summarize(prompt)
+    # Never overwrite a summary someone wrote while the job was queued
+    await session.execute(
+        update(BookModel)
+        .where(BookModel.id == job.book_id, BookModel.summary.is_(None))
+        .values(summary=summary)
+    )
+    return summary
+
+
+async def run_content_summary(session: AsyncSession, job: JobModel) -> str:
+    return await _summarize(book_summary_prompt(job.payload["content"]))
+
+
+HANDLERS = {
+    BOOK_SUMMARY: run_book_summary,
+    CONTENT_SUMMARY: run_content_summary,
+}
+
+
+class JobQueue:
+    """In-process worker pool for jobs stored in the jobs table.
+
+    The table is the source of truth: the asyncio queue only carries job ids, jobs are claimed with a
+    conditional UPDATE so a job is never run twice, and pending jobs are picked up again on start.
+    A running job holds a lease: its worker refreshes `updated_at` while the handler runs, and any
+    process only takes back running jobs whose lease has expired, so a live peer's jobs are left alone.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 retry_backoff: float = JOB_RETRY_BACKOFF, lease_seconds: float = JOB_LEASE_SECONDS,
+                 session_factory=AsyncSessionLocal):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease_seconds = lease_seconds
+        self.session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._timers: Set[asyncio.TimerHandle] = set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, session_factory=None):
+        if self.running:
+            return
+        if session_factory is not None:
+            self.session_factory = session_factory
+        self._queue = asyncio.Queue()
+        async with self.session_factory() as session:
+            await self._reclaim_expired(session)
+            pending = await session.execute(select(JobModel.id).where(JobModel.status == PENDING).order_by(JobModel.id))
+            for job_id in pending.scalars():
+                self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+
+    async def _reclaim_expired(self, session: AsyncSession) -> List[int]:
+        # Only jobs whose worker stopped refreshing the lease, i.e. a process that crashed or was killed
+        result = await session.execute(
+            update(JobModel)
+            .where(JobModel.status == RUNNING, JobModel.updated_at < time.time() - self.lease_seconds)
+            .values(status=PENDING, updated_at=time.time())
+            .returning(JobModel.id)
+        )
+        job_ids = list(result.scalars())
+        await session.commit()
+        if job_ids:
+            logger.warning("Retrying jobs with expired leases: %s", job_ids)
+        return job_ids
+
+    async def _reaper(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds)
+            try:
+                async with self.session_factory() as session:
+                    for job_id in await self._reclaim_expired(session):
+                        self.notify(job_id)
+            except Exception:
+                logger.exception("Job lease reaper error")
+
+    async def _heartbeat(self, job_id: int):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                async with self.session_factory() as session:
+                    await session.execute(
+                        update(JobModel)
+                        .where(JobModel.id == job_id, JobModel.status == RUNNING)
+                        .values(updated_at=time.time())
+                    )
+                    await session.commit()
+            except Exception:
+                logger.exception("Job %d heartbeat error", job_id)
+
+    async def stop(self):
+        for timer in self._timers:
+            timer.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._timers = set()
+        self._queue = None
+
+    def notify(self, job_id: int):
+        # Without running workers the job stays pending in the table until the next start()
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+
+    def _schedule_retry(self, job_id: int, delay: float):
+        def fire():
+            self._timers.discard(handle)
+            self.notify(job_id)
+
+        handle = asyncio.get_running_loop().call_later(delay, fire)
+        self._timers.add(handle)
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except Exception:
+                logger.exception("Job worker error")
+            finally:
+                self._queue.task_done()
+
+    async def _claim(self, session: AsyncSession, job_id: int) -> Optional[JobModel]:
+        result = await session.execute(
+            update(JobModel)
+            .where(JobModel.id == job_id, JobModel.status == PENDING)
+            .values(status=RUNNING, attempts=JobModel.attempts + 1, updated_at=time.time())
+            .returning(JobModel.id)
+        )
+        claimed = result.scalar_one_or_none() is not None
+        job = await session.get(JobModel, job_id) if claimed else None
+        # Release the connection; handlers can spend minutes waiting on the model
+        await session.commit()
+        return job
+
+    async def _process(self, job_id: int):
+        async with self.session_factory() as session:
+            job = await self._claim(session, job_id)
+            if job is None:
+                return
+            try:
+                # Holds the lease while the handler waits on the model; a cancelled worker leaves the job
+                # running, and it is retried once the lease expires
+                heartbeat = asyncio.create_task(self._heartbeat(job_id))
+                try:
+                    # Queued behind interactive requests for model slots
+                    with priority(BACKGROUND):
+                        result = await HANDLERS[job.kind](session, job)
+                finally:
+                    heartbeat.cancel()
+            except Overloaded as e:
+                # Saturation is not the job's fault, so it does not use up an attempt
+                await session.rollback()
+                job = await session.get(JobModel, job_id)
+                job.status = PENDING
+                job.attempts -= 1
+                job.updated_at = time.time()
+                await session.commit()
+                self._schedule_retry(job_id, max(self.retry_backoff, e.retry_after))
+                return
+            except Exception as e:
+                await session.rollback()
+                job = await session.get(JobModel, job_id)
+                job.error = str(e)
+                job.updated_at = time.time()
+                if job.attempts < self.max_attempts:
+                    job.status = PENDING
+                    await session.commit()
+                    self._schedule_retry(job_id, self.retry_backoff * 2 ** (job.attempts - 1))
+                else:
+                    job.status = FAILED
+                    await session.commit()
+                return
+            job.status = DONE
+            job.result = result
+            job.error = None
+            job.updated_at = time.time()
+            await session.commit()
+            if job.book_id is not None:
+                # The book may have a new summary now
+                similarity_index.mark_dirty(job.book_id)
+                search_index.mark_dirty(job.book_id)
+                await response_cache.invalidate(book_key(job.book_id))
+
+
+job_queue = JobQueue()
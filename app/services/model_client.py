@@ -0,0 +1,110 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import httpx
+
+from app.core.config import (
+    MODEL_BASE_URL,
+    MODEL_BASE_URLS,
+    MODEL_CONNECT_TIMEOUT,
+    MODEL_KEEPALIVE_EXPIRY,
+    MODEL_MAX_CONNECTIONS,
+    MODEL_MAX_KEEPALIVE_CONNECTIONS,
+    MODEL_MAX_RETRIES,
+    MODEL_POOL_TIMEOUT,
+    MODEL_READ_TIMEOUT,
+    MODEL_RETRY_BACKOFF,
+    MODEL_WRITE_TIMEOUT,
+)
+from app.services.model_router import Backend, ModelRouter, Send
+
+# Errors raised before the request reached the model server; a single explicit client only retries these
+CONNECTION_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+_router: Optional[ModelRouter] = None
+
+
+def create_client(base_url: Optional[str] = MODEL_BASE_URL) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=base_url or "",
+        limits=httpx.Limits(
+            max_connections=MODEL_MAX_CONNECTIONS,
+            max_keepalive_connections=MODEL_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=MODEL_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=MODEL_CONNECT_TIMEOUT,
+            read=MODEL_READ_TIMEOUT,
+            write=MODEL_WRITE_TIMEOUT,
+            pool=MODEL_POOL_TIMEOUT,
+        ),
+    )
+
+
+def create_router(base_urls: Optional[List[str]] = None, **options) -> ModelRouter:
+    # One pooled client per backend
+    base_urls = base_urls or MODEL_BASE_URLS or [""]
+    return ModelRouter([Backend(url, create_client(url)) for url in base_urls], **options)
+
+
+async def start_client():
+    global _router
+    if _router is None:
+        _router = create_router()
+    _router.start_probes()
+
+
+async def close_client():
+    global _router
+    if _router is not None:
+        await _router.aclose()
+        _router = None
+
+
+def get_router() -> ModelRouter:
+    # Scripts and tests that never run the app lifespan still get pooled clients
+    global _router
+    if _router is None:
+        _router = create_router()
+    return _router
+
+
+async def _retry_single(client: httpx.AsyncClient, send: Send) -> httpx.Response:
+    for attempt in range(MODEL_MAX_RETRIES + 1):
+        try:
+            return await send(client)
+        except CONNECTION_ERRORS:
+            if attempt == MODEL_MAX_RETRIES:
+                raise
+            await asyncio.sleep(MODEL_RETRY_BACKOFF * 2 ** attempt)
+
+
+async def post_with_retries(path: str, payload: dict, client: Optional[httpx.AsyncClient] = None) -> httpx.Response:
+    def send(c: httpx.AsyncClient):
+        return c.post(path, json=payload)
+
+    if client is not None:
+        return await _retry_single(client, send)
+    _, response = await get_router().request(path, send)
+    return response
+
+
+@asynccontextmanager
+async def stream_with_retries(path: str, payload: dict, client: Optional[httpx.AsyncClient] = None) -> AsyncIterator[httpx.Response]:
+    def send(c: httpx.AsyncClient):
+        return c.send(c.build_request("POST", path, json=payload), stream=True)
+
+    backend = None
+    if client is not None:
+        response = await _retry_single(client, send)
+    else:
+        # Hedging for streams races on the response headers; the backend stays busy until the stream closes
+        backend, response = await get_router().request(f"{path}:stream", send, keep_open=True)
+    try:
+        yield response
+    finally:
+        # Closing the response drops the upstream connection, which stops generation on the model server
+        await response.aclose()
+        if backend is not None:
+            backend.end()
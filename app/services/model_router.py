@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+
+from app.core.config import (
+    MODEL_BREAKER_FAILURES,
+    MODEL_BREAKER_RESET,
+    MODEL_HEALTH_INTERVAL,
+    MODEL_HEALTH_PATH,
+    MODEL_HEALTH_TIMEOUT,
+    MODEL_HEDGE_MIN_SAMPLES,
+    MODEL_HEDGE_PERCENTILE,
+    MODEL_MAX_RETRIES,
+    MODEL_RETRY_BACKOFF,
+)
+from app.core.metrics import LLM_BACKEND_CIRCUIT, LLM_BACKEND_OUTSTANDING, LLM_BACKEND_REQUESTS, LLM_HEDGES
+
+logger = logging.getLogger(__name__)
+
+# Failures before the backend started on the request, retried on another backend along with 5xx answers.
+# A read timeout means the backend is still generating; hedging and the caller's deadline handle that
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+CIRCUIT_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Recent successful latencies kept per request kind for the hedging threshold
+LATENCY_WINDOW = 500
+
+Send = Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]
+
+
+class BackendError(Exception):
+    """A backend answered with a server error."""
+
+    def __init__(self, url: str, status_code: int):
+        super().__init__(f"Model backend {url} returned {status_code}")
+        self.status_code = status_code
+
+
+class BackendUnavailable(Exception):
+    """Every backend is failing health checks or has an open circuit."""
+
+
+class Backend:
+    """One model server: its pooled client, in-flight request count, health and circuit breaker state.
+
+    The circuit opens after `failure_threshold` consecutive failures and stays open for `reset_timeout`
+    seconds. It then lets a single trial request through: success closes it, failure opens it again.
+    """
+
+    def __init__(self, url: str, client: httpx.AsyncClient,
+                 failure_threshold: int = MODEL_BREAKER_FAILURES, reset_timeout: float = MODEL_BREAKER_RESET):
+        self.url = url
+        self.client = client
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.outstanding = 0
+        self.healthy = True
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self._set_state(CLOSED)
+
+    def _set_state(self, state: str):
+        self.state = state
+        LLM_BACKEND_CIRCUIT.labels(self.url).set(CIRCUIT_VALUES[state])
+
+    def available(self) -> bool:
+        if not self.healthy:
+            return False
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            return not self.trial_in_flight
+        return self.state == CLOSED
+
+    def begin(self):
+        self.outstanding += 1
+        LLM_BACKEND_OUTSTANDING.labels(self.url).set(self.outstanding)
+        if self.state == HALF_OPEN:
+            self.trial_in_flight = True
+
+    def end(self):
+        self.outstanding -= 1
+        LLM_BACKEND_OUTSTANDING.labels(self.url).set(self.outstanding)
+
+    def record_success(self):
+        LLM_BACKEND_REQUESTS.labels(self.url, "success").inc()
+        self.failures = 0
+        self.trial_in_flight = False
+        if self.state != CLOSED:
+            logger.info("Model backend %s recovered", self.url)
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        LLM_BACKEND_REQUESTS.labels(self.url, "failure").inc()
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            logger.warning("Model backend %s circuit opened after %d failures", self.url, self.failures)
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def record_cancelled(self):
+        # A hedged request that lost the race says nothing about the backend
+        self.trial_in_flight = False
+
+
+class ModelRouter:
+    """Spreads model requests over several backends.
+
+    Each attempt goes to the available backend with the fewest outstanding requests, rotating between
+    ties. Server errors and transport failures count against the backend's circuit. After a server error
+    or a failure to connect the request moves on to the next backend; other transport errors are raised. With `hedge_percentile` set, a request still unanswered after that percentile
+    of recent latencies is duplicated to a second backend; the first success wins and the other is cancelled.
+    """
+
+    def __init__(self, backends: List[Backend], max_retries: int = MODEL_MAX_RETRIES,
+                 retry_backoff: float = MODEL_RETRY_BACKOFF, hedge_percentile: float = MODEL_HEDGE_PERCENTILE,
+                 hedge_min_samples: int = MODEL_HEDGE_MIN_SAMPLES):
+        self.backends = backends
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.hedges = 0
+        self.hedges_won = 0
+        self._next = 0
+        self._prober: Optional[asyncio.Task] = None
+
+    def choose(self, exclude: Iterable[Backend] = ()) -> Optional[Backend]:
+        excluded = set(exclude)
+        count = len(self.backends)
+        start, self._next = self._next, (self._next + 1) % max(1, count)
+        # Rotating the starting point spreads ties instead of always favouring the first backend
+        candidates = [
+            self.backends[(start + i) % count] for i in range(count)
+            if self.backends[(start + i) % count] not in excluded and self.backends[(start + i) % count].available()
+        ]
+        return min(candidates, key=lambda b: b.outstanding) if candidates else None
+
+    def hedge_delay(self, kind: str) -> Optional[float]:
+        samples = self.latencies.get(kind)
+        if not self.hedge_percentile or len(self.backends) < 2 or not samples or len(samples) < self.hedge_min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(self.hedge_percentile * len(ordered)))]
+
+    async def _call(self, backend: Backend, kind: str, send: Send, keep_open: bool) -> Tuple[Backend, httpx.Response]:
+        backend.begin()
+        start = time.perf_counter()
+        held = False
+        try:
+            response = await send(backend.client)
+            if response.status_code >= 500:
+                await response.aclose()
+                backend.record_failure()
+                raise BackendError(backend.url, response.status_code)
+            backend.record_success()
+            self.latencies.setdefault(kind, deque(maxlen=LATENCY_WINDOW)).append(time.perf_counter() - start)
+            held = keep_open
+            return backend, response
+        except httpx.TransportError:
+            backend.record_failure()
+            raise
+        except asyncio.CancelledError:
+            backend.record_cancelled()
+            raise
+        finally:
+            if not held:
+                backend.end()
+
+    async def _attempt(self, primary: Backend, kind: str, send: Send, keep_open: bool,
+                       exclude: Set[Backend]) -> Tuple[Backend, httpx.Response]:
+        delay = self.hedge_delay(kind)
+        tasks = [asyncio.ensure_future(self._call(primary, kind, send, keep_open))]
+        winner = None
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                secondary = None if done else self.choose(exclude | {primary})
+                if secondary is not None:
+                    self.hedges += 1
+                    LLM_HEDGES.labels("sent").inc()
+                    tasks.append(asyncio.ensure_future(self._call(secondary, kind, send, keep_open)))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if task in done and task.exception() is None:
+                        winner = task
+                        if task is not tasks[0]:
+                            self.hedges_won += 1
+                            LLM_HEDGES.labels("won").inc()
+                        return task.result()
+                error = next(task.exception() for task in done)
+            raise error
+        finally:
+            losers = [task for task in tasks if task is not winner]
+            for task in losers:
+                task.cancel()
+            for task in losers:
+                try:
+                    backend, response = await task
+                except BaseException:
+                    continue
+                # Finished in the same instant as the winner; release it
+                await response.aclose()
+                if keep_open:
+                    backend.end()
+
+    async def request(self, kind: str, send: Send, keep_open: bool = False) -> Tuple[Backend, httpx.Response]:
+        """Send through the best backend, failing over on errors; `keep_open` leaves the backend counted busy."""
+        tried: Set[Backend] = set()
+        error: Optional[BaseException] = None
+        for attempt in range(self.max_retries + 1):
+            backend = self.choose(tried) or self.choose()
+            if backend is None:
+                raise BackendUnavailable("No model backend available") from error
+            if backend in tried:
+                # Every backend has failed once already; back off before going round again
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - len(self.backends)))
+            tried.add(backend)
+            try:
+                return await self._attempt(backend, kind, send, keep_open, tried)
+            except (BackendError, *RETRYABLE_ERRORS) as e:
+                error = e
+        raise error
+
+    async def probe(self):
+        async def check(backend: Backend):
+            try:
+                response = await backend.client.get(MODEL_HEALTH_PATH, timeout=MODEL_HEALTH_TIMEOUT)
+                healthy = response.status_code < 500
+            except httpx.HTTPError:
+                healthy = False
+            if healthy != backend.healthy:
+                logger.warning("Model backend %s is %s", backend.url, "healthy" if healthy else "unhealthy")
+            backend.healthy = healthy
+
+        await asyncio.gather(*(check(backend) for backend in self.backends))
+
+    async def _probe_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.probe()
+            except Exception:
+                logger.exception("Model backend probe error")
+
+    def start_probes(self, interval: float = MODEL_HEALTH_INTERVAL):
+        # A single backend has nowhere else to send traffic, so probing it would only add load
+        if self._prober is None and interval > 0 and len(self.backends) > 1:
+            self._prober = asyncio.create_task(self._probe_forever(interval))
+
+    async def aclose(self):
+        if self._prober is not None:
+            self._prober.cancel()
+            self._prober = None
+        for backend in self.backends:
+            await backend.client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "backends": [
+                {"url": b.url, "outstanding": b.outstanding, "healthy": b.healthy, "circuit": b.state}
+                for b in self.backends
+            ],
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+        }
@@ -0,0 +1,83 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import bindparam, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import Book as BookModel, Review as ReviewModel
+
+
+# Every review insert, rating change or delete must call this in the same transaction as the write:
+#   add:    apply_rating_change(session, book_id, 1, rating)
+#   update: apply_rating_change(session, book_id, 0, new_rating - old_rating)
+#   delete: apply_rating_change(session, book_id, -1, -rating)
+# Returns the book's genre, or None if the book does not exist
+async def apply_rating_change(session: AsyncSession, book_id: int, count_delta: int, sum_delta: int) -> Optional[str]:
+    result = await session.execute(
+        update(BookModel)
+        .where(BookModel.id == book_id)
+        .values(
+            rating_count=BookModel.rating_count + count_delta,
+            rating_sum=BookModel.rating_sum + sum_delta
+        )
+        .returning(BookModel.genre)
+    )
+    return result.scalar_one_or_none()
+
+
+BOOKS = BookModel.__table__
+
+ADD_TO_AGGREGATES = (
+    update(BOOKS)
+    .where(BOOKS.c.id == bindparam("b_id"))
+    .values(rating_count=BOOKS.c.rating_count + bindparam("b_count"), rating_sum=BOOKS.c.rating_sum + bindparam("b_sum"))
+)
+
+
+# Bulk form of the add case above, for reviews of any number of books: one multi-row INSERT and one
+# executemany UPDATE of the aggregates. Book rows are locked in ID order first, so concurrent batches
+# cannot deadlock. Reviews of books that do not exist are skipped; returns the genre of those that do.
+async def add_reviews(session: AsyncSession, reviews: Sequence[dict]) -> Dict[int, str]:
+    book_ids = sorted({review["book_id"] for review in reviews})
+    result = await session.execute(
+        select(BookModel.id, BookModel.genre).where(BookModel.id.in_(book_ids)).order_by(BookModel.id).with_for_update()
+    )
+    genres = dict(result.all())
+    rows: List[dict] = [review for review in reviews if review["book_id"] in genres]
+    if not rows:
+        return genres
+
+    totals: Dict[int, List[int]] = {}
+    for row in rows:
+        total = totals.setdefault(row["book_id"], [0, 0])
+        total[0] += 1
+        total[1] += row["rating"]
+    await session.execute(ADD_TO_AGGREGATES, [
+        {"b_id": book_id, "b_count": count, "b_sum": rating_sum} for book_id, (count, rating_sum) in totals.items()
+    ])
+    await session.execute(insert(ReviewModel.__table__).values(rows))
+    return genres
+
+
+# Recompute aggregates from the reviews table and fix any book whose stored values drifted
+async def repair_ratings(session: AsyncSession, book_ids: Optional[Iterable[int]] = None) -> int:
+    actual_count = (
+        select(func.count(ReviewModel.id))
+        .where(ReviewModel.book_id == BookModel.id)
+        .scalar_subquery()
+    )
+    actual_sum = (
+        select(func.coalesce(func.sum(ReviewModel.rating), 0))
+        .where(ReviewModel.book_id == BookModel.id)
+        .scalar_subquery()
+    )
+    statement = (
+        update(BookModel)
+        .where(or_(BookModel.rating_count != actual_count, BookModel.rating_sum != actual_sum))
+        .values(rating_count=actual_count, rating_sum=actual_sum)
+        .execution_options(synchronize_session=False)
+    )
+    if book_ids is not None:
+        statement = statement.where(BookModel.id.in_(list(book_ids)))
+    result = await session.execute(statement)
+    await session.commit()
+    return result.rowcount
@@ -0,0 +1,117 @@
+import string
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import (
+    RECOMMENDATIONS_CACHE_MAX_GENRES,
+    RECOMMENDATIONS_CACHE_TTL,
+    RECOMMENDATIONS_PRIOR_RATING,
+    RECOMMENDATIONS_PRIOR_WEIGHT,
+    RECOMMENDATIONS_TOP_N,
+)
+from app.models.models import Book as BookModel
+
+# Bayesian average: books with few ratings are pulled towards the prior so one 5-star review does not top the list
+RANK_SCORE = (
+    (BookModel.rating_sum + RECOMMENDATIONS_PRIOR_RATING * RECOMMENDATIONS_PRIOR_WEIGHT)
+    / (BookModel.rating_count + RECOMMENDATIONS_PRIOR_WEIGHT)
+)
+
+COLUMNS = (
+    BookModel.id,
+    BookModel.title,
+    BookModel.author,
+    BookModel.genre,
+    BookModel.year_published,
+    BookModel.rating_count,
+    BookModel.average_rating.label("average_rating"),
+)
+
+
+# SQLite's lower(), and PostgreSQL's under the C collation, fold ASCII letters only
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def normalize_genre(genre: str) -> str:
+    """The value the database stores in `genre_key`, `lower(trim(genre))`: TRIM strips spaces only."""
+    return genre.strip(" ").translate(_ASCII_LOWER)
+
+
+def _ranked(query):
+    return query.order_by(RANK_SCORE.desc(), BookModel.year_published.desc(), BookModel.id.desc())
+
+
+class TopGenreCache:
+    """Precomputed top-N recommendations per normalised genre, dropped whenever a book or review in it changes.
+
+    Genres come from the query string, so the least recently used ones are evicted past `max_genres`.
+    """
+
+    def __init__(self, top_n: int = RECOMMENDATIONS_TOP_N, ttl: float = RECOMMENDATIONS_CACHE_TTL,
+                 max_genres: int = RECOMMENDATIONS_CACHE_MAX_GENRES):
+        self.top_n = top_n
+        self.ttl = ttl
+        self.max_genres = max_genres
+        self._entries: "OrderedDict[str, Tuple[float, List[dict]]]" = OrderedDict()
+
+    def get(self, genre_key: str) -> Optional[List[dict]]:
+        entry = self._entries.get(genre_key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._entries[genre_key]
+            return None
+        self._entries.move_to_end(genre_key)
+        return entry[1]
+
+    def set(self, genre_key: str, rows: List[dict]):
+        self._entries[genre_key] = (time.monotonic(), rows)
+        self._entries.move_to_end(genre_key)
+        while len(self._entries) > self.max_genres:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *genres: Optional[str]):
+        for genre in genres:
+            if genre is not None:
+                self._entries.pop(normalize_genre(genre), None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+top_genre_cache = TopGenreCache()
+
+
+async def _exact(session: AsyncSession, genre_key: str, limit: int, offset: int) -> List[dict]:
+    query = _ranked(select(*COLUMNS).where(BookModel.genre_key == genre_key)).limit(limit).offset(offset)
+    return [dict(row) for row in (await session.execute(query)).mappings()]
+
+
+async def _fuzzy(session: AsyncSession, genre_key: str, limit: int, offset: int) -> List[dict]:
+    pattern = f"%{genre_key.replace('%', '').replace('_', '')}%"
+    match = BookModel.genre_key.like(pattern)
+    if (await session.connection()).dialect.name == "postgresql":
+        # `%` is pg_trgm's similarity operator; both it and LIKE are served by the trigram index
+        match = or_(match, BookModel.genre_key.op("%")(genre_key))
+    query = _ranked(select(*COLUMNS).where(match)).limit(limit).offset(offset)
+    return [dict(row) for row in (await session.execute(query)).mappings()]
+
+
+async def recommend(session: AsyncSession, genre: str, limit: int, offset: int = 0) -> List[dict]:
+    genre_key = normalize_genre(genre)
+    if offset + limit <= top_genre_cache.top_n:
+        top = top_genre_cache.get(genre_key)
+        if top is None:
+            top = await _exact(session, genre_key, top_genre_cache.top_n, 0)
+            top_genre_cache.set(genre_key, top)
+        books = top[offset:offset + limit]
+    else:
+        books = await _exact(session, genre_key, limit, offset)
+    if books or offset:
+        return books
+    # No exact genre match: fall back to fuzzy matching, like the old substring search
+    return await _fuzzy(session, genre_key, limit, offset)
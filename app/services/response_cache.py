@@ -0,0 +1,334 @@
+import hashlib
+import itertools
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import (
+    DB_REPLICA_MAX_LAG_SECONDS,
+    RESPONSE_CACHE_BACKEND,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_VERSIONS,
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_TTL_SECONDS,
+)
+from app.services.recommendations import normalize_genre
+
+# Bumped by clear(), which makes every cached response and ETag stale at once
+EPOCH = "epoch"
+
+
+def book_key(book_id: int) -> str:
+    return f"book:{book_id}"
+
+
+def reviews_key(book_id: int) -> str:
+    return f"reviews:{book_id}"
+
+
+def genre_key(genre: str) -> str:
+    return f"genre:{normalize_genre(genre)}"
+
+
+class MemoryBackend:
+    """Versions and serialised responses in this process only; every worker has its own copy.
+
+    Versions come from one increasing counter, so a key whose version was evicted can safely read back
+    as the highest evicted value: no key ever returns to a version it had before a later change.
+    """
+
+    def __init__(self, max_entries: int, max_versions: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_versions = max_versions
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        # Key -> (version, wall-clock time of the bump)
+        self._versions: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._counter = itertools.count(1)
+        self._floor = (0, 0.0)
+        # Counters restart with the process, so ETags from a previous process must not match
+        self.namespace = secrets.token_hex(8)
+
+    async def versions(self, keys: List[str]) -> List[int]:
+        return [self._versions.get(key, self._floor)[0] for key in keys]
+
+    async def last_bumped(self, keys: List[str]) -> float:
+        return max(self._versions.get(key, self._floor)[1] for key in keys)
+
+    async def bump(self, keys: Iterable[str]):
+        now = time.time()
+        for key in keys:
+            self._versions[key] = (next(self._counter), now)
+            self._versions.move_to_end(key)
+        while len(self._versions) > self.max_versions:
+            _, evicted = self._versions.popitem(last=False)
+            self._floor = max(self._floor, evicted)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, body = entry
+        if time.monotonic() > expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return body
+
+    async def set(self, key: str, body: bytes):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def clear_entries(self):
+        self._entries.clear()
+
+
+class SQLiteBackend:
+    """Versions and responses in a local SQLite file, shared by every worker process on the host.
+
+    Versions are trimmed to `max_versions` the same way as in `MemoryBackend`: one counter in the file
+    numbers every bump, and evicted keys read back as the highest evicted version.
+    """
+
+    # Run size eviction once every N writes instead of on every write
+    EVICTION_INTERVAL = 100
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float, max_versions: int = RESPONSE_CACHE_MAX_VERSIONS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_versions = max_versions
+        self.ttl_seconds = ttl_seconds
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._bumps = 0
+        self.namespace = ""
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS versions "
+                "(key TEXT PRIMARY KEY, version INTEGER NOT NULL, bumped_at REAL NOT NULL DEFAULT 0)"
+            )
+            if "bumped_at" not in [row[1] for row in connection.execute("PRAGMA table_info(versions)")]:
+                # Files written before bump times were kept
+                connection.execute("ALTER TABLE versions ADD COLUMN bumped_at REAL NOT NULL DEFAULT 0")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_versions_version ON versions (version)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, body BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_entries_expires_at ON entries (expires_at)")
+            # Versions persist with the file; a recreated file gets a new id so old ETags cannot match
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            connection.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('file_id', ?)", (secrets.token_hex(8),))
+            self.namespace = connection.execute("SELECT value FROM meta WHERE name = 'file_id'").fetchone()[0]
+            # The counter starts above any per-key version an older file holds; the floor is what evicted keys read as
+            connection.execute(
+                "INSERT OR IGNORE INTO meta (name, value) SELECT 'counter', coalesce(max(version), 0) FROM versions"
+            )
+            connection.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('floor', '0'), ('floor_bumped_at', '0')")
+            self._connection = connection
+        return self._connection
+
+    def _run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            return fn(self._connect())
+
+    @staticmethod
+    def _meta(connection: sqlite3.Connection, name: str) -> float:
+        return float(connection.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()[0])
+
+    async def versions(self, keys: List[str]) -> List[int]:
+        def read(connection):
+            rows = dict(connection.execute(
+                f"SELECT key, version FROM versions WHERE key IN ({','.join('?' * len(keys))})", keys
+            ).fetchall())
+            if len(rows) == len(keys):
+                return [rows[key] for key in keys]
+            floor = int(self._meta(connection, "floor"))
+            return [rows.get(key, floor) for key in keys]
+
+        return await run_in_threadpool(self._run, read)
+
+    async def last_bumped(self, keys: List[str]) -> float:
+        def read(connection):
+            rows = connection.execute(
+                f"SELECT bumped_at FROM versions WHERE key IN ({','.join('?' * len(keys))})", keys
+            ).fetchall()
+            latest = max((row[0] for row in rows), default=0.0)
+            return latest if len(rows) == len(keys) else max(latest, self._meta(connection, "floor_bumped_at"))
+
+        return await run_in_threadpool(self._run, read)
+
+    async def bump(self, keys: Iterable[str]):
+        keys = list(keys)
+        self._bumps += 1
+        evict = self._bumps % self.EVICTION_INTERVAL == 0
+
+        def write(connection):
+            # Other workers bump through the same file, so the counter is read and advanced under a write lock
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                counter = int(self._meta(connection, "counter"))
+                now = time.time()
+                connection.executemany(
+                    "INSERT INTO versions (key, version, bumped_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET version = excluded.version, bumped_at = excluded.bumped_at",
+                    [(key, counter + i, now) for i, key in enumerate(keys, 1)]
+                )
+                connection.execute("UPDATE meta SET value = ? WHERE name = 'counter'", (counter + len(keys),))
+                if evict:
+                    self._trim_versions(connection)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+        await run_in_threadpool(self._run, write)
+
+    def _trim_versions(self, connection: sqlite3.Connection):
+        oldest = "SELECT key FROM versions ORDER BY version DESC LIMIT -1 OFFSET ?"
+        version, bumped_at = connection.execute(
+            f"SELECT max(version), max(bumped_at) FROM versions WHERE key IN ({oldest})", (self.max_versions,)
+        ).fetchone()
+        if version is None:
+            return
+        connection.execute(
+            "UPDATE meta SET value = max(CAST(value AS INTEGER), ?) WHERE name = 'floor'", (version,)
+        )
+        connection.execute(
+            "UPDATE meta SET value = max(CAST(value AS REAL), ?) WHERE name = 'floor_bumped_at'", (bumped_at,)
+        )
+        connection.execute(f"DELETE FROM versions WHERE key IN ({oldest})", (self.max_versions,))
+
+    async def get(self, key: str) -> Optional[bytes]:
+        def read(connection):
+            return connection.execute(
+                "SELECT body FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+
+        row = await run_in_threadpool(self._run, read)
+        return row[0] if row else None
+
+    async def set(self, key: str, body: bytes):
+        self._writes += 1
+        evict = self._writes % self.EVICTION_INTERVAL == 0
+
+        def write(connection):
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, body, expires_at) VALUES (?, ?, ?)",
+                (key, body, time.time() + self.ttl_seconds)
+            )
+            if evict:
+                connection.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+                connection.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+
+        await run_in_threadpool(self._run, write)
+
+    async def clear_entries(self):
+        await run_in_threadpool(self._run, lambda connection: connection.execute("DELETE FROM entries"))
+
+
+class ResponseCache:
+    """Serialised GET responses keyed by the versions of the entities they were built from.
+
+    Writes bump entity versions instead of deleting entries, so a response can never be cached under a
+    version that was current before the write it missed. ETags are derived from the same versions, which
+    lets a matching `If-None-Match` be answered with 304 before the cache or the database is read.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    async def invalidate(self, *keys: str):
+        await self.backend.bump(keys)
+
+    async def clear(self):
+        await self.backend.bump([EPOCH])
+        await self.backend.clear_entries()
+
+    def reset_stats(self):
+        self.hits = self.misses = self.not_modified = 0
+
+    async def respond(self, request: Request, keys: List[str], load: Callable[[], Awaitable[Any]],
+                      cacheable: Optional[Callable[[Any], bool]] = None,
+                      page_headers: Optional[Callable[[Any], Dict[str, str]]] = None,
+                      session: Optional[AsyncSession] = None) -> Response:
+        """Serve `load()` as JSON through the cache.
+
+        `page_headers` derives headers such as pagination links from the JSON data. It is called with the
+        decoded body, so a cache hit gets the same headers as the miss that stored it.
+
+        `session` is the one `load()` reads from. If it is on a replica and one of the keys was bumped
+        within `DB_REPLICA_MAX_LAG_SECONDS`, the replica may not have the write yet, so the response is
+        neither stored nor tagged with the new versions.
+        """
+        keys = [EPOCH, *keys]
+        versions = await self.backend.versions(keys)
+        target = request.url.path + ("?" + str(request.query_params) if request.query_params else "")
+        tag = "|".join([self.backend.namespace, target, *(f"{k}={v}" for k, v in zip(keys, versions))])
+        etag = f'W/"{hashlib.sha256(tag.encode("utf-8")).hexdigest()[:32]}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        body = await self.backend.get(etag)
+        if body is not None:
+            self.hits += 1
+            headers["X-Cache"] = "HIT"
+            if page_headers is not None:
+                headers.update(page_headers(json.loads(body)))
+        else:
+            self.misses += 1
+            value = await load()
+            data = jsonable_encoder(value)
+            body = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            extra = page_headers(data) if page_headers is not None else {}
+            stale = (session is not None and session.info.get("replica")
+                     and await self.backend.last_bumped(keys) > time.time() - DB_REPLICA_MAX_LAG_SECONDS)
+            if stale or (cacheable is not None and not cacheable(value)):
+                # Not covered by these keys' versions, so it must not be reused or revalidated
+                return Response(content=body, media_type="application/json", headers={"Cache-Control": "no-store", **extra})
+            headers["X-Cache"] = "MISS"
+            headers.update(extra)
+            await self.backend.set(etag, body)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
+
+
+def create_backend(name: str = RESPONSE_CACHE_BACKEND):
+    if name == "memory":
+        return MemoryBackend(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_VERSIONS, RESPONSE_CACHE_TTL_SECONDS)
+    if name == "sqlite":
+        return SQLiteBackend(RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_VERSIONS)
+    raise ValueError(f"Unknown response cache backend: {name}")
+
+
+response_cache = ResponseCache(create_backend())
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from app.core.config import REVIEW_GROUP_MAX_BATCH, REVIEW_GROUP_MAX_DELAY_MS, REVIEW_GROUP_QUEUE_MAX
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import REVIEW_GROUP_BATCH_SIZE, REVIEW_GROUP_COMMIT_DURATION
+from app.services.ratings import add_reviews
+from app.services.recommendations import top_genre_cache
+from app.services.response_cache import book_key, genre_key, response_cache, reviews_key
+from app.services.search import search_index
+from app.services.similarity import similarity_index
+
+logger = logging.getLogger(__name__)
+
+Pending = Tuple[dict, asyncio.Future]
+
+# The database itself is unavailable; splitting the batch would only repeat the failure once per review
+UNAVAILABLE_ERRORS = (InterfaceError, OperationalError, OSError, asyncio.TimeoutError)
+
+
+class BookNotFound(Exception):
+    pass
+
+
+class ReviewWriter:
+    """Group commit for single-review writes.
+
+    Callers queue a review and wait. One flusher takes whatever is queued, waiting up to `max_delay`
+    for a batch of `max_batch` to fill, writes it with one multi-row INSERT and commits once. Each caller
+    is answered only after that commit, so an acknowledged review is durable. If a batch fails because of
+    its contents, it is split in halves and retried, so only the callers whose reviews are bad get the error;
+    if the database is unavailable, every caller in the batch gets it. The queue is bounded, so a write
+    surge waits instead of buffering without limit.
+    """
+
+    def __init__(self, max_batch: int = REVIEW_GROUP_MAX_BATCH, max_delay: float = REVIEW_GROUP_MAX_DELAY_MS / 1000,
+                 max_queue: int = REVIEW_GROUP_QUEUE_MAX, session_factory=AsyncSessionLocal):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.session_factory = session_factory
+        self.batches = 0
+        self.written = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._filled: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self, session_factory=None):
+        if self.running:
+            return
+        if session_factory is not None:
+            self.session_factory = session_factory
+        self._queue = asyncio.Queue(self.max_queue)
+        self._filled = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # Reviews already queued were promised a write; flush them before shutting down
+        while not self._queue.empty():
+            await self._flush(self._take(self.max_batch))
+        self._queue = None
+
+    async def submit(self, review: dict) -> str:
+        """Queue one review ({book_id, user_id, review_text, rating}); returns the book's genre once committed."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((review, future))
+        if self._queue.qsize() >= self.max_batch:
+            self._filled.set()
+        # A caller that goes away does not cancel the write; its batch still commits
+        return await asyncio.shield(future)
+
+    def _take(self, limit: int) -> List[Pending]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        batch: List[Pending] = []
+        flush: Optional[asyncio.Future] = None
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                if self.max_delay > 0 and self._queue.qsize() + 1 < self.max_batch:
+                    self._filled.clear()
+                    try:
+                        await asyncio.wait_for(self._filled.wait(), self.max_delay)
+                    except asyncio.TimeoutError:
+                        pass
+                batch += self._take(self.max_batch - 1)
+                # Shielded, so stop() cannot interrupt a batch between its INSERT and its COMMIT
+                flush = asyncio.ensure_future(self._flush(batch))
+                await self._settle(asyncio.shield(flush))
+                batch, flush = [], None
+        except asyncio.CancelledError:
+            # Reviews already taken off the queue were promised a write too; finish them before exiting
+            if flush is not None:
+                await self._settle(flush)
+            elif batch:
+                await self._settle(self._flush(batch))
+            raise
+
+    async def _settle(self, flush):
+        try:
+            await flush
+        except Exception:
+            logger.exception("Review group commit error")
+
+    async def _flush(self, batch: List[Pending]):
+        if not batch:
+            return
+        reviews = [review for review, _ in batch]
+        start = time.perf_counter()
+        try:
+            async with self.session_factory() as session:
+                genres = await add_reviews(session, reviews)
+                await session.commit()
+        except Exception as e:
+            if len(batch) > 1 and not isinstance(e, UNAVAILABLE_ERRORS):
+                # One bad review must not fail its neighbours: bisect until the failing ones are alone
+                logger.warning("Group commit of %d reviews failed (%s); retrying in halves", len(batch), e)
+                middle = len(batch) // 2
+                for half in (batch[:middle], batch[middle:]):
+                    await self._settle(self._flush(half))
+                return
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            raise
+        REVIEW_GROUP_COMMIT_DURATION.observe(time.perf_counter() - start)
+        REVIEW_GROUP_BATCH_SIZE.observe(len(batch))
+        self.batches += 1
+        self.written += sum(1 for review in reviews if review["book_id"] in genres)
+
+        # Invalidate before acknowledging, so a caller's next read sees its review
+        book_ids = {review["book_id"] for review in reviews if review["book_id"] in genres}
+        top_genre_cache.invalidate(*{genres[book_id] for book_id in book_ids})
+        await response_cache.invalidate(*(
+            key for book_id in book_ids for key in (book_key(book_id), reviews_key(book_id), genre_key(genres[book_id]))
+        ))
+        for book_id in book_ids:
+            similarity_index.mark_dirty(book_id)
+            search_index.mark_dirty(book_id)
+
+        for review, future in batch:
+            if future.done():
+                continue
+            genre = genres.get(review["book_id"])
+            if genre is None:
+                future.set_exception(BookNotFound(review["book_id"]))
+            else:
+                future.set_result(genre)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "written": self.written,
+        }
+
+
+review_writer = ReviewWriter()
@@ -0,0 +1,254 @@
+import asyncio
+import heapq
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, literal_column, select, union_all
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import SEARCH_REVIEW_WEIGHT, SEARCH_SNIPPET_WORDS
+from app.models.models import Book as BookModel, Review as ReviewModel
+
+# Text search configuration used by the generated tsvector columns; see app/models/models.py
+TEXT_CONFIG = "english"
+
+BOOK_VECTOR = literal_column("books.search_vector", TSVECTOR)
+REVIEW_VECTOR = literal_column("reviews.search_vector", TSVECTOR)
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+
+FIELD_WEIGHTS = {"title": 3.0, "author": 2.0, "summary": 1.0, "reviews": SEARCH_REVIEW_WEIGHT}
+
+RESULT_COLUMNS = (
+    BookModel.id,
+    BookModel.title,
+    BookModel.author,
+    BookModel.genre,
+    BookModel.year_published,
+    BookModel.average_rating.label("average_rating"),
+)
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def highlight(texts: Iterable[Optional[str]], terms: Set[str], words: int = SEARCH_SNIPPET_WORDS) -> Optional[str]:
+    """A window of `words` words around the first query term in the first text that contains one."""
+    for text in texts:
+        if not text:
+            continue
+        tokens = text.split()
+        for i, token in enumerate(tokens):
+            if terms.intersection(tokenize(token)):
+                start = max(0, i - words // 3)
+                window = [
+                    f"{HIGHLIGHT_START}{t}{HIGHLIGHT_STOP}" if terms.intersection(tokenize(t)) else t
+                    for t in tokens[start:start + words]
+                ]
+                return ("... " if start else "") + " ".join(window) + (" ..." if start + words < len(tokens) else "")
+    return None
+
+
+async def load_documents(session: AsyncSession, book_ids: Iterable[int]) -> Dict[int, dict]:
+    book_ids = list(book_ids)
+    books = await session.execute(
+        select(BookModel.id, BookModel.title, BookModel.author, BookModel.summary).where(BookModel.id.in_(book_ids))
+    )
+    documents = {row.id: {"title": row.title, "author": row.author, "summary": row.summary, "reviews": []} for row in books}
+    reviews = await session.execute(
+        select(ReviewModel.book_id, ReviewModel.review_text)
+        .where(ReviewModel.book_id.in_(book_ids), ReviewModel.review_text.is_not(None))
+        .order_by(ReviewModel.book_id, ReviewModel.id)
+    )
+    for book_id, text in reviews:
+        documents[book_id]["reviews"].append(text)
+    return documents
+
+
+class SearchIndex:
+    """In-process BM25 inverted index over books and their reviews, used where Postgres text search is unavailable.
+
+    Each book is one document; field term frequencies are weighted by FIELD_WEIGHTS. The index is built from
+    the database on first use and books marked dirty are re-read before the next query.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.built = False
+        self.dirty: Set[int] = set()
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._terms: Dict[int, Dict[str, float]] = {}
+        self._lengths: Dict[int, float] = {}
+        self._total_length = 0.0
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def clear(self):
+        self.built = False
+        self.dirty.clear()
+        self._postings = {}
+        self._terms = {}
+        self._lengths = {}
+        self._total_length = 0.0
+
+    def mark_dirty(self, book_id: int):
+        # Nothing to keep in sync until a build has started; writes during a build are replayed after it
+        if self.built or self._lock.locked():
+            self.dirty.add(book_id)
+
+    def add(self, book_id: int, document: dict):
+        self.remove(book_id)
+        terms: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = document.get(field)
+            texts = value if isinstance(value, list) else [value]
+            for text in texts:
+                for token in tokenize(text):
+                    terms[token] = terms.get(token, 0.0) + weight
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[book_id] = tf
+        self._terms[book_id] = terms
+        self._lengths[book_id] = sum(terms.values())
+        self._total_length += self._lengths[book_id]
+
+    def remove(self, book_id: int):
+        terms = self._terms.pop(book_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            del postings[book_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(book_id)
+
+    def search(self, terms: List[str], limit: int, offset: int = 0) -> Tuple[int, List[Tuple[int, float]]]:
+        """Books containing every term, best BM25 score first; returns the match count and the requested page."""
+        postings = [self._postings.get(term) for term in dict.fromkeys(terms)]
+        if not postings or any(p is None for p in postings):
+            return 0, []
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            candidates.intersection_update(p)
+            if not candidates:
+                return 0, []
+
+        n = len(self._terms)
+        average_length = self._total_length / n
+        idfs = [math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for p in postings]
+        k1, b, lengths = self.k1, self.b, self._lengths
+
+        def score(book_id: int) -> float:
+            norm = k1 * (1 - b + b * lengths[book_id] / average_length)
+            return sum(idf * p[book_id] * (k1 + 1) / (p[book_id] + norm) for idf, p in zip(idfs, postings))
+
+        top = heapq.nsmallest(offset + limit, ((-score(book_id), book_id) for book_id in candidates))
+        return len(candidates), [(book_id, -negative) for negative, book_id in top[offset:]]
+
+    async def refresh(self, session: AsyncSession, batch: int = 1000):
+        async with self._lock:
+            if not self.built:
+                self.clear()
+                last_id = 0
+                while True:
+                    result = await session.execute(
+                        select(BookModel.id).where(BookModel.id > last_id).order_by(BookModel.id).limit(batch)
+                    )
+                    book_ids = result.scalars().all()
+                    if not book_ids:
+                        break
+                    for book_id, document in (await load_documents(session, book_ids)).items():
+                        self.add(book_id, document)
+                    last_id = book_ids[-1]
+                self.built = True
+            while self.dirty:
+                book_ids = [self.dirty.pop() for _ in range(min(batch, len(self.dirty)))]
+                documents = await load_documents(session, book_ids)
+                for book_id in book_ids:
+                    if book_id in documents:
+                        self.add(book_id, documents[book_id])
+                    else:
+                        self.remove(book_id)
+
+
+search_index = SearchIndex()
+
+
+async def _search_postgres(session: AsyncSession, q: str, limit: int, offset: int) -> Tuple[int, List[Tuple[int, float]], Dict[int, str]]:
+    tsquery = func.websearch_to_tsquery(TEXT_CONFIG, q)
+    book_hits = (
+        select(BookModel.id.label("book_id"), func.ts_rank_cd(BOOK_VECTOR, tsquery).label("rank"))
+        .where(BOOK_VECTOR.op("@@")(tsquery))
+    )
+    review_hits = (
+        select(ReviewModel.book_id, (SEARCH_REVIEW_WEIGHT * func.max(func.ts_rank_cd(REVIEW_VECTOR, tsquery))).label("rank"))
+        .where(REVIEW_VECTOR.op("@@")(tsquery))
+        .group_by(ReviewModel.book_id)
+    )
+    hits = union_all(book_hits, review_hits).subquery()
+    ranked = select(hits.c.book_id, func.sum(hits.c.rank).label("score")).group_by(hits.c.book_id).subquery()
+    total = (await session.execute(select(func.count()).select_from(ranked))).scalar_one()
+    page = (await session.execute(
+        select(ranked.c.book_id, ranked.c.score).order_by(ranked.c.score.desc(), ranked.c.book_id).limit(limit).offset(offset)
+    )).all()
+    book_ids = [book_id for book_id, _ in page]
+    if not book_ids:
+        return total, [], {}
+
+    options = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxWords={SEARCH_SNIPPET_WORDS}, MinWords={SEARCH_SNIPPET_WORDS // 3}"
+    book_text = func.concat_ws(" ", BookModel.title, BookModel.summary)
+    snippets = dict((await session.execute(
+        select(BookModel.id, func.ts_headline(TEXT_CONFIG, book_text, tsquery, options))
+        .where(BookModel.id.in_(book_ids), BOOK_VECTOR.op("@@")(tsquery))
+    )).all())
+    missing = [book_id for book_id in book_ids if book_id not in snippets]
+    if missing:
+        # Books matched only through a review get a snippet from their first matching review
+        snippets.update((await session.execute(
+            select(ReviewModel.book_id, func.ts_headline(TEXT_CONFIG, ReviewModel.review_text, tsquery, options))
+            .where(ReviewModel.book_id.in_(missing), REVIEW_VECTOR.op("@@")(tsquery))
+            .order_by(ReviewModel.book_id, ReviewModel.id)
+            .distinct(ReviewModel.book_id)
+        )).all())
+    return total, [(book_id, float(score)) for book_id, score in page], snippets
+
+
+async def _search_bm25(session: AsyncSession, q: str, limit: int, offset: int) -> Tuple[int, List[Tuple[int, float]], Dict[int, str]]:
+    terms = tokenize(q)
+    if not terms:
+        return 0, [], {}
+    await search_index.refresh(session)
+    total, page = search_index.search(terms, limit, offset)
+    documents = await load_documents(session, [book_id for book_id, _ in page])
+    term_set = set(terms)
+    snippets = {
+        book_id: highlight([d["summary"], *d["reviews"], d["title"], d["author"]], term_set)
+        for book_id, d in documents.items()
+    }
+    return total, page, snippets
+
+
+async def search(session: AsyncSession, q: str, limit: int, offset: int = 0) -> dict:
+    if (await session.connection()).dialect.name == "postgresql":
+        total, page, snippets = await _search_postgres(session, q, limit, offset)
+    else:
+        total, page, snippets = await _search_bm25(session, q, limit, offset)
+    books = {}
+    if page:
+        result = await session.execute(select(*RESULT_COLUMNS).where(BookModel.id.in_([book_id for book_id, _ in page])))
+        books = {row.id: dict(row) for row in result.mappings()}
+    results = [
+        {**books[book_id], "score": round(score, 4), "snippet": snippets.get(book_id)}
+        for book_id, score in page if book_id in books
+    ]
+    return {"total": total, "limit": limit, "offset": offset, "results": results}
@@ -0,0 +1,381 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import SIMILARITY_DIM, SIMILARITY_INDEX_DIR, SIMILARITY_MAX_REVIEWS, SIMILARITY_NPROBE
+from app.models.models import Book as BookModel, Review as ReviewModel
+
+logger = logging.getLogger(__name__)
+
+# Rows scanned per matrix multiply; keeps each block's working set a few dozen MB
+BLOCK_ROWS = 65536
+
+FIELD_WEIGHTS = {"title": 2.0, "author": 2.0, "genre": 3.0, "summary": 1.0, "reviews": 0.5}
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def book_vector(fields: dict, dim: int = SIMILARITY_DIM) -> np.ndarray:
+    """Hashed unigram + bigram features with sublinear term frequency, L2-normalised."""
+    counts = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        text = fields.get(field)
+        if not text:
+            continue
+        tokens = TOKEN_RE.findall(text.lower())
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for gram in grams:
+            h = zlib.crc32(gram.encode("utf-8"))
+            # The sign bit keeps hash collisions from only ever adding up
+            slot = (h % dim, 1.0 if h & 0x80000000 else -1.0)
+            counts[slot] = counts.get(slot, 0.0) + weight
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for (index, sign), weight in counts.items():
+        vector[index] += sign * (1.0 + np.log(weight) if weight >= 1.0 else weight)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+class SimilarityIndex:
+    """Unit vectors of all books in a memory-mapped float32 matrix, where row N holds book N.
+
+    Book ids are dense autoincrement keys, so the id is the row number and no id mapping is needed;
+    deleted or not-yet-indexed books are all-zero rows, which never score above zero.
+
+    Queries scan the whole matrix until `train()` clusters the rows. After that each query only scores
+    the rows of the `nprobe` clusters nearest to it (an inverted-file index), and new rows are assigned
+    to their nearest existing cluster as they are added.
+    """
+
+    def __init__(self, path: str = SIMILARITY_INDEX_DIR, dim: int = SIMILARITY_DIM, nprobe: int = SIMILARITY_NPROBE):
+        self.path = path
+        self.dim = dim
+        self.nprobe = nprobe
+        self.rows = 0
+        self._vectors: Optional[np.memmap] = None
+        self._capacity = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._assign: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        self._added: Dict[int, List[int]] = {}
+        self.dirty: Set[int] = set()
+
+    @property
+    def _vectors_file(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def _meta_file(self) -> str:
+        return os.path.join(self.path, "index.json")
+
+    @property
+    def _centroids_file(self) -> str:
+        return os.path.join(self.path, "centroids.npy")
+
+    @property
+    def _assign_file(self) -> str:
+        return os.path.join(self.path, "assign.npy")
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    def open(self, path: Optional[str] = None):
+        if path is not None:
+            self.close()
+            self.path = path
+        if self._vectors is not None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        rows = 0
+        if os.path.exists(self._meta_file):
+            with open(self._meta_file) as f:
+                meta = json.load(f)
+            if meta["dim"] == self.dim:
+                rows = meta["rows"]
+            else:
+                # Vectors from another dimension are useless; start over and let the rebuild fill it
+                for path in (self._vectors_file, self._centroids_file, self._assign_file):
+                    if os.path.exists(path):
+                        os.remove(path)
+        self.rows = rows
+        self._map(max(rows, 1024))
+        if os.path.exists(self._centroids_file) and os.path.exists(self._assign_file):
+            self._centroids = np.load(self._centroids_file)
+            assign = np.load(self._assign_file)
+            self._assign = np.full(self._capacity, -1, dtype=np.int32)
+            self._assign[:len(assign)] = assign[:self._capacity]
+            self._build_lists()
+
+    def _map(self, capacity: int):
+        if self._vectors is not None:
+            self._vectors.flush()
+        size = capacity * self.dim * 4
+        with open(self._vectors_file, "a+b") as f:
+            if os.fstat(f.fileno()).st_size < size:
+                # Extending the file leaves a sparse run of zeros, i.e. empty rows
+                f.truncate(size)
+        self._vectors = np.memmap(self._vectors_file, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._capacity = capacity
+        if self._assign is not None and len(self._assign) < capacity:
+            self._assign = np.concatenate([self._assign, np.full(capacity - len(self._assign), -1, dtype=np.int32)])
+
+    def close(self):
+        if self._vectors is not None:
+            self.flush()
+            self._vectors = None
+            self._centroids = None
+            self._assign = None
+            self._lists = []
+            self._added = {}
+
+    def flush(self):
+        if self._vectors is None:
+            return
+        self._vectors.flush()
+        if self.trained:
+            np.save(self._centroids_file, self._centroids)
+            np.save(self._assign_file, self._assign[:self.rows])
+        with open(self._meta_file, "w") as f:
+            json.dump({"dim": self.dim, "rows": self.rows}, f)
+
+    def clear(self):
+        self.open()
+        self._vectors[:] = 0
+        self.rows = 0
+        self.dirty.clear()
+        self._centroids = self._assign = None
+        self._lists, self._added = [], {}
+        for path in (self._centroids_file, self._assign_file):
+            if os.path.exists(path):
+                os.remove(path)
+        self.flush()
+
+    def train(self, nlist: int, iterations: int = 10, sample_size: int = 100000, seed: int = 0):
+        """Cluster the indexed rows with spherical k-means and switch queries to probing clusters."""
+        self.open()
+        present = np.flatnonzero(np.concatenate([
+            self._vectors[start:min(start + BLOCK_ROWS, self.rows)].any(axis=1)
+            for start in range(0, self.rows, BLOCK_ROWS)
+        ])) if self.rows else np.array([], dtype=np.int64)
+        if len(present) < nlist:
+            raise ValueError(f"Need at least {nlist} indexed books to train {nlist} clusters")
+        rng = np.random.default_rng(seed)
+        sample = np.array(self._vectors[np.sort(rng.choice(present, min(sample_size, len(present)), replace=False))])
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(iterations):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Clusters that lost all members keep their previous centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        self._centroids = centroids.astype(np.float32)
+
+        self._assign = np.full(self._capacity, -1, dtype=np.int32)
+        for start in range(0, self.rows, BLOCK_ROWS):
+            block = self._vectors[start:min(start + BLOCK_ROWS, self.rows)]
+            nearest = np.argmax(block @ self._centroids.T, axis=1).astype(np.int32)
+            nearest[~block.any(axis=1)] = -1
+            self._assign[start:start + len(block)] = nearest
+        self._build_lists()
+        self.flush()
+
+    def _build_lists(self):
+        assign = self._assign[:self.rows]
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign[assign >= 0], minlength=len(self._centroids))
+        first = int(np.searchsorted(assign[order], 0))
+        bounds = first + np.concatenate([[0], np.cumsum(counts)])
+        self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self._centroids))]
+        self._added = {}
+
+    def _assign_rows(self, book_ids: np.ndarray, vectors: np.ndarray):
+        if not self.trained:
+            return
+        nearest = np.argmax(np.atleast_2d(vectors) @ self._centroids.T, axis=1)
+        for book_id, cluster in zip(book_ids.tolist(), nearest.tolist()):
+            self._assign[book_id] = cluster
+            self._added.setdefault(cluster, []).append(book_id)
+
+    def has(self, book_id: int) -> bool:
+        self.open()
+        return book_id < self.rows and bool(self._vectors[book_id].any())
+
+    def vector(self, book_id: int) -> np.ndarray:
+        self.open()
+        return np.array(self._vectors[book_id])
+
+    def upsert(self, book_id: int, vector: np.ndarray):
+        self.open()
+        if book_id >= self._capacity:
+            self._map(max(book_id + 1, self._capacity * 2))
+        self._vectors[book_id] = vector
+        self.rows = max(self.rows, book_id + 1)
+        self._assign_rows(np.array([book_id]), vector)
+        self.dirty.discard(book_id)
+
+    def upsert_many(self, book_ids: Sequence[int], vectors: np.ndarray):
+        self.open()
+        top = max(book_ids) + 1
+        if top > self._capacity:
+            self._map(max(top, self._capacity * 2))
+        self._vectors[np.asarray(book_ids)] = vectors
+        self.rows = max(self.rows, top)
+        self._assign_rows(np.asarray(book_ids), vectors)
+
+    def remove(self, book_id: int):
+        self.open()
+        if book_id < self.rows:
+            self._vectors[book_id] = 0
+            if self.trained:
+                self._assign[book_id] = -1
+        self.dirty.discard(book_id)
+
+    def mark_dirty(self, book_id: int):
+        self.dirty.add(book_id)
+
+    def query_batch(self, queries: np.ndarray, k: int, exclude: Optional[Sequence[int]] = None) -> List[List[Tuple[int, float]]]:
+        """Cosine top-k for each row of `queries`; `exclude[i]` is a book id left out of query i's results."""
+        self.open()
+        queries = np.atleast_2d(queries).astype(np.float32, copy=False)
+        if self.trained and self.nprobe < len(self._centroids):
+            return self._probe_batch(queries, k, exclude)
+        return self._scan_batch(queries, k, exclude)
+
+    def _probe_batch(self, queries: np.ndarray, k: int, exclude: Optional[Sequence[int]]) -> List[List[Tuple[int, float]]]:
+        # Rank clusters for all queries at once, then score only the candidate rows of each query
+        probes = np.argpartition(-(queries @ self._centroids.T), self.nprobe - 1, axis=1)[:, :self.nprobe]
+        results = []
+        for i, (query, clusters) in enumerate(zip(queries, probes)):
+            parts = [self._lists[c] for c in clusters]
+            parts += [np.asarray(self._added[c], dtype=np.int64) for c in clusters if c in self._added]
+            candidates = np.unique(np.concatenate(parts)) if parts else np.array([], dtype=np.int64)
+            if exclude is not None:
+                candidates = candidates[candidates != exclude[i]]
+            if not len(candidates):
+                results.append([])
+                continue
+            scores = self._vectors[candidates] @ query
+            take = min(k, len(candidates))
+            top = np.argpartition(-scores, take - 1)[:take]
+            top = top[np.argsort(-scores[top])]
+            results.append([(int(candidates[j]), float(scores[j])) for j in top if scores[j] > 0])
+        return results
+
+    def _scan_batch(self, queries: np.ndarray, k: int, exclude: Optional[Sequence[int]]) -> List[List[Tuple[int, float]]]:
+        n_queries = queries.shape[0]
+        best_scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+        best_ids = np.full((n_queries, k), -1, dtype=np.int64)
+        rows = np.arange(n_queries)
+
+        for start in range(0, self.rows, BLOCK_ROWS):
+            block = self._vectors[start:min(start + BLOCK_ROWS, self.rows)]
+            scores = queries @ block.T
+            if exclude is not None:
+                for i, book_id in enumerate(exclude):
+                    if start <= book_id < start + block.shape[0]:
+                        scores[i, book_id - start] = -np.inf
+            take = min(k, scores.shape[1])
+            top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            merged_scores = np.concatenate([best_scores, scores[rows[:, None], top]], axis=1)
+            merged_ids = np.concatenate([best_ids, top + start], axis=1)
+            keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+            best_scores = merged_scores[rows[:, None], keep]
+            best_ids = merged_ids[rows[:, None], keep]
+
+        results = []
+        for scores, ids in zip(best_scores, best_ids):
+            order = np.argsort(-scores)
+            results.append([(int(ids[j]), float(scores[j])) for j in order if scores[j] > 0])
+        return results
+
+    def query(self, book_id: int, k: int) -> List[Tuple[int, float]]:
+        return self.query_batch(self.vector(book_id)[None, :], k, exclude=[book_id])[0]
+
+
+similarity_index = SimilarityIndex()
+
+
+async def load_book_fields(session: AsyncSession, book_ids: Iterable[int]) -> dict:
+    book_ids = list(book_ids)
+    books = await session.execute(
+        select(BookModel.id, BookModel.title, BookModel.author, BookModel.genre, BookModel.summary)
+        .where(BookModel.id.in_(book_ids))
+    )
+    fields = {row.id: {"title": row.title, "author": row.author, "genre": row.genre, "summary": row.summary, "reviews": []}
+              for row in books}
+    reviews = await session.execute(
+        select(ReviewModel.book_id, ReviewModel.review_text)
+        .where(ReviewModel.book_id.in_(book_ids))
+        .order_by(ReviewModel.book_id, ReviewModel.id.desc())
+    )
+    for book_id, text in reviews:
+        texts = fields[book_id]["reviews"]
+        if text and len(texts) < SIMILARITY_MAX_REVIEWS:
+            texts.append(text)
+    for entry in fields.values():
+        entry["reviews"] = "\n".join(entry["reviews"])
+    return fields
+
+
+async def refresh_books(session: AsyncSession, book_ids: Iterable[int], index: SimilarityIndex = similarity_index):
+    book_ids = list(book_ids)
+    fields = await load_book_fields(session, book_ids)
+    for book_id in book_ids:
+        if book_id in fields:
+            index.upsert(book_id, book_vector(fields[book_id], index.dim))
+        else:
+            index.remove(book_id)
+
+
+async def max_book_id(session: AsyncSession) -> int:
+    return (await session.execute(select(func.max(BookModel.id)))).scalar() or 0
+
+
+async def index_books_after(session: AsyncSession, after_id: int, index: SimilarityIndex = similarity_index,
+                            batch: int = 5000) -> int:
+    """Index every book with an ID above `after_id`; for bulk inserts, which do not return the new IDs."""
+    indexed = 0
+    while True:
+        result = await session.execute(
+            select(BookModel.id).where(BookModel.id > after_id).order_by(BookModel.id).limit(batch)
+        )
+        book_ids = result.scalars().all()
+        if not book_ids:
+            return indexed
+        fields = await load_book_fields(session, book_ids)
+        index.upsert_many(book_ids, np.stack([book_vector(fields[book_id], index.dim) for book_id in book_ids]))
+        indexed += len(book_ids)
+        after_id = book_ids[-1]
+
+
+async def refresh_dirty(session: AsyncSession, index: SimilarityIndex = similarity_index, batch: int = 500):
+    while index.dirty:
+        book_ids = [index.dirty.pop() for _ in range(min(batch, len(index.dirty)))]
+        await refresh_books(session, book_ids, index)
+    index.flush()
+
+
+async def run_refresher(session_factory, interval: float, index: SimilarityIndex = similarity_index):
+    # Re-embed books whose reviews or fields changed, off the request path
+    while True:
+        await asyncio.sleep(interval)
+        if not index.dirty:
+            continue
+        try:
+            async with session_factory() as session:
+                await refresh_dirty(session, index)
+        except Exception:
+            logger.exception("Similarity index refresh error")
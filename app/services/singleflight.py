@@ -0,0 +1,53 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.core.metrics import SINGLEFLIGHT_CALLS
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Run at most one in-flight call per key; concurrent callers with the same key share its result.
+
+    `namespace` labels the group's metrics. Keys are often hashes, so they are never used as labels.
+    """
+
+    def __init__(self, namespace: str = "default"):
+        self.namespace = namespace
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+            self.executions += 1
+            SINGLEFLIGHT_CALLS.labels(self.namespace, "executed").inc()
+        else:
+            self.coalesced += 1
+            SINGLEFLIGHT_CALLS.labels(self.namespace, "coalesced").inc()
+        # A cancelled caller only stops waiting; the shared call keeps running for the others
+        return await asyncio.shield(task)
+
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def reset_stats(self):
+        self.executions = self.coalesced = 0
+
+    def stats(self) -> dict:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "inflight": self.inflight(),
+        }
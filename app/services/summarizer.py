@@ -0,0 +1,87 @@
+import asyncio
+from typing import List, Optional, Sequence
+
+from app.core.config import SUMMARY_CHUNK_TOKENS, SUMMARY_MAP_CONCURRENCY
+from app.services.ai import FAILED_SUMMARY, generate_summary
+
+# Rough characters-per-token ratio for English text; good enough for budgeting prompts
+CHARS_PER_TOKEN = 4
+
+REVIEW_PROMPT = "Summarize the following reviews in a single sentence. Do not add any introduction or explanation. Only return the core content:\n"
+REDUCE_PROMPT = "Combine the following partial summaries of reader reviews into a single sentence. Do not add any introduction or explanation. Only return the core content:\n"
+
+
+def book_summary_prompt(title: str, author: Optional[str] = None) -> str:
+    if author is None:
+        return f"Summarize this book:\n{title}"
+    return f"Summarize this book:\n{title} by {author}"
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def chunk_texts(texts: Sequence[str], budget: int) -> List[List[str]]:
+    # Greedy fill in input order: appending a text can only change the last chunk,
+    # so every earlier chunk keeps its prompt and stays a summary-cache hit
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    used = 0
+    for text in texts:
+        if estimate_tokens(text) > budget:
+            text = text[:budget * CHARS_PER_TOKEN]
+        tokens = estimate_tokens(text)
+        if current and used + tokens > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _summarize_chunks(template: str, chunks: List[List[str]], concurrency: int) -> List[str]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def summarize(chunk: List[str]) -> str:
+        async with semaphore:
+            return await generate_summary(template + "\n".join(chunk))
+
+    summaries = await asyncio.gather(*(summarize(chunk) for chunk in chunks))
+    return [s for s in summaries if s != FAILED_SUMMARY]
+
+
+async def build_review_prompt(texts: Sequence[str], budget: Optional[int] = None, concurrency: Optional[int] = None) -> Optional[str]:
+    """Return the final prompt for summarising `texts`, running map/reduce passes until it fits the budget.
+
+    Returns None when every partial summary failed.
+    """
+    budget = budget or SUMMARY_CHUNK_TOKENS
+    concurrency = concurrency or SUMMARY_MAP_CONCURRENCY
+    chunks = chunk_texts(texts, budget)
+    if len(chunks) <= 1:
+        # The chunk, not the raw texts: an oversized review is cut to the budget there
+        return REVIEW_PROMPT + "\n".join(chunks[0] if chunks else [])
+
+    partials = await _summarize_chunks(REVIEW_PROMPT, chunks, concurrency)
+    previous = None
+    while partials:
+        chunks = chunk_texts(partials, budget)
+        if len(chunks) == 1:
+            return REDUCE_PROMPT + "\n".join(chunks[0])
+        size = sum(estimate_tokens(p) for p in partials)
+        if previous is not None and size >= previous:
+            # The model is not shortening the partials; give each an equal share of the budget instead
+            share = max(1, budget // len(partials)) * CHARS_PER_TOKEN
+            return REDUCE_PROMPT + "\n".join(chunk_texts([p[:share] for p in partials], budget)[0])
+        previous = size
+        partials = await _summarize_chunks(REDUCE_PROMPT, chunks, concurrency)
+    return None
+
+
+async def summarize_reviews(texts: Sequence[str]) -> str:
+    prompt = await build_review_prompt(texts)
+    if prompt is None:
+        return FAILED_SUMMARY
+    return await generate_summary(prompt)
@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import json
+import os
+
+from app.core.config import BACKFILL_BATCH_SIZE, BACKFILL_CHECKPOINT, BACKFILL_CONCURRENCY
+from app.core.database import engine
+from app.services.admission import model_admission
+from app.services.backfill import backfill_summaries
+from app.services.model_client import close_client
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "?"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def report(stats):
+    print(f"{stats['processed']} processed, {stats['written']} written, {stats['failed']} failed, "
+          f"{stats['remaining']} left | {stats['books_per_second']:.2f} books/s, "
+          f"ETA {format_seconds(stats['eta_seconds'])} | last id {stats['last_id']}   ", end="\r")
+
+
+async def main(args):
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    # This process makes no interactive calls, so its admission limit is the backfill's own concurrency
+    model_admission.limit = args.concurrency
+    try:
+        result = await backfill_summaries(
+            checkpoint=args.checkpoint, batch_size=args.batch_size, concurrency=args.concurrency,
+            max_batches=args.max_batches, progress=report
+        )
+    finally:
+        await close_client()
+        await engine.dispose()
+    print()
+    print(json.dumps({
+        "processed": result["processed"],
+        "written": result["written"],
+        "failed": len(result["failed"]),
+        "last_id": result["last_id"],
+        "seconds": round(result["seconds"], 2),
+        "books_per_second": round(result["processed"] / result["seconds"], 2) if result["seconds"] else None
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and store summaries for every book that has none. Interrupted runs resume from the checkpoint.")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE, help="Books read and written per batch")
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY, help="Model calls in flight")
+    parser.add_argument("--checkpoint", default=BACKFILL_CHECKPOINT, help="Progress file; delete it or pass --reset to start over")
+    parser.add_argument("--max-batches", type=int, help="Stop after this many batches")
+    parser.add_argument("--reset", action="store_true", help="Ignore the checkpoint and retry books that failed before")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+os.environ.setdefault("AUTH_BCRYPT_ROUNDS", "4")
+# The app's own engine (used by the summary cache) must point at the benchmark database; config reads it on import
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench_book_paths.db")
+
+import httpx
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.auth import ensure_user
+from app.core.database import get_read_session, get_session
+from app.main import app
+from app.models.models import Base, Book as BookModel, Review as ReviewModel
+from app.services import model_client
+from benchmarks.fake_model import FakeModelServer
+
+API = "/v1/api"
+AUTH = ("bench", "bench-password")
+
+
+async def seed(Session, books: int, reviews_per_book: int, spare_books: int):
+    async with Session() as session:
+        connection = await session.connection()
+        # Books after the first `books` have no reviews; the delete path removes those
+        await connection.execute(insert(BookModel.__table__), [{
+            "id": i, "title": f"Book {i}", "author": f"Author {i}", "genre": "Fiction", "year_published": 2000,
+            "summary": None, "rating_count": reviews_per_book if i <= books else 0,
+            "rating_sum": 4 * reviews_per_book if i <= books else 0,
+        } for i in range(1, books + spare_books + 1)])
+        await connection.execute(insert(ReviewModel.__table__), [{
+            "book_id": i, "user_id": j, "rating": 4, "review_text": f"Review {j} of book {i}",
+        } for i in range(1, books + 1) for j in range(reviews_per_book)])
+        await session.commit()
+        await ensure_user(session, *AUTH)
+
+
+async def measure(label: str, client: httpx.AsyncClient, call, runs: int, statements: list):
+    latencies, counts = [], []
+    for i in range(runs):
+        before = statements[0]
+        start = time.perf_counter()
+        response = await call(client, i)
+        latencies.append(time.perf_counter() - start)
+        counts.append(statements[0] - before)
+        assert response.status_code < 300, response.text
+    latencies.sort()
+    print(f"{label:<34} p50 {statistics.median(latencies) * 1000:8.2f} ms   p95 {latencies[int(runs * 0.95) - 1] * 1000:8.2f} ms"
+          f"   SQL statements {statistics.median(counts):.0f}")
+
+
+async def main(args):
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    engine = create_async_engine(args.database_url, echo=False)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    await seed(Session, args.books, args.reviews, args.runs)
+
+    # Count statements and add a simulated network round trip to each; requests run one at a time,
+    # so blocking the loop here only delays the request being measured
+    statements = [0]
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def round_trip(conn, cursor, statement, parameters, context, executemany):
+        statements[0] += 1
+        if args.rtt_ms:
+            time.sleep(args.rtt_ms / 1000)
+
+    async def override_get_session():
+        async with Session() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_read_session] = override_get_session
+
+    with FakeModelServer(latency=args.model_latency) as server:
+        model_client._router = model_client.create_router([server.url])
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", auth=AUTH) as client:
+            async def book_summary(c, i):
+                # Each run reads a different book, so both model calls miss the summary cache
+                return await c.get(f"{API}/books/{i % args.books + 1}/summary")
+
+            async def add_review(c, i):
+                return await c.post(f"{API}/books/{i % args.books + 1}/reviews",
+                                    json={"user_id": 1, "review_text": "Fine", "rating": 3})
+
+            async def update_book(c, i):
+                return await c.put(f"{API}/books/{i % args.books + 1}", json={"year_published": 1900 + i % 100})
+
+            async def delete_book(c, i):
+                return await c.delete(f"{API}/books/{args.books + i + 1}")
+
+            await measure("GET /books/{id}/summary", client, book_summary, args.runs, statements)
+            await measure("POST /books/{id}/reviews", client, add_review, args.runs, statements)
+            await measure("PUT /books/{id}", client, update_book, args.runs, statements)
+            await measure("DELETE /books/{id}", client, delete_book, args.runs, statements)
+        await model_client.close_client()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure latency and SQL statements of the book summary and book write paths.")
+    parser.add_argument("--database-url", default=os.environ["DATABASE_URL"])
+    parser.add_argument("--books", type=int, default=200)
+    parser.add_argument("--reviews", type=int, default=5, help="Reviews per book")
+    parser.add_argument("--runs", type=int, default=100, help="Requests per path; at most --books")
+    parser.add_argument("--rtt-ms", type=float, default=1.0, help="Simulated database round trip per statement")
+    parser.add_argument("--model-latency", type=float, default=0.2, help="Fake model latency in seconds")
+    asyncio.run(main(parser.parse_args()))
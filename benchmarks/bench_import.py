@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import json
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.models import Base, Book as BookModel
+from app.schemas.schemas import BookCreate
+from app.services.importer import import_books, parse_ndjson
+
+
+def ndjson_rows(count: int) -> bytes:
+    return "".join(
+        json.dumps({"title": f"Book {i}", "author": f"Author {i % 5000}", "genre": f"Genre {i % 50}",
+                    "year_published": 1900 + i % 125, "summary": f"Summary of book {i}."}) + "\n"
+        for i in range(count)
+    ).encode()
+
+
+async def chunks(data: bytes, size: int = 1 << 16):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def main(args):
+    engine = create_async_engine(args.database_url, echo=False)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    # Baseline: what POST /books does per book (add, commit, refresh)
+    async with Session() as session:
+        start = time.perf_counter()
+        for i in range(args.baseline_rows):
+            book = BookModel(title=f"Single {i}", author="Single", genre="Single", year_published=2000)
+            session.add(book)
+            await session.commit()
+            await session.refresh(book)
+        baseline = args.baseline_rows / (time.perf_counter() - start)
+    print(f"per-row commit: {baseline:,.0f} rows/s ({args.baseline_rows} rows)")
+
+    data = ndjson_rows(args.rows)
+    # The ceiling set by the Python side alone: parsing and validating without touching the database
+    start = time.perf_counter()
+    parsed = 0
+    async for _, record in parse_ndjson(chunks(data)):
+        BookCreate.model_validate(record).model_dump()
+        parsed += 1
+    print(f"parse+validate: {parsed / (time.perf_counter() - start):,.0f} rows/s (no database)")
+
+    async with Session() as session:
+        start = time.perf_counter()
+        report = await import_books(session, parse_ndjson(chunks(data)), args.batch_size)
+        elapsed = time.perf_counter() - start
+    print(f"bulk import:    {report['inserted'] / elapsed:,.0f} rows/s ({report['inserted']} rows, batch size {args.batch_size})")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare bulk NDJSON import with one commit per book.")
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./bench_import.db")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--baseline-rows", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
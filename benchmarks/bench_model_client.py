@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app.services.model_client import create_client, post_with_retries
+from benchmarks.fake_model import FakeModelServer
+
+PAYLOAD = {"model": "llama3", "prompt": "Summarize this book:\nDune by Frank Herbert", "stream": False}
+
+
+# Old behaviour: a fresh client (and TCP connection) for every call
+async def per_call_client(base_url: str) -> None:
+    async with httpx.AsyncClient(timeout=httpx.Timeout(300)) as client:
+        response = await client.post(f"{base_url}/api/generate", json=PAYLOAD)
+        response.raise_for_status()
+
+
+async def run(label: str, call, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    result = {
+        "mode": label,
+        "requests": requests,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+    print(result)
+    return result
+
+
+async def main(args):
+    with FakeModelServer(latency=args.latency) as server:
+        await run("per-call client", lambda: per_call_client(server.url), args.requests, args.concurrency)
+
+        client = create_client(server.url)
+        try:
+            async def shared():
+                (await post_with_retries("/api/generate", PAYLOAD, client=client)).raise_for_status()
+            await run("shared pooled client", shared, args.requests, args.concurrency)
+        finally:
+            await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare a per-call httpx client with the shared pooled model client.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake model latency in seconds")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import statistics
+import time
+from contextlib import ExitStack
+
+from app.services.model_client import create_router
+from benchmarks.fake_model import FakeModelServer
+
+PAYLOAD = {"model": "llama3", "prompt": "Summarize this book:\nDune by Frank Herbert", "stream": False}
+
+
+async def run(label: str, router, requests: int, concurrency: int, servers) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    sent_before = sum(server.requests for server in servers)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            _, response = await router.request("/api/generate", lambda c: c.post("/api/generate", json=PAYLOAD))
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    latencies.sort()
+    result = {
+        "mode": label,
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1),
+        "upstream_requests": sum(server.requests for server in servers) - sent_before,
+        "hedges_won": router.hedges_won,
+    }
+    print(result)
+    return result
+
+
+async def main(args):
+    with ExitStack() as stack:
+        # Every backend is usually quick but occasionally stalls, like a model server swapping or batching
+        servers = [
+            stack.enter_context(FakeModelServer(latency=args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency))
+            for _ in range(args.backends)
+        ]
+        urls = [server.url for server in servers]
+        for label, percentile in (("no hedging", 0.0), (f"hedge at p{args.hedge_percentile * 100:g}", args.hedge_percentile)):
+            router = create_router(urls, hedge_percentile=percentile, hedge_min_samples=50)
+            # Warm up connections and the latency window the hedge threshold is taken from
+            await run("warm-up", router, 200, args.concurrency, servers)
+            router.hedges = router.hedges_won = 0
+            await run(label, router, args.requests, args.concurrency, servers)
+            await router.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare tail latency across several stub model servers with and without hedging.")
+    parser.add_argument("--backends", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="Usual fake model latency in seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.03, help="Fraction of requests that stall")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="Latency of a stalled request in seconds")
+    parser.add_argument("--hedge-percentile", type=float, default=0.95)
+    asyncio.run(main(parser.parse_args()))
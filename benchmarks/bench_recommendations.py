@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.models import Base, Book as BookModel
+from app.services.recommendations import _exact, recommend, top_genre_cache
+
+
+async def seed(Session, books: int, genres: int):
+    rng = random.Random(42)
+    async with Session() as session:
+        existing = (await session.execute(select(func.count()).select_from(BookModel))).scalar_one()
+        if existing == books:
+            return
+    batch = []
+    async with Session() as session:
+        connection = await session.connection()
+        for i in range(books):
+            count = rng.randint(0, 50)
+            batch.append({
+                "title": f"Book {i}", "author": f"Author {i % 10000}", "genre": f"Genre {i % genres}",
+                "year_published": rng.randint(1900, 2024), "rating_count": count, "rating_sum": count * rng.randint(1, 5),
+            })
+            if len(batch) == 10000:
+                await connection.execute(insert(BookModel.__table__), batch)
+                batch = []
+        if batch:
+            await connection.execute(insert(BookModel.__table__), batch)
+        await session.commit()
+
+
+async def measure(label: str, fn, runs: int):
+    latencies = []
+    for i in range(runs):
+        start = time.perf_counter()
+        await fn(i)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"{label:<32} p50 {statistics.median(latencies) * 1000:8.2f} ms   p95 {latencies[int(runs * 0.95) - 1] * 1000:8.2f} ms")
+
+
+async def main(args):
+    engine = create_async_engine(args.database_url, echo=False)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    if args.reset:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    start = time.perf_counter()
+    await seed(Session, args.books, args.genres)
+    print(f"{args.books:,} books in {args.genres} genres ready in {time.perf_counter() - start:.1f}s")
+
+    async with Session() as session:
+        async def substring_scan(i):
+            # The previous implementation: unindexable ILIKE, unordered, unlimited
+            result = await session.execute(select(BookModel).where(BookModel.genre.ilike(f"%Genre {i % args.genres}%")))
+            result.scalars().all()
+
+        async def indexed_lookup(i):
+            await _exact(session, f"genre {i % args.genres}", 20, 0)
+
+        async def cached_top_n(i):
+            await recommend(session, "Genre 7", 20, 0)
+
+        await measure("ILIKE substring scan (old)", substring_scan, args.runs)
+        await measure("indexed genre_key, ranked", indexed_lookup, args.runs)
+        top_genre_cache.clear()
+        await measure("precomputed top-N", cached_top_n, args.runs)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure recommendation lookup latency on a large catalog.")
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./bench_recommendations.db")
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--genres", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--reset", action="store_true", help="Drop and reseed the catalog")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+os.environ.setdefault("AUTH_BCRYPT_ROUNDS", "4")
+# The app's own engine must point at the benchmark database; config reads it on import
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench_review_ingest.db")
+
+import httpx
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.v1 import endpoints
+from app.core.auth import ensure_user
+from app.core.database import get_read_session, get_session
+from app.main import app
+from app.models.models import Base, Book as BookModel, Review as ReviewModel
+from app.services.review_writer import review_writer
+
+API = "/v1/api"
+AUTH = ("bench", "bench-password")
+
+
+async def seed(Session, books: int):
+    async with Session() as session:
+        connection = await session.connection()
+        await connection.execute(insert(BookModel.__table__), [{
+            "id": i, "title": f"Book {i}", "author": f"Author {i}", "genre": f"Genre {i % 10}", "year_published": 2000,
+            "summary": f"Summary {i}", "rating_count": 0, "rating_sum": 0,
+        } for i in range(1, books + 1)])
+        await session.commit()
+        await ensure_user(session, *AUTH)
+
+
+def review(i: int) -> dict:
+    return {"user_id": i, "review_text": f"Review {i}", "rating": i % 5 + 1}
+
+
+async def run(label: str, client: httpx.AsyncClient, requests: list, concurrency: int, reviews: int, commits: list):
+    """Send `requests` (coroutine factories) with at most `concurrency` in flight and report throughput."""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(call):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await call()
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code < 300, response.text
+
+    before = commits[0]
+    start = time.perf_counter()
+    await asyncio.gather(*(send(call) for call in requests))
+    elapsed = time.perf_counter() - start
+    committed = commits[0] - before
+    latencies.sort()
+    print(f"{label:<30} {reviews / elapsed:9.0f} reviews/s   p50 {latencies[len(latencies) // 2] * 1000:8.2f} ms"
+          f"   p99 {latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000:8.2f} ms"
+          f"   commits {committed:6d} ({reviews / max(committed, 1):.1f} reviews/commit)")
+
+
+async def main(args):
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    # Direct writes queue on SQLite's single write lock; wait for it rather than fail after the default 5 s
+    connect_args = {"timeout": 60} if args.database_url.startswith("sqlite") else {}
+    engine = create_async_engine(args.database_url, echo=False, connect_args=connect_args)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    await seed(Session, args.books)
+
+    # Count commits and add a simulated log flush to each. The sleep blocks the event loop, which models
+    # a database that makes one commit durable at a time, as SQLite does.
+    commits = [0]
+
+    @event.listens_for(engine.sync_engine, "commit")
+    def log_flush(conn):
+        commits[0] += 1
+        if args.commit_ms:
+            time.sleep(args.commit_ms / 1000)
+
+    async def override_get_session():
+        async with Session() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_read_session] = override_get_session
+
+    transport = httpx.ASGITransport(app=app)
+    limits = httpx.Limits(max_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", auth=AUTH, limits=limits) as client:
+        def single(i):
+            return lambda: client.post(f"{API}/books/{i % args.books + 1}/reviews", json=review(i))
+
+        def batch(i):
+            book_id = i % args.books + 1
+            body = [review(i * args.batch_size + j) for j in range(args.batch_size)]
+            return lambda: client.post(f"{API}/books/{book_id}/reviews:batch", json=body)
+
+        endpoints.REVIEW_GROUP_COMMIT = False
+        await run("direct, one commit per review", client, [single(i) for i in range(args.reviews)],
+                  args.concurrency, args.reviews, commits)
+
+        endpoints.REVIEW_GROUP_COMMIT = True
+        await review_writer.start(Session)
+        await run("group commit", client, [single(i) for i in range(args.reviews)],
+                  args.concurrency, args.reviews, commits)
+        await review_writer.stop()
+        endpoints.REVIEW_GROUP_COMMIT = False
+
+        requests = args.reviews // args.batch_size
+        await run(f"POST reviews:batch x{args.batch_size}", client, [batch(i) for i in range(requests)],
+                  max(1, args.concurrency // args.batch_size), requests * args.batch_size, commits)
+
+    async with Session() as session:
+        stored = (await session.execute(select(func.count()).select_from(ReviewModel))).scalar_one()
+        counted = (await session.execute(select(func.sum(BookModel.rating_count)))).scalar_one()
+    assert stored == counted, (stored, counted)
+    print(f"reviews stored {stored}, rating_count total {counted}, group batches {review_writer.batches}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare review ingest throughput: direct writes, group commit and the batch endpoint.")
+    parser.add_argument("--database-url", default=os.environ["DATABASE_URL"])
+    parser.add_argument("--books", type=int, default=100)
+    parser.add_argument("--reviews", type=int, default=2000, help="Reviews written per mode")
+    parser.add_argument("--concurrency", type=int, default=64, help="Single-review requests in flight")
+    parser.add_argument("--batch-size", type=int, default=100, help="Reviews per POST reviews:batch request")
+    parser.add_argument("--commit-ms", type=float, default=2.0, help="Simulated log flush per commit")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.models import Base, Book as BookModel, Review as ReviewModel
+from app.services.search import search, search_index
+
+
+def make_vocabulary(size: int) -> list:
+    rng = random.Random(7)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+
+def sentence(rng: random.Random, vocabulary: list, words: int) -> str:
+    # Word frequencies roughly follow Zipf's law, like real text
+    return " ".join(vocabulary[min(int(rng.paretovariate(1.1)) - 1, len(vocabulary) - 1)] for _ in range(words))
+
+
+async def seed(Session, start: int, books: int, reviews_per_book: int, vocabulary: list):
+    rng = random.Random(start)
+    async with Session() as session:
+        connection = await session.connection()
+        for first in range(start, books, 5000):
+            batch = [{
+                "id": i + 1, "title": sentence(rng, vocabulary, 4), "author": sentence(rng, vocabulary, 2),
+                "genre": "Fiction", "year_published": 2000, "summary": sentence(rng, vocabulary, 60),
+            } for i in range(first, min(first + 5000, books))]
+            await connection.execute(insert(BookModel.__table__), batch)
+            reviews = [{
+                "book_id": row["id"], "user_id": 1, "rating": 4, "review_text": sentence(rng, vocabulary, 30),
+            } for row in batch for _ in range(reviews_per_book)]
+            if reviews:
+                await connection.execute(insert(ReviewModel.__table__), reviews)
+        await session.commit()
+
+
+async def measure(label: str, fn, runs: int):
+    latencies = []
+    for i in range(runs):
+        start = time.perf_counter()
+        await fn(i)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"  {label:<34} p50 {statistics.median(latencies) * 1000:9.2f} ms   p95 {latencies[int(runs * 0.95) - 1] * 1000:9.2f} ms")
+
+
+async def main(args):
+    engine = create_async_engine(args.database_url, echo=False)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    vocabulary = make_vocabulary(args.vocabulary)
+    rng = random.Random(1)
+    # Mid-frequency terms: common enough to match many books, rare enough to be useful queries
+    queries = [" ".join(rng.sample(vocabulary[20:2000], rng.randint(1, 2))) for _ in range(args.runs)]
+    seeded = 0
+    for size in sorted(int(s) for s in args.sizes.split(",")):
+        start = time.perf_counter()
+        await seed(Session, seeded, size, args.reviews, vocabulary)
+        seeded = size
+        print(f"{size:,} books seeded in {time.perf_counter() - start:.1f}s")
+
+        async with Session() as session:
+            search_index.clear()
+            start = time.perf_counter()
+            await search(session, queries[0], 20)
+            print(f"  first query (builds the index on SQLite) {time.perf_counter() - start:.2f}s")
+
+            async def ranked_search(i):
+                await search(session, queries[i], 20)
+
+            async def client_side_filter(i):
+                # What clients did before: download every book and filter locally
+                terms = queries[i].split()
+                rows = (await session.execute(select(BookModel.id, BookModel.title, BookModel.author, BookModel.summary))).all()
+                [r.id for r in rows if all(t in f"{r.title} {r.author} {r.summary}" for t in terms)]
+
+            await measure("ranked search, top 20", ranked_search, args.runs)
+            if size <= args.scan_limit:
+                await measure("fetch all books + filter (old)", client_side_filter, min(args.runs, 10))
+            count = (await session.execute(select(func.count()).select_from(BookModel))).scalar_one()
+            assert count == size
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure search latency as the catalog grows.")
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./bench_search.db")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated catalog sizes")
+    parser.add_argument("--reviews", type=int, default=2, help="Reviews per book")
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--scan-limit", type=int, default=100000, help="Skip the full-download baseline above this size")
+    asyncio.run(main(parser.parse_args()))
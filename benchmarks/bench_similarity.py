@@ -0,0 +1,73 @@
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.similarity import SimilarityIndex
+
+
+def measure(label: str, fn, runs: int):
+    latencies = []
+    for i in range(runs):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"{label:<36} p50 {statistics.median(latencies) * 1000:8.2f} ms   p95 {latencies[int(runs * 0.95) - 1] * 1000:8.2f} ms")
+
+
+def clustered_vectors(rng, centers: np.ndarray, count: int, spread: float) -> np.ndarray:
+    # Books cluster by genre and author, so uniform random vectors would understate how well probing works
+    vectors = centers[rng.integers(0, len(centers), count)] + spread * rng.standard_normal((count, centers.shape[1]), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main(args):
+    rng = np.random.default_rng(42)
+    centers = rng.standard_normal((args.topics, args.dim), dtype=np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    with tempfile.TemporaryDirectory() as path:
+        index = SimilarityIndex(path, dim=args.dim, nprobe=args.nprobe)
+        start = time.perf_counter()
+        for first in range(1, args.books + 1, 100000):
+            ids = list(range(first, min(first + 100000, args.books + 1)))
+            index.upsert_many(ids, clustered_vectors(rng, centers, len(ids), args.spread))
+        index.close()
+        print(f"{args.books:,} vectors of dim {args.dim} written in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        index = SimilarityIndex(path, dim=args.dim, nprobe=args.nprobe)
+        index.open()
+        print(f"index reopened in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+        index.query(1, args.k)  # fault the mapping into the page cache
+        measure(f"exact query, top-{args.k}", lambda i: index.query(1 + i, args.k), args.runs)
+        queries = np.stack([index.vector(1 + i) for i in range(args.batch)])
+        exclude = list(range(1, args.batch + 1))
+        exact = index.query_batch(queries, args.k, exclude=exclude)
+        measure(f"exact batch of {args.batch}, top-{args.k}", lambda i: index.query_batch(queries, args.k, exclude=exclude), args.runs)
+
+        start = time.perf_counter()
+        index.train(args.nlist)
+        print(f"{args.nlist} clusters trained in {time.perf_counter() - start:.1f}s")
+        measure(f"probed query (nprobe={args.nprobe}), top-{args.k}", lambda i: index.query(1 + i, args.k), args.runs)
+        probed = index.query_batch(queries, args.k, exclude=exclude)
+        found = sum(len({b for b, _ in p} & {b for b, _ in e}) for p, e in zip(probed, exact))
+        print(f"recall@{args.k} vs exact: {found / sum(len(e) for e in exact):.3f}")
+        index.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure similarity index query latency and probed recall.")
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--topics", type=int, default=2000)
+    parser.add_argument("--spread", type=float, default=0.08)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, default=16)
+    main(parser.parse_args())
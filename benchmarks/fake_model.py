@@ -0,0 +1,102 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.requests import ClientDisconnect
+
+
+# Build a minimal stand-in for Ollama's /api/generate with configurable latency and failure rate;
+# `slow_rate` of requests take `slow_latency` instead, to give the server a latency tail
+def create_fake_model_app(latency: float = 0.0, failure_rate: float = 0.0, response_text: str = "A fake summary.",
+                          token_delay: float = 0.0, slow_rate: float = 0.0, slow_latency: float = 0.0):
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.healthy = True
+    app.state.streams_completed = 0
+    app.state.streams_aborted = 0
+
+    tokens = re.findall(r"\S+\s*", response_text)
+
+    async def stream_tokens(model, prompt_tokens):
+        # Mimic Ollama's NDJSON stream: one object per token, then a final "done" object with token counts
+        completed = False
+        try:
+            for token in tokens:
+                if token_delay:
+                    await asyncio.sleep(token_delay)
+                yield json.dumps({"model": model, "response": token, "done": False}) + "\n"
+            yield json.dumps({
+                "model": model, "response": "", "done": True, "prompt_eval_count": prompt_tokens, "eval_count": len(tokens)
+            }) + "\n"
+            completed = True
+        finally:
+            if completed:
+                app.state.streams_completed += 1
+            else:
+                app.state.streams_aborted += 1
+
+    @app.get("/api/tags")
+    async def tags():
+        # Ollama's model list, used as the health probe
+        if not app.state.healthy:
+            return JSONResponse(status_code=503, content={"error": "unhealthy"})
+        return {"models": [{"name": "llama3"}]}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        try:
+            payload = await request.json()
+        except ClientDisconnect:
+            # Hedged and cancelled requests can be dropped before their body arrives
+            return Response(status_code=499)
+        app.state.requests += 1
+        delay = slow_latency if slow_rate and random.random() < slow_rate else latency
+        if delay:
+            await asyncio.sleep(delay)
+        if failure_rate and random.random() < failure_rate:
+            return JSONResponse(status_code=500, content={"error": "fake failure"})
+        prompt_tokens = len(payload.get("prompt", "").split())
+        if payload.get("stream"):
+            return StreamingResponse(stream_tokens(payload.get("model"), prompt_tokens), media_type="application/x-ndjson")
+        return {
+            "model": payload.get("model"), "response": response_text, "done": True,
+            "prompt_eval_count": prompt_tokens, "eval_count": len(tokens)
+        }
+
+    return app
+
+
+# Run a fake model server on an ephemeral local port in a background thread
+class FakeModelServer:
+    def __init__(self, **app_options):
+        self.app = create_fake_model_app(**app_options)
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=0, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    @property
+    def requests(self) -> int:
+        return self.app.state.requests
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Fake model server did not start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
@@ -0,0 +1,428 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.models.models import Base, Book as BookModel, Review as ReviewModel
+from benchmarks.bench_search import make_vocabulary, sentence
+from benchmarks.fake_model import FakeModelServer
+
+API = "/v1/api"
+USERNAME = "bench"
+PASSWORD = "bench-password"
+GENRES = ["Fiction", "History", "Science", "Fantasy", "Mystery", "Biography", "Romance", "Horror", "Poetry", "Travel"]
+SAMPLE_INTERVAL = 0.05
+
+
+def percentile(values: List[float], q: float) -> float:
+    # Nearest rank on sorted values
+    return values[min(len(values) - 1, max(0, int(round(q * len(values) + 0.5)) - 1))]
+
+
+async def seed(database_url: str, books: int, reviews: int, spare_books: int, vocabulary: list):
+    """Recreate the schema with `books` books and `reviews` reviews spread over them, plus review-free spare books."""
+    rng = random.Random(11)
+    engine = create_async_engine(database_url, echo=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    ratings = [rng.randint(1, 5) for _ in range(reviews)]
+    targets = [rng.randint(1, books) for _ in range(reviews)]
+    counts = [0] * (books + 1)
+    sums = [0] * (books + 1)
+    for book_id, rating in zip(targets, ratings):
+        counts[book_id] += 1
+        sums[book_id] += rating
+
+    async with engine.begin() as conn:
+        for first in range(1, books + spare_books + 1, 5000):
+            batch = [{
+                "id": i, "title": sentence(rng, vocabulary, 4), "author": sentence(rng, vocabulary, 2),
+                "genre": GENRES[i % len(GENRES)], "year_published": rng.randint(1900, 2024),
+                "summary": sentence(rng, vocabulary, 60),
+                "rating_count": counts[i] if i <= books else 0, "rating_sum": sums[i] if i <= books else 0,
+            } for i in range(first, min(first + 5000, books + spare_books + 1))]
+            await conn.execute(insert(BookModel.__table__), batch)
+        for first in range(0, reviews, 10000):
+            await conn.execute(insert(ReviewModel.__table__), [{
+                "book_id": targets[i], "user_id": rng.randint(1, 1000), "rating": ratings[i],
+                "review_text": sentence(rng, vocabulary, 30),
+            } for i in range(first, min(first + 10000, reviews))])
+        if engine.dialect.name == "postgresql":
+            # Explicit ids leave the sequence behind; POST /books would collide with the seeded rows
+            await conn.exec_driver_sql("SELECT setval('books_id_seq', (SELECT max(id) FROM books))")
+    await engine.dispose()
+
+
+def process_tree(pid: int) -> List[int]:
+    """The process and all its descendants (uvicorn workers), read from /proc."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def memory_kb(pids: List[int], field: str) -> int:
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                total += next((int(line.split()[1]) for line in f if line.startswith(field + ":")), 0)
+        except OSError:
+            pass
+    return total
+
+
+class RssSampler:
+    """Polls the summed resident memory of the server's process tree while a scenario runs."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.enabled = os.path.isdir("/proc")
+        self.peak_kb = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self, pids: List[int]):
+        while True:
+            self.peak_kb = max(self.peak_kb, memory_kb(pids, "VmRSS"))
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    def start(self):
+        self.peak_kb = 0
+        if self.enabled:
+            self._task = asyncio.create_task(self._run(process_tree(self.pid)))
+
+    async def stop(self) -> Optional[float]:
+        if self._task is None:
+            return None
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        return round(self.peak_kb / 1024, 1)
+
+
+class Context:
+    """State shared by the scenarios of one run: catalog size, seeded query terms and ids created along the way."""
+
+    def __init__(self, args, vocabulary: list):
+        self.books = args.books
+        self.rng = random.Random(3)
+        self.terms = vocabulary[20:2000]
+        # Review-free books seeded after the catalog, consumed by the delete scenario
+        self.spare_ids = list(range(args.books + args.spare_books, args.books, -1))
+        self.job_ids: List[int] = []
+
+    def book_id(self) -> int:
+        return self.rng.randint(1, self.books)
+
+    def book_ids(self, count: int = 20) -> str:
+        return ",".join(str(self.book_id()) for _ in range(count))
+
+    def book_payload(self) -> dict:
+        return {
+            "title": f"Load test {self.rng.random():.8f}", "author": "Bench Author",
+            "genre": self.rng.choice(GENRES), "year_published": 2024,
+            "summary": " ".join(self.rng.sample(self.terms, 20)),
+        }
+
+    def review_payload(self) -> dict:
+        return {"user_id": self.rng.randint(1, 1000), "rating": self.rng.randint(1, 5), "review_text": " ".join(self.rng.sample(self.terms, 12))}
+
+
+async def stream_body(client: httpx.AsyncClient, method: str, url: str, **kwargs) -> httpx.Response:
+    # Server-Sent Events count as done when the last byte arrives, as a client would see them
+    async with client.stream(method, url, **kwargs) as response:
+        async for _ in response.aiter_bytes():
+            pass
+    return response
+
+
+async def delete_spare_book(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    if not ctx.spare_ids:
+        raise IndexError("spare books exhausted; raise --spare-books")
+    return await client.delete(f"{API}/books/{ctx.spare_ids.pop()}")
+
+
+async def queue_job(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    response = await client.post(f"{API}/jobs/summaries", json={"book_id": ctx.book_id()})
+    if response.status_code == 202:
+        ctx.job_ids.append(response.json()["id"])
+    return response
+
+
+def import_body(ctx: Context, rows: int = 50) -> bytes:
+    return "".join(json.dumps(ctx.book_payload()) + "\n" for _ in range(rows)).encode("utf-8")
+
+
+Request = Callable[[httpx.AsyncClient, Context], Awaitable[httpx.Response]]
+
+# One entry per route in app/api/v1/endpoints.py; deletes run last so they cannot affect other scenarios
+SCENARIOS: Dict[str, Request] = {
+    "list_books": lambda c, x: c.get(f"{API}/books", params={"after_id": x.book_id(), "limit": 100}),
+    "get_book": lambda c, x: c.get(f"{API}/books/{x.book_id()}"),
+    "get_reviews": lambda c, x: c.get(f"{API}/books/{x.book_id()}/reviews"),
+    "books_batch": lambda c, x: c.get(f"{API}/books:batch", params={"ids": x.book_ids(), "reviews": 3}),
+    "search": lambda c, x: c.get(f"{API}/search", params={"q": x.rng.choice(x.terms)}),
+    "recommendations": lambda c, x: c.get(f"{API}/recommendations", params={"genre": x.rng.choice(GENRES)}),
+    "similar_books": lambda c, x: c.get(f"{API}/books/{x.book_id()}/similar"),
+    "book_summary": lambda c, x: c.get(f"{API}/books/{x.book_id()}/summary"),
+    "book_summary_stream": lambda c, x: stream_body(c, "GET", f"{API}/books/{x.book_id()}/summary/stream"),
+    "generate_summary": lambda c, x: c.post(f"{API}/books/generate-summary", json={"content": x.book_payload()["summary"]}),
+    "generate_summary_stream": lambda c, x: stream_body(
+        c, "POST", f"{API}/books/generate-summary/stream", json={"content": x.book_payload()["summary"]}
+    ),
+    "create_summary_job": queue_job,
+    "get_job": lambda c, x: c.get(f"{API}/jobs/{x.rng.choice(x.job_ids) if x.job_ids else 1}"),
+    "issue_token": lambda c, x: c.post(f"{API}/auth/token"),
+    "create_book": lambda c, x: c.post(f"{API}/books", json=x.book_payload()),
+    "update_book": lambda c, x: c.put(f"{API}/books/{x.book_id()}", json={"year_published": x.rng.randint(1900, 2024)}),
+    # Run with --env REVIEW_GROUP_COMMIT=true to measure the group-commit path
+    "add_review": lambda c, x: c.post(f"{API}/books/{x.book_id()}/reviews", json=x.review_payload()),
+    "add_reviews_batch": lambda c, x: c.post(
+        f"{API}/books/{x.book_id()}/reviews:batch", json=[x.review_payload() for _ in range(50)]
+    ),
+    "import_books": lambda c, x: c.post(
+        f"{API}/books/import", content=import_body(x), headers={"Content-Type": "application/x-ndjson"}
+    ),
+    "delete_book": delete_spare_book,
+}
+
+
+async def run_scenario(name: str, client: httpx.AsyncClient, ctx: Context, sampler: RssSampler, args) -> dict:
+    call = SCENARIOS[name]
+    for _ in range(args.warmup):
+        try:
+            await call(client, ctx)
+        except (httpx.HTTPError, IndexError):
+            pass
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    failures = 0
+    deadline = time.perf_counter() + args.duration
+    remaining = [args.requests or float("inf")]
+
+    async def worker():
+        nonlocal failures
+        while remaining[0] > 0 and time.perf_counter() < deadline:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                response = await call(client, ctx)
+            except IndexError:
+                return
+            except httpx.HTTPError as e:
+                failures += 1
+                statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            key = str(response.status_code)
+            statuses[key] = statuses.get(key, 0) + 1
+            if response.status_code >= 400:
+                failures += 1
+
+    sampler.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    peak_rss_mb = await sampler.stop()
+
+    latencies.sort()
+    result = {
+        "requests": len(latencies),
+        "errors": failures,
+        "status_codes": statuses,
+        "duration_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+        "peak_rss_mb": peak_rss_mb,
+    }
+    print(f"{name:<24} {result['throughput_rps']:>9.1f} rps  p50 {result['p50_ms'] or 0:>8.2f}  "
+          f"p95 {result['p95_ms'] or 0:>8.2f}  p99 {result['p99_ms'] or 0:>8.2f} ms  "
+          f"errors {failures:<5} rss {peak_rss_mb or 0:.0f} MB")
+    return result
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def wait_until_healthy(process: subprocess.Popen, base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become healthy")
+
+
+async def run(args) -> dict:
+    names = list(SCENARIOS) if args.scenarios == "all" else args.scenarios.split(",")
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}; choose from {', '.join(SCENARIOS)}")
+
+    vocabulary = make_vocabulary(args.vocabulary)
+    start = time.perf_counter()
+    await seed(args.database_url, args.books, args.reviews, args.spare_books, vocabulary)
+    print(f"Seeded {args.books:,} books and {args.reviews:,} reviews in {time.perf_counter() - start:.1f}s")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch, FakeModelServer(
+        latency=args.model_latency, token_delay=args.token_delay, response_text=" ".join(vocabulary[:args.response_tokens])
+    ) as model:
+        port = free_port()
+        env = {
+            **os.environ,
+            "DATABASE_URL": args.database_url, "MODEL_BASE_URL": model.url,
+            "USERNAME": USERNAME, "PASSWORD": PASSWORD, "LOG_LEVEL": "WARNING",
+            "SIMILARITY_INDEX_DIR": os.path.join(scratch, "similarity"),
+            "RESPONSE_CACHE_PATH": os.path.join(scratch, "response_cache.db"),
+            "PROFILER_DIR": os.path.join(scratch, "profiles"),
+            **dict(item.split("=", 1) for item in args.env),
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+            env=env,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            await wait_until_healthy(server, base_url)
+            ctx = Context(args, vocabulary)
+            sampler = RssSampler(server.pid)
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(
+                base_url=base_url, auth=(USERNAME, PASSWORD), limits=limits, timeout=httpx.Timeout(args.timeout)
+            ) as client:
+                for name in names:
+                    results[name] = await run_scenario(name, client, ctx, sampler, args)
+            peak_kb = memory_kb(process_tree(server.pid), "VmHWM") if sampler.enabled else None
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "compare")},
+        },
+        "peak_rss_mb": round(peak_kb / 1024, 1) if peak_kb else None,
+        "scenarios": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Print per-scenario changes and return the scenarios whose p95 or throughput regressed beyond `threshold`."""
+    regressions = []
+    print(f"\n{'scenario':<24} {'p95 before':>11} {'p95 after':>10} {'change':>8}   {'rps before':>10} {'rps after':>10} {'change':>8}")
+    for name, after in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if not before or not before.get("p95_ms") or not after.get("p95_ms") or not before.get("throughput_rps"):
+            continue
+        p95_change = after["p95_ms"] / before["p95_ms"] - 1
+        rps_change = after["throughput_rps"] / before["throughput_rps"] - 1
+        regressed = p95_change > threshold or rps_change < -threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<24} {before['p95_ms']:>11.2f} {after['p95_ms']:>10.2f} {p95_change:>+8.1%}   "
+              f"{before['throughput_rps']:>10.1f} {after['throughput_rps']:>10.1f} {rps_change:>+8.1%}"
+              f"{'   REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Drive every API endpoint at a target concurrency against a seeded catalog and a fake model server."
+    )
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./bench_load.db",
+                        help="Database to seed and serve from; it is dropped and recreated")
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--reviews", type=int, default=50000, help="Total reviews, spread randomly over the books")
+    parser.add_argument("--spare-books", type=int, default=20000, help="Review-free books for the delete scenario")
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--scenarios", default="all", help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario")
+    parser.add_argument("--requests", type=int, default=0, help="Stop a scenario after this many requests (0 = no cap)")
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed requests before each scenario")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--model-latency", type=float, default=0.2, help="Fake model latency before the response, in seconds")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="Fake model delay per streamed token, in seconds")
+    parser.add_argument("--response-tokens", type=int, default=60, help="Tokens in each fake model response")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra server environment variables")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier JSON result to compare this run against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative p95 or throughput change counted as a regression")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Only compare two saved results")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(load(args.compare[0]), load(args.compare[1]), args.threshold)
+    else:
+        report = asyncio.run(run(args))
+        print(f"Peak server RSS: {report['peak_rss_mb']} MB")
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"Results written to {args.output}")
+        regressions = compare(load(args.baseline), report, args.threshold) if args.baseline else []
+    if regressions:
+        print(f"\nRegressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+from app.core.config import SIMILARITY_NLIST
+from app.core.database import AsyncSessionLocal
+from app.models.models import Book as BookModel
+from app.services.similarity import book_vector, load_book_fields, similarity_index
+
+
+async def main(args):
+    similarity_index.open()
+    if args.reset:
+        similarity_index.clear()
+    start = time.perf_counter()
+    indexed = 0
+    last_id = 0
+    async with AsyncSessionLocal() as session:
+        while True:
+            result = await session.execute(
+                select(BookModel.id).where(BookModel.id > last_id).order_by(BookModel.id).limit(args.batch_size)
+            )
+            book_ids = result.scalars().all()
+            if not book_ids:
+                break
+            fields = await load_book_fields(session, book_ids)
+            vectors = np.stack([book_vector(fields[book_id], similarity_index.dim) for book_id in book_ids])
+            similarity_index.upsert_many(book_ids, vectors)
+            indexed += len(book_ids)
+            last_id = book_ids[-1]
+            print(f"Indexed {indexed} books ({indexed / (time.perf_counter() - start):.0f}/s)", end="\r")
+    print(f"\nSimilarity index built for {indexed} books in {time.perf_counter() - start:.1f}s.")
+    if args.train:
+        start = time.perf_counter()
+        similarity_index.train(args.nlist)
+        print(f"Trained {args.nlist} clusters in {time.perf_counter() - start:.1f}s.")
+    similarity_index.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or refresh the memory-mapped similarity index from the database.")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--reset", action="store_true", help="Clear the index before building")
+    parser.add_argument("--train", action="store_true", help="Cluster the index so queries only probe nearby clusters")
+    parser.add_argument("--nlist", type=int, default=SIMILARITY_NLIST, help="Number of clusters to train")
+    asyncio.run(main(parser.parse_args()))
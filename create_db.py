@@ -1,11 +1,25 @@
+import argparse
 import asyncio
-from app.models.models import Base
+import logging
+
 from app.core.database import engine
+from app.models.migrations import MIGRATIONS, applied_versions, migrate
+
+
+async def main(args):
+    if args.status:
+        done = set(await applied_versions(engine))
+        for migration in MIGRATIONS:
+            print(f"{'applied' if migration.version in done else 'pending':<8} {migration.version:>3}  {migration.name}")
+    else:
+        applied = await migrate(engine, args.to)
+        print(f"Database schema is up to date ({len(applied)} migration(s) applied).")
+    await engine.dispose()
 
-async def init_models():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    print("Database tables created successfully!")
 
 if __name__ == "__main__":
-    asyncio.run(init_models())
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(description="Create the database schema, or upgrade an existing one, by applying pending migrations.")
+    parser.add_argument("--to", type=int, help="Stop after this migration version (default: latest)")
+    parser.add_argument("--status", action="store_true", help="List migrations and whether each is applied, then exit")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,20 @@
+import argparse
+import asyncio
+import getpass
+
+from app.core.auth import set_password
+from app.core.database import AsyncSessionLocal
+
+
+async def main(args):
+    password = args.password or getpass.getpass(f"Password for {args.username}: ")
+    async with AsyncSessionLocal() as session:
+        await set_password(session, args.username, password)
+    print(f"Saved user {args.username}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create a user or change an existing user's password.")
+    parser.add_argument("username")
+    parser.add_argument("--password", help="Prompted for when omitted")
+    asyncio.run(main(parser.parse_args()))
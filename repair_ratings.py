@@ -0,0 +1,17 @@
+import argparse
+import asyncio
+
+from app.core.database import AsyncSessionLocal
+from app.services.ratings import repair_ratings
+
+
+async def main(args):
+    async with AsyncSessionLocal() as session:
+        repaired = await repair_ratings(session, args.book_ids or None)
+    print(f"Rating aggregates repaired for {repaired} book(s).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill or repair Book.rating_count and Book.rating_sum from the reviews table.")
+    parser.add_argument("book_ids", nargs="*", type=int, help="Only repair these books (default: all)")
+    asyncio.run(main(parser.parse_args()))
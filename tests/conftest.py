@@ -1,4 +1,6 @@
 import os
+# Minimum bcrypt cost keeps per-test user setup fast; config reads it on import
+os.environ.setdefault("AUTH_BCRYPT_ROUNDS", "4")
 import pytest_asyncio
 from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
@@ -6,8 +8,18 @@ from sqlalchemy.orm import sessionmaker
 from httpx import AsyncClient
 from httpx._transports.asgi import ASGITransport
 from app.main import app
-from app.core.database import get_session
+from app.core.auth import PASSWORD, USERNAME, credential_cache, ensure_user
+from app.core.database import get_read_session, get_session
 from app.models.models import Base
+from app.services.ai import summary_flight
+from app.services.cache import summary_cache
+from app.services.jobs import job_queue
+from app.services.model_client import close_client
+from app.services.recommendations import top_genre_cache
+from app.services.response_cache import response_cache
+from app.services.review_writer import review_writer
+from app.services.search import search_index
+from app.services.similarity import similarity_index
 
 os.environ["ENV"] = "test"
 load_dotenv(".env.test")
@@ -15,7 +27,7 @@ load_dotenv(".env.test")
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 @pytest_asyncio.fixture(scope="function")
-async def client():
+async def session_factory():
     # Create a fresh engine per test
     engine = create_async_engine(DATABASE_URL, echo=False)
     TestingSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
@@ -25,16 +37,39 @@ async def client():
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
 
+    yield TestingSessionLocal
+
+    await engine.dispose()
+
+@pytest_asyncio.fixture(scope="function")
+async def client(session_factory, tmp_path):
+    # Drop in-process cache state left over from earlier tests
+    await summary_cache.clear(persistent=False)
+    summary_cache.reset_stats()
+    summary_flight.reset_stats()
+    top_genre_cache.clear()
+    search_index.clear()
+    await response_cache.clear()
+    response_cache.reset_stats()
+    similarity_index.open(str(tmp_path / "similarity"))
+    credential_cache.clear()
+    async with session_factory() as session:
+        await ensure_user(session, USERNAME, PASSWORD)
+
     # New session override
     async def override_get_session():
-        async with TestingSessionLocal() as session:
+        async with session_factory() as session:
             yield session
 
     app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_read_session] = override_get_session
 
     # Client with isolated DB per test
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
         yield ac
 
-    await engine.dispose()
+    await job_queue.stop()
+    await review_writer.stop()
+    similarity_index.close()
+    await close_client()
@@ -0,0 +1,508 @@
+import asyncio
+import collections
+import itertools
+import time
+
+import httpx
+import numpy as np
+import pytest
+from fastapi.concurrency import run_in_threadpool
+from prometheus_client import REGISTRY
+from sqlalchemy import select
+
+from app.models.models import Book as BookModel, SummaryCacheEntry
+from app.services import ai, backfill, model_client, summarizer
+from app.services.admission import BACKGROUND, INTERACTIVE, AdmissionController, Overloaded, priority
+from app.services.cache import SummaryCache, summary_cache
+from app.services.model_router import OPEN, BackendUnavailable
+from app.services.response_cache import SQLiteBackend
+from app.services.similarity import SimilarityIndex
+from app.services.singleflight import SingleFlight
+from benchmarks.fake_model import FakeModelServer
+
+
+# Test that repeated prompts are served from the cache instead of the model
+@pytest.mark.asyncio
+async def test_summary_cache_hit(client, monkeypatch):
+    calls = []
+
+    async def fake_request_summary(prompt):
+        calls.append(prompt)
+        return f"summary of {prompt}"
+
+    monkeypatch.setattr(ai, "request_summary", fake_request_summary)
+
+    assert await ai.generate_summary("Summarize this book:\nDune") == "summary of Summarize this book:\nDune"
+    assert await ai.generate_summary("Summarize this book:\nDune") == "summary of Summarize this book:\nDune"
+    assert len(calls) == 1
+    assert summary_cache.stats()["memory_hits"] == 1
+
+    # The persistent tier still answers after the in-process tier is dropped
+    await summary_cache.clear(persistent=False)
+    assert await ai.generate_summary("Summarize this book:\nDune") == "summary of Summarize this book:\nDune"
+    assert len(calls) == 1
+    assert summary_cache.stats()["db_hits"] == 1
+
+    await ai.invalidate_summary("Summarize this book:\nDune")
+    await ai.generate_summary("Summarize this book:\nDune")
+    assert len(calls) == 2
+
+
+# Test that failed generations are never cached
+@pytest.mark.asyncio
+async def test_summary_cache_skips_failures(client, monkeypatch):
+    calls = []
+
+    async def failing_request_summary(prompt):
+        calls.append(prompt)
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(ai, "request_summary", failing_request_summary)
+
+    assert await ai.generate_summary("Summarize this book:\nEmma") == ai.FAILED_SUMMARY
+    assert await ai.generate_summary("Summarize this book:\nEmma") == ai.FAILED_SUMMARY
+    assert len(calls) == 2
+    assert summary_cache.stats()["hits"] == 0
+
+
+# Test LRU size eviction and TTL expiry of cached summaries
+@pytest.mark.asyncio
+async def test_summary_cache_eviction(client, monkeypatch):
+    monkeypatch.setattr(summary_cache, "max_entries", 2)
+    for key in ("a", "b", "c"):
+        await summary_cache.set(key, "llama3", f"response {key}")
+    assert summary_cache.stats()["memory_entries"] == 2
+
+    monkeypatch.setattr(summary_cache, "ttl_seconds", -1)
+    assert await summary_cache.get("c") is None
+
+
+# Test that workers writing the same cache key at once upsert it instead of failing
+@pytest.mark.asyncio
+async def test_summary_cache_concurrent_writes(session_factory, caplog):
+    # Separate caches stand in for separate workers sharing the table
+    workers = [SummaryCache(10, 100, 3600, session_factory) for _ in range(8)]
+    await asyncio.gather(*(worker.set("shared", "llama3", f"response {i}") for i, worker in enumerate(workers)))
+    assert "Summary cache write error" not in caplog.text
+
+    async with session_factory() as session:
+        rows = (await session.execute(select(SummaryCacheEntry))).scalars().all()
+    assert len(rows) == 1
+    assert rows[0].response.startswith("response ")
+    reader = SummaryCache(10, 100, 3600, session_factory)
+    assert await reader.get("shared") == rows[0].response
+
+
+# Test summaries generated through the shared client against a local fake model server
+@pytest.mark.asyncio
+async def test_generate_summary_with_shared_client(client, monkeypatch):
+    with FakeModelServer(response_text="Spice and sandworms.") as server:
+        monkeypatch.setattr(model_client, "_router", model_client.create_router([server.url]))
+        assert await ai.generate_summary("Summarize this book:\nDune") == "Spice and sandworms."
+        assert model_client.get_router() is model_client.get_router()
+        assert server.requests == 1
+
+
+# Test that connection errors are retried with exponential backoff before giving up
+@pytest.mark.asyncio
+async def test_model_client_retries_connection_errors(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(model_client.asyncio, "sleep", fake_sleep)
+    client = model_client.create_client("http://127.0.0.1:9")
+    with pytest.raises(httpx.ConnectError):
+        await model_client.post_with_retries("/api/generate", {}, client=client)
+    await client.aclose()
+    assert delays == [model_client.MODEL_RETRY_BACKOFF * 2 ** i for i in range(model_client.MODEL_MAX_RETRIES)]
+
+
+# Test that concurrent identical prompts share one generation, even if a caller disconnects
+@pytest.mark.asyncio
+async def test_concurrent_summaries_are_coalesced(client, monkeypatch):
+    calls = []
+    release = asyncio.Event()
+
+    async def slow_request_summary(prompt):
+        calls.append(prompt)
+        await release.wait()
+        return "shared summary"
+
+    monkeypatch.setattr(ai, "request_summary", slow_request_summary)
+
+    waiters = [asyncio.create_task(ai.generate_summary("Summarize this book:\nUlysses")) for _ in range(5)]
+    while ai.summary_flight.stats()["coalesced"] < 4:
+        await asyncio.sleep(0.01)
+    waiters[0].cancel()
+    release.set()
+
+    results = await asyncio.gather(*waiters[1:])
+    assert results == ["shared summary"] * 4
+    assert len(calls) == 1
+    assert ai.summary_flight.stats()["coalesced"] == 4
+
+
+# Test that an error in the shared call reaches every waiter
+@pytest.mark.asyncio
+async def test_singleflight_propagates_errors():
+    flight = SingleFlight("test-errors")
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(*(flight.do("key", boom) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.stats() == {"executions": 1, "coalesced": 2, "inflight": 0}
+    assert REGISTRY.get_sample_value("singleflight_calls_total", {"namespace": "test-errors", "result": "executed"}) == 1
+    assert REGISTRY.get_sample_value("singleflight_calls_total", {"namespace": "test-errors", "result": "coalesced"}) == 2
+
+
+# Test that abandoning a summary stream cancels the upstream model request
+@pytest.mark.asyncio
+async def test_stream_summary_cancels_upstream(client, monkeypatch):
+    with FakeModelServer(response_text="word " * 200, token_delay=0.01) as server:
+        monkeypatch.setattr(model_client, "_router", model_client.create_router([server.url]))
+        stream = ai.stream_summary("Summarize this book:\nMoby Dick")
+        assert await stream.__anext__() == "word "
+        await stream.aclose()
+
+        for _ in range(100):
+            if server.app.state.streams_aborted:
+                break
+            await asyncio.sleep(0.02)
+        assert server.app.state.streams_aborted == 1
+        assert server.app.state.streams_completed == 0
+    assert summary_cache.stats()["memory_entries"] == 0
+
+
+# Test that large review sets are summarised in bounded chunks and reduced
+@pytest.mark.asyncio
+async def test_map_reduce_review_summary(client, monkeypatch):
+    prompts = []
+    # Numbered across both runs so a changed chunk can never reproduce an earlier reduce prompt
+    calls = itertools.count(1)
+
+    async def fake_request_summary(prompt):
+        prompts.append(prompt)
+        return f"partial {next(calls)}"
+
+    monkeypatch.setattr(ai, "request_summary", fake_request_summary)
+    monkeypatch.setattr(summarizer, "SUMMARY_CHUNK_TOKENS", 300)
+    reviews = [f"review {i} " + "x" * 392 for i in range(10)]  # ~100 tokens each
+
+    summary = await summarizer.summarize_reviews(reviews)
+    assert summary.startswith("partial")
+    # Three reviews fit per chunk: four map prompts, then one reduce prompt
+    assert len(prompts) == 5
+    assert prompts[-1].startswith(summarizer.REDUCE_PROMPT)
+    assert max(summarizer.estimate_tokens(p) for p in prompts) < 350
+
+    # A new review only changes the last chunk, so the earlier chunk summaries come from the cache
+    prompts.clear()
+    await summarizer.summarize_reviews(reviews + ["one more review"])
+    assert len(prompts) == 2
+
+
+# Test that the prompt budget holds for oversized reviews and for partial summaries that do not shrink
+@pytest.mark.asyncio
+async def test_review_prompt_stays_within_budget(client, monkeypatch):
+    prompt = await summarizer.build_review_prompt(["y" * 200_000], budget=2000)
+    assert summarizer.estimate_tokens(prompt) <= 2000 + summarizer.estimate_tokens(summarizer.REVIEW_PROMPT)
+
+    calls = itertools.count(1)
+
+    async def verbose_request_summary(prompt):
+        # Every partial is as long as the whole budget, so reducing never shrinks them
+        return f"partial {next(calls)} " + "z" * 1200
+
+    monkeypatch.setattr(ai, "request_summary", verbose_request_summary)
+    reviews = [f"review {i} " + "x" * 392 for i in range(10)]
+    prompt = await asyncio.wait_for(summarizer.build_review_prompt(reviews, budget=300), 5)
+    assert prompt.startswith(summarizer.REDUCE_PROMPT)
+    assert summarizer.estimate_tokens(prompt) <= 300 + summarizer.estimate_tokens(summarizer.REDUCE_PROMPT) + 4
+
+
+# Test batched top-k queries and persistence of the memory-mapped similarity index
+def test_similarity_index_persists(tmp_path):
+    index = SimilarityIndex(str(tmp_path), dim=8)
+    vectors = np.eye(8, dtype=np.float32)
+    vectors[3] = vectors[2] * 0.6 + vectors[1] * 0.8
+    index.upsert_many(list(range(1, 9)), vectors)
+    index.close()
+
+    reopened = SimilarityIndex(str(tmp_path), dim=8)
+    reopened.open()
+    assert reopened.rows == 9
+    results = reopened.query_batch(vectors[[1, 2]], k=3, exclude=[2, 3])
+    assert results[0][0][0] == 4
+    assert results[1][0][0] == 4
+    assert len(results[0]) == 1
+    reopened.close()
+
+
+# Test that a trained index only probes nearby clusters and keeps assigning new rows after reopening
+def test_similarity_index_probes_clusters(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = np.eye(16, dtype=np.float32)[:4]
+    vectors = centers[np.arange(200) % 4] + 0.05 * rng.standard_normal((200, 16), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = SimilarityIndex(str(tmp_path), dim=16, nprobe=1)
+    index.upsert_many(list(range(1, 201)), vectors)
+    index.train(nlist=4)
+    index.close()
+
+    reopened = SimilarityIndex(str(tmp_path), dim=16, nprobe=1)
+    reopened.open()
+    assert reopened.trained
+    results = reopened.query(1, k=5)
+    assert len(results) == 5
+    assert all((book_id - 1) % 4 == 0 for book_id, _ in results)
+
+    reopened.upsert(201, vectors[0])
+    assert 201 in [book_id for book_id, _ in reopened.query(1, k=60)]
+    reopened.remove(201)
+    assert 201 not in [book_id for book_id, _ in reopened.query(1, k=60)]
+    reopened.close()
+
+
+# Test that two workers sharing the SQLite response cache backend see each other's invalidations
+@pytest.mark.asyncio
+async def test_response_cache_sqlite_backend_shared(tmp_path):
+    path = str(tmp_path / "responses.db")
+    worker_a = SQLiteBackend(path, max_entries=10, ttl_seconds=60)
+    worker_b = SQLiteBackend(path, max_entries=10, ttl_seconds=60)
+
+    assert await worker_a.versions(["book:1", "book:2"]) == [0, 0]
+    await worker_a.bump(["book:1"])
+    await worker_a.bump(["book:1"])
+    assert await worker_b.versions(["book:1", "book:2"]) == [2, 0]
+    assert worker_a.namespace == worker_b.namespace
+
+    await worker_b.set("etag", b'{"id":1}')
+    assert await worker_a.get("etag") == b'{"id":1}'
+    await worker_a.clear_entries()
+    assert await worker_b.get("etag") is None
+
+
+# Test that the SQLite response cache backend trims old versions without any key reusing a version
+@pytest.mark.asyncio
+async def test_response_cache_sqlite_backend_max_versions(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "responses.db"), max_entries=10, ttl_seconds=60, max_versions=3)
+    backend.EVICTION_INTERVAL = 1
+    for key in ("a", "b", "c", "d"):
+        await backend.bump([key])
+    count = await run_in_threadpool(backend._run, lambda c: c.execute("SELECT count(*) FROM versions").fetchone()[0])
+    assert count == 3
+    # The evicted key reads as the highest evicted version, and its next bump is above every version so far
+    assert await backend.versions(["a", "b", "c", "d", "never"]) == [1, 2, 3, 4, 1]
+    await backend.bump(["a"])
+    assert await backend.versions(["a"]) == [5]
+    assert await backend.last_bumped(["a"]) >= await backend.last_bumped(["b"]) > 0
+
+
+# Test that freed model slots go to interactive callers first, and that full queues and deadlines are rejected
+@pytest.mark.asyncio
+async def test_admission_priorities_and_deadlines():
+    admission = AdmissionController(limit=1, max_queue=2, timeouts={INTERACTIVE: 5, BACKGROUND: 5})
+    order = []
+
+    async def call(name):
+        async with admission.slot(name):
+            order.append(name)
+
+    await admission.acquire(INTERACTIVE)
+    background = asyncio.create_task(call(BACKGROUND))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(call(INTERACTIVE))
+    await asyncio.sleep(0)
+    assert admission.stats()["queued"] == {INTERACTIVE: 1, BACKGROUND: 1}
+
+    # The queue is full: another background caller is turned away, an interactive one displaces the background waiter
+    with pytest.raises(Overloaded) as rejected:
+        await admission.acquire(BACKGROUND)
+    assert rejected.value.status_code == 429 and rejected.value.retry_after >= 1
+    late = asyncio.create_task(call(INTERACTIVE))
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded) as shed:
+        await background
+    assert shed.value.status_code == 503
+
+    admission.release()
+    await asyncio.gather(interactive, late)
+    assert order == [INTERACTIVE, INTERACTIVE]
+    assert admission.in_flight == 0
+
+    # Background priority is inherited through the context; its waiters give up at their deadline
+    admission.timeouts[BACKGROUND] = 0.05
+    await admission.acquire(INTERACTIVE)
+    with priority(BACKGROUND), pytest.raises(Overloaded) as expired:
+        await admission.acquire()
+    assert expired.value.status_code == 503 and expired.value.reason == "deadline"
+    assert admission.depth() == 0
+    admission.release()
+    assert admission.in_flight == 0
+
+
+# Test that shedding skips waiters that already gave up, and rejects the newcomer when only those were left
+@pytest.mark.asyncio
+async def test_admission_shed_skips_abandoned_waiters():
+    admission = AdmissionController(limit=1, max_queue=2, timeouts={INTERACTIVE: 5, BACKGROUND: 5})
+    loop = asyncio.get_running_loop()
+
+    def abandoned(name):
+        # A waiter whose deadline passed stays queued until its task resumes
+        future = loop.create_future()
+        future.cancel()
+        admission._queues[name].append(future)
+
+    await admission.acquire(INTERACTIVE)
+    background = asyncio.create_task(admission.acquire(BACKGROUND))
+    await asyncio.sleep(0)
+    abandoned(BACKGROUND)
+    interactive = asyncio.create_task(admission.acquire(INTERACTIVE))
+    await asyncio.sleep(0)
+    # Dropping the abandoned waiter made room, so the live background waiter keeps its place
+    assert not background.done()
+    assert admission.stats()["queued"] == {INTERACTIVE: 1, BACKGROUND: 1}
+
+    # Only an abandoned background waiter is left to shed and the queue is still full
+    background.cancel()
+    await asyncio.gather(background, return_exceptions=True)
+    abandoned(INTERACTIVE)
+    abandoned(BACKGROUND)
+    with pytest.raises(Overloaded) as rejected:
+        await admission.acquire(INTERACTIVE)
+    assert rejected.value.reason == "queue_full"
+
+    admission.release()
+    await interactive
+    admission.release()
+    assert admission.in_flight == 0 and admission.depth() == 0
+
+
+# Test least-outstanding balancing, failover with circuit breaking, and health probes across stub servers
+@pytest.mark.asyncio
+async def test_model_router_balances_and_fails_over():
+    payload = {"model": "llama3", "prompt": "Summarize", "stream": False}
+    with FakeModelServer(latency=0.1) as first, FakeModelServer(latency=0.1) as second:
+        router = model_client.create_router([first.url, second.url])
+        responses = await asyncio.gather(*(router.request("generate", lambda c: c.post("/api/generate", json=payload)) for _ in range(20)))
+        assert all(response.status_code == 200 for _, response in responses)
+        assert (first.requests, second.requests) == (10, 10)
+        await router.aclose()
+
+    with FakeModelServer(failure_rate=1.0) as broken, FakeModelServer() as working:
+        router = model_client.create_router([broken.url, working.url])
+        for backend in router.backends:
+            backend.failure_threshold = 2
+        for _ in range(10):
+            _, response = await router.request("generate", lambda c: c.post("/api/generate", json=payload))
+            assert response.status_code == 200
+        # Two failures open the broken backend's circuit; everything after goes straight to the working one
+        assert broken.requests == 2
+        assert router.backends[0].state == OPEN
+
+        working.app.state.healthy = False
+        await router.probe()
+        with pytest.raises(BackendUnavailable):
+            await router.request("generate", lambda c: c.post("/api/generate", json=payload))
+        working.app.state.healthy = True
+        await router.probe()
+        assert router.choose() is router.backends[1]
+        await router.aclose()
+
+
+# Test that connection failures move to the next backend but read timeouts are not retried
+@pytest.mark.asyncio
+async def test_model_router_retries_only_connection_failures():
+    router = model_client.create_router(["http://model-a", "http://model-b"], max_retries=2, retry_backoff=0)
+    calls = []
+
+    def failing(error):
+        async def send(client):
+            calls.append(str(client.base_url))
+            raise error("boom")
+        return send
+
+    with pytest.raises(httpx.ConnectError):
+        await router.request("generate", failing(httpx.ConnectError))
+    assert len(calls) == 3 and len(set(calls)) == 2
+
+    calls.clear()
+    with pytest.raises(httpx.ReadTimeout):
+        await router.request("generate", failing(httpx.ReadTimeout))
+    assert len(calls) == 1
+    await router.aclose()
+
+
+# Test that a request stuck on a slow backend is hedged to another one and the faster answer wins
+@pytest.mark.asyncio
+async def test_model_router_hedges_slow_backend():
+    payload = {"model": "llama3", "prompt": "Summarize", "stream": False}
+    with FakeModelServer(latency=2.0) as slow, FakeModelServer(latency=0.02) as fast:
+        router = model_client.create_router([slow.url, fast.url], hedge_percentile=0.5, hedge_min_samples=1)
+        router.latencies["generate"] = collections.deque([0.05])
+        for _ in range(4):
+            start = time.perf_counter()
+            backend, response = await router.request("generate", lambda c: c.post("/api/generate", json=payload))
+            assert time.perf_counter() - start < 1.0
+            assert backend.url == fast.url and response.status_code == 200
+        assert router.hedges == router.hedges_won == 4
+        assert all(backend.outstanding == 0 for backend in router.backends)
+        # Losing requests are cancelled, which must not count against the slow backend
+        assert router.backends[0].failures == 0
+        await router.aclose()
+
+
+# Test that the summary backfill bounds concurrency, checkpoints each batch and resumes after an interruption
+@pytest.mark.asyncio
+async def test_backfill_summaries_resumes(client, session_factory, monkeypatch, tmp_path):
+    async with session_factory() as session:
+        session.add_all([
+            BookModel(id=i, title=f"Book {i}", author="Backfiller", genre="Fiction", year_published=2000,
+                      summary="Hand written" if i % 5 == 0 else None)
+            for i in range(1, 26)
+        ])
+        await session.commit()
+
+    original = ai.request_summary
+    in_flight = collections.Counter()
+
+    async def tracked_request_summary(prompt):
+        in_flight["now"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        try:
+            if "Book 17" in prompt:
+                raise httpx.ConnectError("model went away")
+            return await original(prompt)
+        finally:
+            in_flight["now"] -= 1
+
+    monkeypatch.setattr(ai, "request_summary", tracked_request_summary)
+    checkpoint = str(tmp_path / "backfill.json")
+    reports = []
+    with FakeModelServer(latency=0.02, response_text="Backfilled.") as server:
+        monkeypatch.setattr(model_client, "_router", model_client.create_router([server.url]))
+        # Interrupted after two batches of four books without a summary: 1-4, then 6-9
+        first = await backfill.backfill_summaries(session_factory, checkpoint, batch_size=4, concurrency=3, max_batches=2)
+        assert (first["processed"], first["written"], first["last_id"]) == (8, 8, 9)
+        assert backfill.load_checkpoint(checkpoint) == {"last_id": 9, "written": 8, "failed": []}
+        assert in_flight["peak"] == 3
+
+        rest = await backfill.backfill_summaries(session_factory, checkpoint, batch_size=4, concurrency=3, progress=reports.append)
+        assert server.requests == 19
+    assert (rest["processed"], rest["written"], rest["failed"]) == (12, 11, [17])
+    assert reports[0]["remaining"] == 8 and reports[-1]["remaining"] == 0
+    assert reports[0]["eta_seconds"] > 0 and reports[-1]["eta_seconds"] == 0
+
+    async with session_factory() as session:
+        summaries = dict((await session.execute(select(BookModel.id, BookModel.summary))).all())
+    assert summaries[5] == "Hand written"
+    assert summaries[17] is None
+    assert all(summaries[i] == "Backfilled." for i in range(1, 26) if i % 5 and i != 17)
+
+    # A finished run has nothing left after its checkpoint
+    assert (await backfill.backfill_summaries(session_factory, checkpoint))["processed"] == 0
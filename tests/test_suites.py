@@ -1,6 +1,29 @@
 import asyncio
+import json
+import os
+import time
 import pytest
-from tests.utils import basic_auth_headers
+from sqlalchemy import event, insert, inspect, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from prometheus_client import REGISTRY
+from app.api.v1 import endpoints
+from app.core import auth, metrics
+from app.core.database import ReadRouter, create_engine, get_read_session
+from app.main import app
+from app.models.migrations import MIGRATIONS, applied_versions, migrate
+from app.models.models import Base, Book as BookModel, Job as JobModel, Review as ReviewModel
+from app.services import ai, model_client, summarizer
+from app.services.admission import INTERACTIVE, model_admission
+from app.services.jobs import CONTENT_SUMMARY, JobQueue, job_queue, new_job
+from app.services.ratings import repair_ratings
+from app.services import response_cache as response_cache_module
+from app.services.recommendations import TopGenreCache, normalize_genre, top_genre_cache
+from app.services import review_writer as review_writer_module
+from app.services.review_writer import ReviewWriter, review_writer
+from app.services.similarity import similarity_index
+from benchmarks.fake_model import FakeModelServer
+from tests.utils import basic_auth_headers, sqlite_url
 
 BASE_URL = "/v1/api"
 
@@ -88,6 +111,36 @@ async def test_delete_book(client):
     get_resp = await client.get(f"/v1/api/books/{book_id}", headers=headers)
     assert get_resp.status_code == 404
 
+# Test that writes to a missing book 404 and deleting a reviewed book removes its reviews
+@pytest.mark.asyncio
+async def test_book_writes_missing_and_reviewed(client):
+    headers = basic_auth_headers()
+    missing = f"{BASE_URL}/books/999999"
+    assert (await client.put(missing, json={"title": "Nope"}, headers=headers)).status_code == 404
+    assert (await client.put(missing, json={}, headers=headers)).status_code == 404
+    assert (await client.delete(missing, headers=headers)).status_code == 404
+    assert (await client.post(f"{missing}/reviews", json={
+        "user_id": 1, "review_text": "Ghost", "rating": 3
+    }, headers=headers)).status_code == 404
+
+    book = (await client.post(f"{BASE_URL}/books", json={
+        "title": "Reviewed Then Deleted", "author": "Someone", "genre": "Thriller",
+        "year_published": 2019, "summary": "Bye"
+    }, headers=headers)).json()
+    await client.post(f"{BASE_URL}/books/{book['id']}/reviews", json={
+        "user_id": 1, "review_text": "Gone soon", "rating": 2
+    }, headers=headers)
+
+    # A genre change moves the book between genres and leaves the other fields alone
+    updated = (await client.put(f"{BASE_URL}/books/{book['id']}", json={"genre": "Mystery"}, headers=headers)).json()
+    assert updated["genre"] == "Mystery"
+    assert updated["title"] == "Reviewed Then Deleted"
+    assert updated["average_rating"] == 2
+    assert (await client.put(f"{BASE_URL}/books/{book['id']}", json={}, headers=headers)).json()["genre"] == "Mystery"
+
+    assert (await client.delete(f"{BASE_URL}/books/{book['id']}", headers=headers)).status_code == 200
+    assert (await client.get(f"{BASE_URL}/books/{book['id']}/reviews", headers=headers)).json() == []
+
 # Test adding a review to a book
 @pytest.mark.asyncio
 async def test_add_review(client):
@@ -132,6 +185,205 @@ async def test_get_reviews(client):
     assert response.status_code == 200
     assert len(response.json()) == 3
 
+# Test paging through reviews oldest and newest first with the cursor header
+@pytest.mark.asyncio
+async def test_get_reviews_paginated(client):
+    headers = basic_auth_headers()
+    book = (await client.post(f"{BASE_URL}/books", json={
+        "title": "Paged Reviews", "author": "Pager", "genre": "Biography", "year_published": 2018
+    }, headers=headers)).json()
+    for i in range(5):
+        await client.post(f"{BASE_URL}/books/{book['id']}/reviews", json={
+            "user_id": i, "review_text": f"Review {i}", "rating": 3
+        }, headers=headers)
+
+    url = f"{BASE_URL}/books/{book['id']}/reviews"
+    for order, expected in (("oldest", [0, 1, 2, 3, 4]), ("newest", [4, 3, 2, 1, 0])):
+        seen, params = [], {"limit": 2, "order": order}
+        while True:
+            response = await client.get(url, params=params, headers=headers)
+            seen += [r["user_id"] for r in response.json()]
+            if "x-next-cursor" not in response.headers:
+                break
+            params["after_id"] = response.headers["x-next-cursor"]
+        assert seen == expected
+
+    # Cached pages keep their cursor
+    first = await client.get(url, params={"limit": 2}, headers=headers)
+    again = await client.get(url, params={"limit": 2}, headers=headers)
+    assert again.headers["x-cache"] == "HIT"
+    assert again.headers["x-next-cursor"] == first.headers["x-next-cursor"] == str(first.json()[1]["id"])
+    assert (await client.get(url, params={"limit": 0}, headers=headers)).status_code == 422
+
+# Test fetching several books with their latest reviews in one request
+@pytest.mark.asyncio
+async def test_books_batch(client):
+    headers = basic_auth_headers()
+    ids = []
+    for i in range(3):
+        book = (await client.post(f"{BASE_URL}/books", json={
+            "title": f"Shelf {i}", "author": "Shelver", "genre": "Fiction", "year_published": 2000 + i
+        }, headers=headers)).json()
+        ids.append(book["id"])
+        for j in range(i + 2):
+            await client.post(f"{BASE_URL}/books/{book['id']}/reviews", json={
+                "user_id": j, "review_text": f"Shelf {i} review {j}", "rating": j % 5 + 1
+            }, headers=headers)
+
+    requested = f"{ids[2]},{ids[0]},999999,{ids[2]}"
+    response = await client.get(f"{BASE_URL}/books:batch", params={"ids": requested, "reviews": 2}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [b["id"] for b in data["books"]] == [ids[2], ids[0]]
+    assert data["missing"] == [999999]
+    assert response.headers["cache-control"] == "no-store"
+    newest = data["books"][0]
+    assert [r["user_id"] for r in newest["reviews"]] == [3, 2]
+    assert newest["rating_count"] == 4
+    assert newest["average_rating"] == 2.5
+
+    url = f"{BASE_URL}/books:batch?ids={ids[0]},{ids[1]}"
+    assert (await client.get(url, headers=headers)).headers["x-cache"] == "MISS"
+    assert (await client.get(url, headers=headers)).headers["x-cache"] == "HIT"
+    # A new review on any book in the batch invalidates it
+    await client.post(f"{BASE_URL}/books/{ids[1]}/reviews", json={"user_id": 9, "review_text": "Late", "rating": 5}, headers=headers)
+    refreshed = await client.get(url, headers=headers)
+    assert refreshed.headers["x-cache"] == "MISS"
+    assert refreshed.json()["books"][1]["reviews"][0]["user_id"] == 9
+    assert len(refreshed.json()["books"][1]["reviews"]) == 3
+
+    assert (await client.get(f"{BASE_URL}/books:batch?ids=1,x", headers=headers)).status_code == 400
+    too_many = ",".join(str(i) for i in range(1, 200))
+    assert (await client.get(f"{BASE_URL}/books:batch?ids={too_many}", headers=headers)).status_code == 400
+
+# Test that group commit writes queued reviews together and answers each request after its batch commits
+@pytest.mark.asyncio
+async def test_review_group_commit(client, session_factory, monkeypatch):
+    headers = basic_auth_headers()
+    book = (await client.post(f"{BASE_URL}/books", json={
+        "title": "Busy Book", "author": "Popular", "genre": "Fiction", "year_published": 2020
+    }, headers=headers)).json()
+    monkeypatch.setattr(endpoints, "REVIEW_GROUP_COMMIT", True)
+    monkeypatch.setattr(review_writer, "max_delay", 0.05)
+    monkeypatch.setattr(review_writer, "batches", 0)
+    await review_writer.start(session_factory)
+
+    responses = await asyncio.gather(*(client.post(f"{BASE_URL}/books/{book['id']}/reviews", json={
+        "user_id": i, "review_text": f"Queued {i}", "rating": i % 5 + 1
+    }, headers=headers) for i in range(20)))
+    assert all(r.status_code == 200 for r in responses)
+    assert 0 < review_writer.batches < 20
+
+    # Acknowledged reviews are committed and visible, aggregates included
+    data = (await client.get(f"{BASE_URL}/books/{book['id']}", headers=headers)).json()
+    assert data["rating_count"] == 20
+    assert data["average_rating"] == 3.0
+    reviews = (await client.get(f"{BASE_URL}/books/{book['id']}/reviews", headers=headers)).json()
+    assert len(reviews) == 20
+
+    missing = await client.post(f"{BASE_URL}/books/999999/reviews", json={
+        "user_id": 1, "review_text": "Nowhere", "rating": 3
+    }, headers=headers)
+    assert missing.status_code == 404
+
+# Test that stopping the writer still commits the reviews it was waiting on or writing
+@pytest.mark.asyncio
+async def test_review_writer_stop_mid_batch(session_factory, monkeypatch):
+    async with session_factory() as session:
+        session.add(BookModel(id=1, title="Closing Time", author="Last", genre="Drama", year_published=2001))
+        await session.commit()
+
+    def review(i):
+        return {"book_id": 1, "user_id": i, "review_text": f"Before shutdown {i}", "rating": 4}
+
+    # Held by the flusher while it waits for its batch to fill
+    writer = ReviewWriter(max_batch=100, max_delay=10, session_factory=session_factory)
+    await writer.start()
+    waiting = asyncio.create_task(writer.submit(review(1)))
+    await asyncio.sleep(0.05)
+    await writer.stop()
+    assert await asyncio.wait_for(waiting, 1) == "Drama"
+
+    # Cancelled partway through writing its batch
+    entered, release = asyncio.Event(), asyncio.Event()
+    add_reviews = review_writer_module.add_reviews
+
+    async def slow_add_reviews(session, reviews):
+        entered.set()
+        await release.wait()
+        return await add_reviews(session, reviews)
+
+    monkeypatch.setattr(review_writer_module, "add_reviews", slow_add_reviews)
+    writer = ReviewWriter(max_batch=1, max_delay=0, session_factory=session_factory)
+    await writer.start()
+    writing = asyncio.create_task(writer.submit(review(2)))
+    await asyncio.wait_for(entered.wait(), 1)
+    stopping = asyncio.create_task(writer.stop())
+    await asyncio.sleep(0.05)
+    release.set()
+    await asyncio.wait_for(stopping, 1)
+    assert await asyncio.wait_for(writing, 1) == "Drama"
+
+    async with session_factory() as session:
+        book = await session.get(BookModel, 1)
+        stored = (await session.execute(select(ReviewModel.user_id).where(ReviewModel.book_id == 1))).scalars().all()
+    assert sorted(stored) == [1, 2]
+    assert book.rating_count == 2
+
+# Test that a bad review in a group commit fails only its own caller
+@pytest.mark.asyncio
+async def test_review_writer_isolates_bad_review(session_factory):
+    async with session_factory() as session:
+        session.add(BookModel(id=1, title="Mixed Bag", author="Many", genre="Essay", year_published=2010))
+        await session.commit()
+
+    writer = ReviewWriter(max_batch=8, max_delay=0.2, session_factory=session_factory)
+    await writer.start()
+    reviews = [{"book_id": 1, "user_id": i, "review_text": f"Fine {i}", "rating": 4} for i in range(8)]
+    # NOT NULL violation: fails the whole multi-row INSERT it is part of
+    reviews[5]["user_id"] = None
+    results = await asyncio.wait_for(
+        asyncio.gather(*(writer.submit(review) for review in reviews), return_exceptions=True), 5
+    )
+    await writer.stop()
+
+    assert [r for i, r in enumerate(results) if i != 5] == ["Essay"] * 7
+    assert isinstance(results[5], Exception)
+    async with session_factory() as session:
+        book = await session.get(BookModel, 1)
+        stored = (await session.execute(select(ReviewModel.user_id).where(ReviewModel.book_id == 1))).scalars().all()
+    assert sorted(stored) == [0, 1, 2, 3, 4, 6, 7]
+    assert book.rating_count == 7
+
+# Test adding many reviews in one request
+@pytest.mark.asyncio
+async def test_add_reviews_batch(client):
+    headers = basic_auth_headers()
+    book = (await client.post(f"{BASE_URL}/books", json={
+        "title": "Bulk Book", "author": "Importer", "genre": "History", "year_published": 1999
+    }, headers=headers)).json()
+    url = f"{BASE_URL}/books/{book['id']}/reviews:batch"
+    assert (await client.get(f"{BASE_URL}/books/{book['id']}", headers=headers)).json()["rating_count"] == 0
+
+    response = await client.post(url, json=[
+        {"user_id": i, "review_text": f"Bulk {i}", "rating": 5 if i % 2 else 3} for i in range(10)
+    ], headers=headers)
+    assert response.status_code == 201
+    assert response.json() == {"book_id": book["id"], "inserted": 10}
+
+    # The cached book is invalidated by the batch
+    data = (await client.get(f"{BASE_URL}/books/{book['id']}", headers=headers)).json()
+    assert data["rating_count"] == 10
+    assert data["average_rating"] == 4.0
+    assert len((await client.get(f"{BASE_URL}/books/{book['id']}/reviews", headers=headers)).json()) == 10
+
+    review = {"user_id": 1, "review_text": "Lost", "rating": 2}
+    assert (await client.post(f"{BASE_URL}/books/999999/reviews:batch", json=[review], headers=headers)).status_code == 404
+    assert (await client.post(url, json=[], headers=headers)).status_code == 400
+    assert (await client.post(url, json=[review] * 1001, headers=headers)).status_code == 400
+    assert (await client.post(url, json=[{"user_id": 1, "rating": 9}], headers=headers)).status_code == 422
+    assert (await client.get(f"{BASE_URL}/books/{book['id']}", headers=headers)).json()["rating_count"] == 10
+
 # Test getting the summary of a book, including average rating
 @pytest.mark.asyncio
 async def test_book_summary(client):
@@ -180,3 +432,838 @@ async def test_generate_summary(client):
     }, headers=headers)
     assert response.status_code == 200
     assert "summary" in response.json()
+
+# Test that summary requests are turned away with Retry-After while the model server is saturated
+@pytest.mark.asyncio
+async def test_generate_summary_overloaded(client, monkeypatch):
+    headers = basic_auth_headers()
+    monkeypatch.setattr(model_admission, "limit", 0)
+    monkeypatch.setattr(model_admission, "max_queue", 0)
+    payload = {"content": "A manuscript nobody has time for."}
+
+    response = await client.post(f"{BASE_URL}/books/generate-summary", json=payload, headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    stream = await client.post(f"{BASE_URL}/books/generate-summary/stream", json=payload, headers=headers)
+    assert stream.status_code == 429
+
+    # Room to queue, but no slot frees up before the deadline
+    monkeypatch.setattr(model_admission, "max_queue", 1)
+    monkeypatch.setitem(model_admission.timeouts, INTERACTIVE, 0.05)
+    response = await client.post(f"{BASE_URL}/books/generate-summary", json=payload, headers=headers)
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert model_admission.depth() == 0
+
+# Test streaming a book summary as Server-Sent Events from a fake streaming model
+@pytest.mark.asyncio
+async def test_stream_book_summary(client, monkeypatch):
+    headers = basic_auth_headers()
+    book = (await client.post(f"{BASE_URL}/books", json={
+        "title": "Streamed Book",
+        "author": "Streamer",
+        "genre": "Essay",
+        "year_published": 2016
+    }, headers=headers)).json()
+
+    with FakeModelServer(response_text="Tokens arrive one by one.") as server:
+        monkeypatch.setattr(model_client, "_router", model_client.create_router([server.url]))
+        response = await client.get(f"{BASE_URL}/books/{book['id']}/summary/stream", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert events[0] == ("meta", {"book_id": book["id"], "title": "Streamed Book", "author": "Streamer", "average_rating": None})
+    book_tokens = [data["text"] for event, data in events if event == "token" and data["field"] == "book_summary"]
+    assert len(book_tokens) == 5
+    assert "".join(book_tokens) == "Tokens arrive one by one."
+    assert events[-1][0] == "done"
+    assert events[-1][1]["ttft_ms"] is not None
+
+# Test keyset pagination, field projection and filters on the book listing
+@pytest.mark.asyncio
+async def test_get_books_paginated(client):
+    headers = basic_auth_headers()
+    for i in range(5):
+        await client.post(f"{BASE_URL}/books", json={
+            "title": f"Paged Book {i}",
+            "author": "Pager" if i % 2 == 0 else "Other",
+            "genre": "Reference",
+            "year_published": 2000 + i,
+            "summary": "A long summary that listings can leave out"
+        }, headers=headers)
+
+    first = await client.get(f"{BASE_URL}/books?limit=2&fields=title", headers=headers)
+    assert first.status_code == 200
+    assert first.json() == [{"id": 1, "title": "Paged Book 0"}, {"id": 2, "title": "Paged Book 1"}]
+    cursor = first.headers["X-Next-Cursor"]
+
+    rest = await client.get(f"{BASE_URL}/books?limit=10&after_id={cursor}", headers=headers)
+    assert [b["id"] for b in rest.json()] == [3, 4, 5]
+    assert "X-Next-Cursor" not in rest.headers
+
+    filtered = await client.get(f"{BASE_URL}/books?author=Pager&year=2002", headers=headers)
+    assert [b["title"] for b in filtered.json()] == ["Paged Book 2"]
+
+    bad = await client.get(f"{BASE_URL}/books?fields=isbn", headers=headers)
+    assert bad.status_code == 400
+
+# Test streaming the book listing as NDJSON
+@pytest.mark.asyncio
+async def test_get_books_ndjson(client):
+    headers = basic_auth_headers()
+    for i in range(3):
+        await client.post(f"{BASE_URL}/books", json={
+            "title": f"Streamed Row {i}",
+            "author": "Streamer",
+            "genre": "Reference",
+            "year_published": 2010
+        }, headers=headers)
+
+    response = await client.get(f"{BASE_URL}/books?format=ndjson&fields=id,title", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == [{"id": i + 1, "title": f"Streamed Row {i}"} for i in range(3)]
+
+# Test bulk importing books from NDJSON with per-row error reporting
+@pytest.mark.asyncio
+async def test_import_books_ndjson(client):
+    headers = basic_auth_headers()
+    lines = [
+        json.dumps({"title": "Imported 1", "author": "Bulk", "genre": "Fantasy", "year_published": 2001}),
+        json.dumps({"title": "Missing author", "genre": "Fantasy", "year_published": 2002}),
+        "not json",
+        json.dumps({"title": "Imported 2", "author": "Bulk", "genre": "Fantasy", "year_published": 2003, "summary": "Two"}),
+    ]
+    response = await client.post(
+        f"{BASE_URL}/books/import?batch_size=1",
+        content="\n".join(lines).encode(),
+        headers={**headers, "Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["inserted"] == 2
+    assert report["failed"] == 2
+    assert [e["line"] for e in report["errors"]] == [2, 3]
+
+    books = (await client.get(f"{BASE_URL}/books?author=Bulk", headers=headers)).json()
+    assert [b["title"] for b in books] == ["Imported 1", "Imported 2"]
+
+    # Imported books are indexed for similarity and show up as neighbours of other books
+    assert all(similarity_index.has(b["id"]) for b in books)
+    neighbour = (await client.post(f"{BASE_URL}/books", json={
+        "title": "Imported 3", "author": "Bulk", "genre": "Fantasy", "year_published": 2004, "summary": "Two"
+    }, headers=headers)).json()
+    similar = (await client.get(f"{BASE_URL}/books/{neighbour['id']}/similar?k=2", headers=headers)).json()
+    assert {b["id"] for b in similar} == {b["id"] for b in books}
+
+# Test that a line that is not valid UTF-8 is reported as a bad row while the rest of the file is imported
+@pytest.mark.asyncio
+async def test_import_books_invalid_utf8(client):
+    headers = basic_auth_headers()
+    lines = [
+        json.dumps({"title": f"Encoded {i}", "author": "Bytes", "genre": "Fiction", "year_published": 2000 + i}).encode()
+        for i in range(4)
+    ]
+    lines.insert(2, b'{"title": "Latin-1 caf\xe9", "author": "Bytes", "genre": "Fiction", "year_published": 1999}')
+    response = await client.post(
+        f"{BASE_URL}/books/import?batch_size=2",
+        content=b"\n".join(lines),
+        headers={**headers, "Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["inserted"] == 4
+    assert report["failed"] == 1
+    assert report["errors"][0]["line"] == 3
+    assert "UTF-8" in report["errors"][0]["error"]
+
+    csv_body = b"title,author,genre,year_published\nOk,Bytes,Essay,2001\nBad \xff,Bytes,Essay,2002\nAlso ok,Bytes,Essay,2003\n"
+    response = await client.post(f"{BASE_URL}/books/import", content=csv_body, headers={**headers, "Content-Type": "text/csv"})
+    assert response.json()["inserted"] == 2
+    assert [e["line"] for e in response.json()["errors"]] == [3]
+
+# Test bulk importing books from CSV, including quoted multi-line fields
+@pytest.mark.asyncio
+async def test_import_books_csv(client):
+    headers = basic_auth_headers()
+    body = (
+        "title,author,genre,year_published,summary\n"
+        'CSV One,Comma,Poetry,1999,"Line one\nline two"\n'
+        "CSV Two,Comma,Poetry,not-a-year,\n"
+        "CSV Three,Comma,Poetry,2005,\n"
+    )
+    response = await client.post(
+        f"{BASE_URL}/books/import",
+        content=body.encode(),
+        headers={**headers, "Content-Type": "text/csv"}
+    )
+    report = response.json()
+    assert report["inserted"] == 2
+    assert report["errors"][0]["line"] == 4
+
+    books = (await client.get(f"{BASE_URL}/books?author=Comma", headers=headers)).json()
+    assert books[0]["summary"] == "Line one\nline two"
+    assert books[1]["summary"] is None
+
+# Test that rating aggregates follow new reviews and reject fractional ratings
+@pytest.mark.asyncio
+async def test_rating_aggregates(client):
+    headers = basic_auth_headers()
+    book = (await client.post(f"{BASE_URL}/books", json={
+        "title": "Rated Book",
+        "author": "Rater",
+        "genre": "Drama",
+        "year_published": 2012
+    }, headers=headers)).json()
+    assert book["rating_count"] == 0
+    assert book["average_rating"] is None
+
+    for rating in (5, 4, 4):
+        await client.post(f"{BASE_URL}/books/{book['id']}/reviews", json={
+            "user_id": 1,
+            "review_text": "Rated",
+            "rating": rating
+        }, headers=headers)
+    fractional = await client.post(f"{BASE_URL}/books/{book['id']}/reviews", json={
+        "user_id": 1,
+        "review_text": "Half a star off",
+        "rating": 4.5
+    }, headers=headers)
+    assert fractional.status_code == 422
+
+    data = (await client.get(f"{BASE_URL}/books/{book['id']}", headers=headers)).json()
+    assert data["rating_count"] == 3
+    assert data["average_rating"] == 4.33
+
+    listed = (await client.get(f"{BASE_URL}/books?fields=average_rating", headers=headers)).json()
+    assert listed == [{"id": book["id"], "average_rating": 4.33}]
+
+# Test repairing rating aggregates that drifted from the reviews table
+@pytest.mark.asyncio
+async def test_repair_ratings(client, session_factory):
+    headers = basic_auth_headers()
+    book = (await client.post(f"{BASE_URL}/books", json={
+        "title": "Drifted Book",
+        "author": "Drifter",
+        "genre": "Drama",
+        "year_published": 2013
+    }, headers=headers)).json()
+    await client.post(f"{BASE_URL}/books/{book['id']}/reviews", json={
+        "user_id": 1,
+        "review_text": "Fine",
+        "rating": 3
+    }, headers=headers)
+
+    async with session_factory() as session:
+        await session.execute(update(BookModel).values(rating_count=7, rating_sum=1))
+        await session.commit()
+        assert await repair_ratings(session) == 1
+
+    data = (await client.get(f"{BASE_URL}/books/{book['id']}", headers=headers)).json()
+    assert data["rating_count"] == 1
+    assert data["average_rating"] == 3.0
+
+async def wait_for_job(client, job_id, headers):
+    for _ in range(200):
+        job = (await client.get(f"{BASE_URL}/jobs/{job_id}", headers=headers)).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+# Test that creating a book without a summary queues generation and writes it back
+@pytest.mark.asyncio
+async def test_create_book_queues_summary_job(client, session_factory, monkeypatch):
+    headers = basic_auth_headers()
+    with FakeModelServer(response_text="Written in the background.") as server:
+        monkeypatch.setattr(model_client, "_router", model_client.create_router([server.url]))
+        await job_queue.start(session_factory)
+        response = await client.post(f"{BASE_URL}/books", json={
+            "title": "Unsummarised",
+            "author": "Nobody",
+            "genre": "Mystery",
+            "year_published": 2024
+        }, headers=headers)
+        job = await wait_for_job(client, response.headers["X-Summary-Job-Id"], headers)
+
+    assert job["status"] == "done"
+    assert job["result"] == "Written in the background."
+    book = (await client.get(f"{BASE_URL}/books/{response.json()['id']}", headers=headers)).json()
+    assert book["summary"] == "Written in the background."
+
+# Test queuing a content summary job that fails once and is retried
+@pytest.mark.asyncio
+async def test_summary_job_retries(client, session_factory, monkeypatch):
+    headers = basic_auth_headers()
+    attempts = []
+
+    async def flaky_request_summary(prompt):
+        attempts.append(prompt)
+        if len(attempts) == 1:
+            raise RuntimeError("model overloaded")
+        return "Second time lucky."
+
+    monkeypatch.setattr(ai, "request_summary", flaky_request_summary)
+    monkeypatch.setattr(job_queue, "retry_backoff", 0.01)
+    await job_queue.start(session_factory)
+
+    response = await client.post(f"{BASE_URL}/jobs/summaries", json={"content": "A raw manuscript."}, headers=headers)
+    assert response.status_code == 202
+    job = await wait_for_job(client, response.json()["id"], headers)
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+    assert job["result"] == "Second time lucky."
+
+    missing = await client.post(f"{BASE_URL}/jobs/summaries", json={"book_id": 999}, headers=headers)
+    assert missing.status_code == 404
+
+# Test that a process only takes over running jobs whose lease expired, never those a live peer holds
+@pytest.mark.asyncio
+async def test_job_leases(session_factory, monkeypatch):
+    calls = []
+
+    async def slow_request_summary(prompt):
+        calls.append(prompt)
+        await asyncio.sleep(0.5)
+        return f"Summary of {prompt[-4:]}"
+
+    monkeypatch.setattr(ai, "request_summary", slow_request_summary)
+    now = time.time()
+    async with session_factory() as session:
+        live = new_job(CONTENT_SUMMARY, payload={"content": "live"})
+        dead = new_job(CONTENT_SUMMARY, payload={"content": "dead"})
+        live.status = dead.status = "running"
+        live.attempts = dead.attempts = 1
+        dead.updated_at = now - 120
+        session.add_all([live, dead])
+        await session.commit()
+
+    # A restarting worker retries the crashed process's job and leaves the live one alone
+    restarted = JobQueue(workers=2, lease_seconds=60, session_factory=session_factory)
+    await restarted.start()
+    await asyncio.sleep(0.8)
+    async with session_factory() as session:
+        assert (await session.get(JobModel, live.id)).status == "running"
+        assert (await session.get(JobModel, dead.id)).status == "done"
+    assert calls == [summarizer.book_summary_prompt("dead")]
+    await restarted.stop()
+    async with session_factory() as session:
+        # The simulated peer never refreshes its lease, so it finishes here before the short-lease run
+        await session.execute(update(JobModel).where(JobModel.id == live.id).values(status="done"))
+        await session.commit()
+
+    # While a job runs its lease is refreshed, so a peer with a short lease does not run it again
+    calls.clear()
+    owner = JobQueue(workers=1, lease_seconds=0.2, session_factory=session_factory)
+    peer = JobQueue(workers=1, lease_seconds=0.2, session_factory=session_factory)
+    async with session_factory() as session:
+        job = new_job(CONTENT_SUMMARY, payload={"content": "long"})
+        session.add(job)
+        await session.commit()
+    await owner.start()
+    owner.notify(job.id)
+    await asyncio.sleep(0.1)
+    await peer.start()
+    await asyncio.sleep(0.7)
+    await owner.stop()
+    await peer.stop()
+    async with session_factory() as session:
+        finished = await session.get(JobModel, job.id)
+    assert finished.status == "done"
+    assert finished.attempts == 1
+    assert calls == [summarizer.book_summary_prompt("long")]
+
+# Test that recommendations are ranked by rating then recency, paginated and refreshed on new reviews
+@pytest.mark.asyncio
+async def test_recommendations_ranked(client):
+    headers = basic_auth_headers()
+    ids = []
+    for title, year in (("Old Classic", 1950), ("New Release", 2020), ("Middle Ground", 1990)):
+        book = (await client.post(f"{BASE_URL}/books", json={
+            "title": title,
+            "author": "Ranker",
+            "genre": "Science Fiction",
+            "year_published": year,
+            "summary": "Ranked"
+        }, headers=headers)).json()
+        ids.append(book["id"])
+
+    response = await client.get(f"{BASE_URL}/recommendations?genre=science fiction", headers=headers)
+    assert [b["title"] for b in response.json()] == ["New Release", "Middle Ground", "Old Classic"]
+
+    for _ in range(3):
+        await client.post(f"{BASE_URL}/books/{ids[0]}/reviews", json={
+            "user_id": 1,
+            "review_text": "Timeless",
+            "rating": 5
+        }, headers=headers)
+
+    response = await client.get(f"{BASE_URL}/recommendations?genre=Science Fiction&limit=2", headers=headers)
+    assert [b["title"] for b in response.json()] == ["Old Classic", "New Release"]
+    assert response.json()[0]["average_rating"] == 5.0
+
+    page = await client.get(f"{BASE_URL}/recommendations?genre=Science Fiction&limit=2&offset=2", headers=headers)
+    assert [b["title"] for b in page.json()] == ["Middle Ground"]
+
+    fuzzy = await client.get(f"{BASE_URL}/recommendations?genre=fiction", headers=headers)
+    assert len(fuzzy.json()) == 3
+
+# Test that padded and non-ASCII genres use the same key as the database's genre_key index
+@pytest.mark.asyncio
+async def test_recommendations_genre_key(client, session_factory):
+    headers = basic_auth_headers()
+    genres = ["  Études Françaises  ", "\tNoir", "ÉTUDES FRANÇAISES"]
+    for i, genre in enumerate(genres):
+        response = await client.post(f"{BASE_URL}/books", json={
+            "title": f"Keyed {i}", "author": "Keyer", "genre": genre, "year_published": 2000 + i, "summary": "Keyed"
+        }, headers=headers)
+        assert response.status_code == 201
+
+    async with session_factory() as session:
+        stored = dict((await session.execute(select(BookModel.genre, BookModel.genre_key))).all())
+    assert {genre: normalize_genre(genre) for genre in genres} == stored
+
+    # The index folds ASCII letters only, so the Ç keeps the third book in a genre of its own
+    response = await client.get(f"{BASE_URL}/recommendations", params={"genre": "ÉTUDES Françaises "}, headers=headers)
+    assert [b["title"] for b in response.json()] == ["Keyed 0"]
+    assert top_genre_cache.get(stored[genres[0]]) is not None
+
+    # A review in the genre drops exactly the entry the lookup filled
+    await client.post(f"{BASE_URL}/books/1/reviews", json={"user_id": 1, "review_text": "Fine", "rating": 4}, headers=headers)
+    assert top_genre_cache.get(stored[genres[0]]) is None
+
+# Test that the top-genre cache keeps only its most recently used genres
+def test_top_genre_cache_lru():
+    cache = TopGenreCache(top_n=5, ttl=60, max_genres=2)
+    cache.set("a", [{"id": 1}])
+    cache.set("b", [{"id": 2}])
+    assert cache.get("a") == [{"id": 1}]
+    cache.set("c", [{"id": 3}])
+    assert cache.get("b") is None
+    assert cache.get("a") == [{"id": 1}] and cache.get("c") == [{"id": 3}]
+
+# Test "more like this" recommendations from the local vector index
+@pytest.mark.asyncio
+async def test_similar_books(client):
+    headers = basic_auth_headers()
+    ids = []
+    for title, author, genre, summary in (
+        ("Stars Beyond", "Ann Orbit", "Science Fiction", "A crew of explorers travels to distant stars in a starship."),
+        ("Starship Dawn", "Bo Nova", "Science Fiction", "Explorers in a starship travel beyond the stars."),
+        ("Soup Season", "Cal Ladle", "Cooking", "Recipes for hearty soups and stews."),
+    ):
+        book = (await client.post(f"{BASE_URL}/books", json={
+            "title": title,
+            "author": author,
+            "genre": genre,
+            "year_published": 2020,
+            "summary": summary
+        }, headers=headers)).json()
+        ids.append(book["id"])
+
+    response = await client.get(f"{BASE_URL}/books/{ids[0]}/similar?k=2", headers=headers)
+    assert response.status_code == 200
+    similar = response.json()
+    assert similar[0]["id"] == ids[1]
+    assert all(b["id"] != ids[0] for b in similar)
+
+    # Reviews mark the book for re-embedding and the next query picks them up
+    await client.post(f"{BASE_URL}/books/{ids[2]}/reviews", json={
+        "user_id": 1,
+        "review_text": "Explorers of distant stars would love these starship soups",
+        "rating": 4
+    }, headers=headers)
+    assert ids[2] in similarity_index.dirty
+    await client.get(f"{BASE_URL}/books/{ids[2]}/similar", headers=headers)
+    assert ids[2] not in similarity_index.dirty
+
+    missing = await client.get(f"{BASE_URL}/books/999/similar", headers=headers)
+    assert missing.status_code == 404
+
+# Test ranked full-text search with snippets, pagination and index updates on writes
+@pytest.mark.asyncio
+async def test_search_books(client):
+    headers = basic_auth_headers()
+    ids = []
+    for title, author, summary in (
+        ("Dragon Keep", "Mara Quill", "A young knight befriends a dragon guarding a mountain keep."),
+        ("The Quiet Garden", "Dragon Press", "Stories of gardens and patient gardeners."),
+        ("Sea of Salt", "Ivo Brine", "A sailor crosses a salt sea in search of home."),
+    ):
+        book = (await client.post(f"{BASE_URL}/books", json={
+            "title": title,
+            "author": author,
+            "genre": "Fiction",
+            "year_published": 2021,
+            "summary": summary
+        }, headers=headers)).json()
+        ids.append(book["id"])
+
+    response = await client.get(f"{BASE_URL}/search?q=dragon", headers=headers)
+    assert response.status_code == 200
+    page = response.json()
+    assert page["total"] == 2
+    # Title matches outrank author matches
+    assert [r["id"] for r in page["results"]] == [ids[0], ids[1]]
+    assert "<mark>dragon</mark>" in page["results"][0]["snippet"]
+
+    second = (await client.get(f"{BASE_URL}/search?q=dragon&limit=1&offset=1", headers=headers)).json()
+    assert [r["id"] for r in second["results"]] == [ids[1]]
+
+    # Every term must match
+    assert (await client.get(f"{BASE_URL}/search?q=dragon+sailor", headers=headers)).json()["total"] == 0
+
+    # New reviews are searchable, and deleted books drop out of the results
+    await client.post(f"{BASE_URL}/books/{ids[2]}/reviews", json={
+        "user_id": 1,
+        "review_text": "Not a single dragon, but the storms are thrilling",
+        "rating": 4
+    }, headers=headers)
+    await client.delete(f"{BASE_URL}/books/{ids[0]}", headers=headers)
+    results = (await client.get(f"{BASE_URL}/search?q=dragon", headers=headers)).json()["results"]
+    assert sorted(r["id"] for r in results) == [ids[1], ids[2]]
+    review_hit = next(r for r in results if r["id"] == ids[2])
+    assert review_hit["snippet"].startswith("Not a single <mark>dragon,</mark>")
+
+    empty = await client.get(f"{BASE_URL}/search?q=", headers=headers)
+    assert empty.status_code == 422
+
+# Test that Basic credentials are checked with bcrypt once and then served from the cache
+@pytest.mark.asyncio
+async def test_basic_auth_cached(client, session_factory, monkeypatch):
+    checks = []
+    original = auth.check_password
+
+    def counting_check(password, password_hash):
+        checks.append(password)
+        return original(password, password_hash)
+
+    monkeypatch.setattr(auth, "check_password", counting_check)
+    for _ in range(3):
+        assert (await client.get(f"{BASE_URL}/books", headers=basic_auth_headers())).status_code == 200
+    assert len(checks) == 1
+    assert auth.credential_cache.hits == 2
+
+    wrong = await client.get(f"{BASE_URL}/books", headers=basic_auth_headers(password="wrong"))
+    assert wrong.status_code == 401
+    unknown = await client.get(f"{BASE_URL}/books", headers=basic_auth_headers(username="nobody"))
+    assert unknown.status_code == 401
+    assert len(checks) == 3
+
+    # Changing the password drops cached credentials for that user
+    async with session_factory() as session:
+        await auth.set_password(session, os.getenv("USERNAME"), "new-password")
+    assert (await client.get(f"{BASE_URL}/books", headers=basic_auth_headers())).status_code == 401
+    assert (await client.get(f"{BASE_URL}/books", headers=basic_auth_headers(password="new-password"))).status_code == 200
+
+# Test issuing a bearer token and authenticating with it
+@pytest.mark.asyncio
+async def test_bearer_token(client):
+    response = await client.post(f"{BASE_URL}/auth/token", headers=basic_auth_headers())
+    assert response.status_code == 200
+    token = response.json()["access_token"]
+    assert response.json()["token_type"] == "bearer"
+
+    books = await client.get(f"{BASE_URL}/books", headers={"Authorization": f"Bearer {token}"})
+    assert books.status_code == 200
+    # A token cannot be exchanged for a fresh one; renewing needs the password
+    renewed = await client.post(f"{BASE_URL}/auth/token", headers={"Authorization": f"Bearer {token}"})
+    assert renewed.status_code == 401
+
+    tampered = await client.get(f"{BASE_URL}/books", headers={"Authorization": f"Bearer {token[:-2]}xx"})
+    assert tampered.status_code == 401
+    expired = auth.create_access_token(os.getenv("USERNAME"), ttl_seconds=-10)
+    assert (await client.get(f"{BASE_URL}/books", headers={"Authorization": f"Bearer {expired}"})).status_code == 401
+    assert (await client.get(f"{BASE_URL}/books")).status_code == 401
+
+# Test that GET endpoints read from replicas while writes go to the primary, skipping unreachable replicas
+@pytest.mark.asyncio
+async def test_read_replica_routing(client, session_factory, tmp_path):
+    headers = basic_auth_headers()
+    replica_engine = create_engine(sqlite_url(tmp_path / "replica.db"))
+    broken_engine = create_engine(sqlite_url(tmp_path / "missing" / "replica.db"))
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    replica = sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+    broken = sessionmaker(broken_engine, class_=AsyncSession, expire_on_commit=False)
+    router = ReadRouter(session_factory, [replica, broken], strategy="round_robin")
+
+    async def override_get_read_session():
+        async with router.session() as session:
+            yield session
+
+    app.dependency_overrides[get_read_session] = override_get_read_session
+    created = (await client.post(f"{BASE_URL}/books", json={
+        "title": "Primary Title",
+        "author": "Author",
+        "genre": "Fiction",
+        "year_published": 2020,
+        "summary": "On the primary"
+    }, headers=headers)).json()
+    # Simulate replication with a marker so reads show which database served them
+    async with replica() as session:
+        session.add(BookModel(id=created["id"], title="Replica Title", author="Author", genre="Fiction", year_published=2020))
+        await session.commit()
+
+    titles = [(await client.get(f"{BASE_URL}/books", headers=headers)).json()[0]["title"] for _ in range(4)]
+    # The broken replica is tried once, falls back to the primary, and is then skipped
+    assert titles == ["Replica Title", "Primary Title", "Replica Title", "Replica Title"]
+    assert router.served == [3, 0]
+    assert router.in_flight == [0, 0]
+
+    least_loaded = ReadRouter(session_factory, [replica, replica], strategy="least_loaded")
+    least_loaded.in_flight = [3, 1]
+    assert least_loaded.choose() == 1
+
+    await replica_engine.dispose()
+    await broken_engine.dispose()
+
+# Test that replica reads right after a write are not cached under the new versions
+@pytest.mark.asyncio
+async def test_response_cache_replica_lag(client, session_factory, tmp_path, monkeypatch):
+    headers = basic_auth_headers()
+    replica_engine = create_engine(sqlite_url(tmp_path / "replica.db"))
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    replica = sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+    router = ReadRouter(session_factory, [replica])
+
+    async def override_get_read_session():
+        async with router.session() as session:
+            yield session
+
+    app.dependency_overrides[get_read_session] = override_get_read_session
+    created = (await client.post(f"{BASE_URL}/books", json={
+        "title": "Before", "author": "Author", "genre": "Fiction", "year_published": 2020, "summary": "Lagging"
+    }, headers=headers)).json()
+    async with replica() as session:
+        session.add(BookModel(id=created["id"], title="Before", author="Author", genre="Fiction", year_published=2020))
+        await session.commit()
+    # The replica has not applied the rename yet
+    await client.put(f"{BASE_URL}/books/{created['id']}", json={"title": "After"}, headers=headers)
+
+    for _ in range(2):
+        lagging = await client.get(f"{BASE_URL}/books/{created['id']}", headers=headers)
+        assert lagging.json()["title"] == "Before"
+        assert lagging.headers["Cache-Control"] == "no-store"
+        assert "ETag" not in lagging.headers
+
+    async with replica() as session:
+        await session.execute(update(BookModel).where(BookModel.id == created["id"]).values(title="After"))
+        await session.commit()
+    monkeypatch.setattr(response_cache_module, "DB_REPLICA_MAX_LAG_SECONDS", 0)
+    assert (await client.get(f"{BASE_URL}/books/{created['id']}", headers=headers)).headers["X-Cache"] == "MISS"
+    cached = await client.get(f"{BASE_URL}/books/{created['id']}", headers=headers)
+    assert cached.headers["X-Cache"] == "HIT"
+    assert cached.json()["title"] == "After"
+
+    await replica_engine.dispose()
+
+# Test ETag revalidation and that writes only invalidate the responses they affect
+@pytest.mark.asyncio
+async def test_response_cache_etags(client):
+    headers = basic_auth_headers()
+    ids = []
+    for title, genre in (("Cached One", "Fantasy"), ("Cached Two", "History")):
+        book = (await client.post(f"{BASE_URL}/books", json={
+            "title": title,
+            "author": "Author",
+            "genre": genre,
+            "year_published": 2020,
+            "summary": "Summary"
+        }, headers=headers)).json()
+        ids.append(book["id"])
+
+    first = await client.get(f"{BASE_URL}/books/{ids[0]}", headers=headers)
+    assert first.status_code == 200
+    assert first.headers["X-Cache"] == "MISS"
+    etag = first.headers["ETag"]
+    again = await client.get(f"{BASE_URL}/books/{ids[0]}", headers=headers)
+    assert again.headers["X-Cache"] == "HIT"
+    assert again.json() == first.json()
+
+    not_modified = await client.get(f"{BASE_URL}/books/{ids[0]}", headers={**headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+
+    other = await client.get(f"{BASE_URL}/books/{ids[1]}", headers=headers)
+    history = await client.get(f"{BASE_URL}/recommendations?genre=history", headers=headers)
+    reviews = await client.get(f"{BASE_URL}/books/{ids[0]}/reviews", headers=headers)
+    assert reviews.json() == []
+
+    # A review changes the book's reviews and rating, but nothing about the other book or genre
+    await client.post(f"{BASE_URL}/books/{ids[0]}/reviews", json={"user_id": 1, "review_text": "Great", "rating": 5}, headers=headers)
+    changed = await client.get(f"{BASE_URL}/books/{ids[0]}", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["rating_count"] == 1
+    assert len((await client.get(f"{BASE_URL}/books/{ids[0]}/reviews", headers=headers)).json()) == 1
+    unchanged = await client.get(f"{BASE_URL}/books/{ids[1]}", headers={**headers, "If-None-Match": other.headers["ETag"]})
+    assert unchanged.status_code == 304
+    same_genre = await client.get(f"{BASE_URL}/recommendations?genre=history", headers={**headers, "If-None-Match": history.headers["ETag"]})
+    assert same_genre.status_code == 304
+
+    await client.put(f"{BASE_URL}/books/{ids[1]}", json={"title": "Renamed"}, headers=headers)
+    assert (await client.get(f"{BASE_URL}/books/{ids[1]}", headers=headers)).json()["title"] == "Renamed"
+    await client.delete(f"{BASE_URL}/books/{ids[1]}", headers=headers)
+    assert (await client.get(f"{BASE_URL}/books/{ids[1]}", headers=headers)).status_code == 404
+    assert (await client.get(f"{BASE_URL}/recommendations?genre=history", headers=headers)).status_code == 404
+
+    # Fuzzy genre fallbacks are never cached
+    fuzzy = await client.get(f"{BASE_URL}/recommendations?genre=fanta", headers=headers)
+    assert fuzzy.status_code == 200
+    assert "ETag" not in fuzzy.headers
+
+# Test the Prometheus metrics for routes, SQL statements and model calls
+@pytest.mark.asyncio
+async def test_metrics(client, monkeypatch):
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    headers = basic_auth_headers()
+    route = {"method": "GET", "route": "/v1/api/books/{id}", "status": "404"}
+    requests_before = sample("http_request_duration_seconds_count", **route)
+    selects_before = sample("db_statement_duration_seconds_count", operation="SELECT")
+    await client.get(f"{BASE_URL}/books/999", headers=headers)
+    assert sample("http_request_duration_seconds_count", **route) == requests_before + 1
+    assert sample("db_statement_duration_seconds_count", operation="SELECT") > selects_before
+
+    generated_before = sample("llm_request_duration_seconds_count", mode="generate")
+    tokens_before = sample("llm_response_tokens_total", mode="generate")
+    hits_before = sample("llm_cache_lookups_total", result="memory_hit")
+    ttft_before = sample("llm_time_to_first_token_seconds_count")
+    with FakeModelServer(response_text="Four tokens right here.") as server:
+        monkeypatch.setattr(model_client, "_router", model_client.create_router([server.url]))
+        for _ in range(2):
+            await client.post(f"{BASE_URL}/books/generate-summary", json={"content": "Metrics"}, headers=headers)
+        await client.post(f"{BASE_URL}/books/generate-summary/stream", json={"content": "Streamed"}, headers=headers)
+    assert sample("llm_request_duration_seconds_count", mode="generate") == generated_before + 1
+    assert sample("llm_response_tokens_total", mode="generate") == tokens_before + 4
+    assert sample("llm_cache_lookups_total", result="memory_hit") == hits_before + 1
+    assert sample("llm_time_to_first_token_seconds_count") == ttft_before + 1
+
+    failures_before = sample("llm_failures_total", mode="generate")
+    await client.post(f"{BASE_URL}/books/generate-summary", json={"content": "No model running"}, headers=headers)
+    assert sample("llm_failures_total", mode="generate") == failures_before + 1
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/v1/api/books/{id}",status="404"}' in response.text
+
+# Test that the sampling profiler runs only when enabled and requested by header
+@pytest.mark.asyncio
+async def test_request_profiler(client, monkeypatch, tmp_path):
+    headers = basic_auth_headers()
+    assert "x-profile-id" not in (await client.get(f"{BASE_URL}/books", headers={**headers, "X-Profile": "1"})).headers
+
+    monkeypatch.setattr(metrics, "PROFILER_ENABLED", True)
+    monkeypatch.setattr(metrics, "PROFILER_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "PROFILER_INTERVAL", 0.001)
+    response = await client.get(f"{BASE_URL}/books", headers={**headers, "X-Profile": "1"})
+    assert response.status_code == 200
+    profile = tmp_path / f"{response.headers['x-profile-id']}.txt"
+    assert profile.exists()
+    assert "x-profile-id" not in (await client.get(f"{BASE_URL}/books", headers=headers)).headers
+
+# Test that migrations build the same schema as the models and upgrade a database from the original schema
+@pytest.mark.asyncio
+async def test_schema_migrations(tmp_path):
+    def schema(conn):
+        inspector = inspect(conn)
+        return {
+            table: ({c["name"] for c in inspector.get_columns(table)}, {i["name"] for i in inspector.get_indexes(table)})
+            for table in inspector.get_table_names() if table != "schema_migrations"
+        }
+
+    models_engine = create_engine(sqlite_url(tmp_path / "models.db"))
+    async with models_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        expected = await conn.run_sync(schema)
+    await models_engine.dispose()
+
+    engine = create_engine(sqlite_url(tmp_path / "migrated.db"))
+    assert [m.version for m in await migrate(engine, target=1)] == [1]
+    async with engine.begin() as conn:
+        await conn.execute(text("INSERT INTO books (id, title, author, genre, year_published) VALUES (1, 'Old', 'A', ' Drama ', 1999)"))
+        await conn.execute(text("INSERT INTO reviews (book_id, user_id, rating) VALUES (1, 1, 4), (1, 2, 2)"))
+
+    assert [m.version for m in await migrate(engine)] == [m.version for m in MIGRATIONS[1:]]
+    assert await migrate(engine) == []
+    assert await applied_versions(engine) == [m.version for m in MIGRATIONS]
+    async with engine.begin() as conn:
+        assert await conn.run_sync(schema) == expected
+        book = (await conn.execute(text("SELECT rating_count, rating_sum, genre_key FROM books WHERE id = 1"))).one()
+    # Existing books get their rating aggregates and normalised genre
+    assert tuple(book) == (2, 6, "drama")
+    await engine.dispose()
+
+def sequential_scans(conn, statement, parameters):
+    if conn.dialect.name == "postgresql":
+        # Tiny test tables make a sequential scan the cheapest plan; forbidding it shows whether an index could serve
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        plan = [row[0] for row in conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)]
+        return [line.strip() for line in plan if "Seq Scan" in line]
+    plan = [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+    # Scanning a subquery's rows is fine; an automatic index is SQLite building a throwaway index from a full scan
+    return [line for line in plan if (line.startswith("SCAN ") and line.split()[1] in Base.metadata.tables) or "AUTOMATIC" in line]
+
+# Test that the queries behind the hot endpoints use indexes rather than scanning whole tables
+@pytest.mark.asyncio
+async def test_hot_path_query_plans(client, session_factory, monkeypatch):
+    headers = basic_auth_headers()
+    engine = session_factory.kw["bind"]
+    async with session_factory() as session:
+        connection = await session.connection()
+        await connection.execute(insert(BookModel.__table__), [{
+            "id": i, "title": f"Book {i}", "author": f"Author {i % 50}", "genre": f"Genre {i % 10}",
+            "year_published": 1950 + i % 70, "summary": f"Summary {i}", "rating_count": 0, "rating_sum": 0,
+        } for i in range(1, 501)])
+        await connection.execute(insert(ReviewModel.__table__), [
+            {"book_id": i, "user_id": j, "rating": 3, "review_text": f"Review {j}"} for i in range(1, 501) for j in range(4)
+        ])
+        await session.commit()
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("ANALYZE")
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE", "WITH"):
+            statements.append((statement, parameters))
+
+    hot_paths = [
+        ("get", f"{BASE_URL}/books/7", None),
+        ("get", f"{BASE_URL}/books/7/reviews?order=newest&after_id=100000&limit=2", None),
+        ("get", f"{BASE_URL}/books:batch?ids=3,4,5,6&reviews=2", None),
+        ("get", f"{BASE_URL}/books/7/summary", None),
+        ("get", f"{BASE_URL}/books?author=Author%203&limit=5", None),
+        ("get", f"{BASE_URL}/books?year=1960&limit=5", None),
+        ("get", f"{BASE_URL}/books?genre=genre%202&limit=5", None),
+        ("get", f"{BASE_URL}/recommendations?genre=Genre%204", None),
+        ("post", f"{BASE_URL}/books/8/reviews", {"user_id": 9, "review_text": "Indexed", "rating": 5}),
+        ("post", f"{BASE_URL}/books/8/reviews:batch", [{"user_id": 10, "review_text": "Bulk", "rating": 4}] * 3),
+        ("put", f"{BASE_URL}/books/9", {"genre": "Genre 3"}),
+        ("delete", f"{BASE_URL}/books/10", None),
+    ]
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        with FakeModelServer(response_text="Planned.") as server:
+            monkeypatch.setattr(model_client, "_router", model_client.create_router([server.url]))
+            for method, url, body in hot_paths:
+                kwargs = {"json": body} if body is not None else {}
+                response = await client.request(method.upper(), url, headers=headers, **kwargs)
+                assert response.status_code in (200, 201), (url, response.text)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+    assert len(statements) >= len(hot_paths)
+    async with engine.connect() as conn:
+        for statement, parameters in statements:
+            async with conn.begin():
+                scans = await conn.run_sync(sequential_scans, statement, parameters)
+            assert not scans, f"{scans} in: {statement}"
@@ -5,6 +5,11 @@ import os
 # Load environment variables from the .env.test file
 load_dotenv(".env.test")
 
+# URL of a scratch SQLite database for tests that need more than the shared test database.
+# These always use SQLite, whatever DATABASE_URL points at, so aiosqlite is in requirements.txt
+def sqlite_url(path):
+    return f"sqlite+aiosqlite:///{path}"
+
 # Generate HTTP Basic Auth headers using credentials from environment variables
 def basic_auth_headers(username=os.getenv("USERNAME"), password=os.getenv("PASSWORD")):
     token = base64.b64encode(f"{username}:{password}".encode()).decode()